@@ -71,7 +71,7 @@ def create_pixel_car(width, height, main_color, secondary_color, car_type="defau
     
     return car
 
-def create_flame_particle(size):
+def create_flame_particle(size, rng=random):
     """Create a flame particle for exhaust effects"""
     colors = [
         (255, 60, 0),   # Orange
@@ -80,18 +80,18 @@ def create_flame_particle(size):
     ]
     
     flame = pygame.Surface((size, size), pygame.SRCALPHA)
-    color = random.choice(colors)
+    color = rng.choice(colors)
     pygame.draw.circle(flame, color, (size//2, size//2), size//2)
     return flame
 
-def create_smoke_particle(size):
+def create_smoke_particle(size, rng=random):
     """Create a smoke particle for tire effects"""
-    gray = random.randint(150, 220)
+    gray = rng.randint(150, 220)
     smoke = pygame.Surface((size, size), pygame.SRCALPHA)
     pygame.draw.circle(smoke, (gray, gray, gray, 150), (size//2, size//2), size//2)
     return smoke
 
-def create_spark_particle(size):
+def create_spark_particle(size, rng=random):
     """Create a spark particle for collision effects"""
     colors = [
         (255, 255, 0),  # Yellow
@@ -100,12 +100,12 @@ def create_spark_particle(size):
     ]
     
     spark = pygame.Surface((size, size), pygame.SRCALPHA)
-    color = random.choice(colors)
+    color = rng.choice(colors)
     pygame.draw.circle(spark, color, (size//2, size//2), size//2)
     return spark
 
-def load_assets():
-    """Load all game assets"""
+def load_assets(rng=random):
+    """Load all game assets (rng is the random stream for generated art)"""
     assets = {}
     
     # Create player car (Nissan GTR style - metallic gray)
@@ -115,10 +115,10 @@ def load_assets():
     assets['opponent_car'] = create_pixel_car(CAR_WIDTH, CAR_HEIGHT, (220, 30, 30), (30, 30, 30), car_type="gtr")
     
     # Create backgrounds for different seasons
-    assets['background_spring'] = create_background("spring")
-    assets['background_summer'] = create_background("summer")
-    assets['background_autumn'] = create_background("autumn")
-    assets['background_winter'] = create_background("winter")
+    assets['background_spring'] = create_background("spring", rng)
+    assets['background_summer'] = create_background("summer", rng)
+    assets['background_autumn'] = create_background("autumn", rng)
+    assets['background_winter'] = create_background("winter", rng)
     
     # Create UI elements
     font = pygame.font.SysFont(None, 48)
@@ -126,7 +126,7 @@ def load_assets():
     
     return assets
 
-def create_background(season="summer"):
+def create_background(season="summer", rng=random):
     """Create the game background with different seasons"""
     bg = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT))
     
@@ -140,12 +140,12 @@ def create_background(season="summer"):
         
         # Add some fluffy clouds
         for _ in range(6):
-            cloud_x = random.randint(0, SCREEN_WIDTH)
-            cloud_y = random.randint(20, SCREEN_HEIGHT//3)
-            cloud_size = random.randint(20, 50)
+            cloud_x = rng.randint(0, SCREEN_WIDTH)
+            cloud_y = rng.randint(20, SCREEN_HEIGHT//3)
+            cloud_size = rng.randint(20, 50)
             for i in range(5):  # Multiple circles for each cloud
-                offset_x = random.randint(-15, 15)
-                offset_y = random.randint(-10, 10)
+                offset_x = rng.randint(-15, 15)
+                offset_y = rng.randint(-10, 10)
                 pygame.draw.circle(bg, (250, 250, 250), 
                                   (cloud_x + offset_x, cloud_y + offset_y), 
                                   cloud_size // 2)
@@ -174,10 +174,10 @@ def create_background(season="summer"):
         
         # Add some scattered clouds
         for _ in range(4):
-            cloud_x = random.randint(0, SCREEN_WIDTH)
-            cloud_y = random.randint(30, SCREEN_HEIGHT//3)
-            cloud_width = random.randint(60, 120)
-            cloud_height = random.randint(15, 30)
+            cloud_x = rng.randint(0, SCREEN_WIDTH)
+            cloud_y = rng.randint(30, SCREEN_HEIGHT//3)
+            cloud_width = rng.randint(60, 120)
+            cloud_height = rng.randint(15, 30)
             pygame.draw.ellipse(bg, (200, 150, 150), 
                                (cloud_x, cloud_y, cloud_width, cloud_height))
     
@@ -190,9 +190,9 @@ def create_background(season="summer"):
         
         # Add some snowflakes
         for _ in range(50):
-            snow_x = random.randint(0, SCREEN_WIDTH)
-            snow_y = random.randint(0, SCREEN_HEIGHT//2)
-            snow_size = random.randint(1, 3)
+            snow_x = rng.randint(0, SCREEN_WIDTH)
+            snow_y = rng.randint(0, SCREEN_HEIGHT//2)
+            snow_size = rng.randint(1, 3)
             pygame.draw.circle(bg, (255, 255, 255), (snow_x, snow_y), snow_size)
     
     # Mountains - different colors based on season
@@ -206,9 +206,9 @@ def create_background(season="summer"):
         mountain_colors = [(220, 220, 240), (200, 200, 220), (180, 180, 200)]
     
     for i in range(5):
-        height = random.randint(50, 150)
-        width = random.randint(200, 400)
-        x = random.randint(-100, SCREEN_WIDTH)
+        height = rng.randint(50, 150)
+        width = rng.randint(200, 400)
+        x = rng.randint(-100, SCREEN_WIDTH)
         
         points = [
             (x, SCREEN_HEIGHT//2),
@@ -216,7 +216,7 @@ def create_background(season="summer"):
             (x + width, SCREEN_HEIGHT//2)
         ]
         
-        color = random.choice(mountain_colors)
+        color = rng.choice(mountain_colors)
         pygame.draw.polygon(bg, color, points)
     
     # Ground - different for each season
@@ -237,14 +237,14 @@ def create_background(season="summer"):
     
     # Add some ground details based on season
     for _ in range(100):
-        x = random.randint(0, SCREEN_WIDTH)
-        y = random.randint(SCREEN_HEIGHT//2, SCREEN_HEIGHT)
-        size = random.randint(2, 6)
-        color = random.choice(grass_colors)
+        x = rng.randint(0, SCREEN_WIDTH)
+        y = rng.randint(SCREEN_HEIGHT//2, SCREEN_HEIGHT)
+        size = rng.randint(2, 6)
+        color = rng.choice(grass_colors)
         
         if season == "autumn":
             # Draw small leaf-like shapes
-            if random.random() > 0.7:
+            if rng.random() > 0.7:
                 points = [
                     (x, y),
                     (x + size, y - size),
@@ -254,11 +254,11 @@ def create_background(season="summer"):
                 pygame.draw.polygon(bg, color, points)
         elif season == "winter":
             # Draw snow patches
-            if random.random() > 0.8:
+            if rng.random() > 0.8:
                 pygame.draw.circle(bg, (255, 255, 255), (x, y), size)
         else:
             # Draw grass tufts
-            if random.random() > 0.8:
+            if rng.random() > 0.8:
                 pygame.draw.line(bg, color, (x, y), (x, y - size*2), 2)
     
     # Road - same for all seasons but with weather effects
@@ -275,7 +275,7 @@ def create_background(season="summer"):
     
     # Road markings
     for i in range(40):  # More markings for longer track
-        if season == "winter" and random.random() > 0.7:
+        if season == "winter" and rng.random() > 0.7:
             # Some markings covered by snow
             continue
             
@@ -285,19 +285,19 @@ def create_background(season="summer"):
     if season == "autumn":
         # Scattered leaves on the road
         for _ in range(15):
-            leaf_x = random.randint(0, SCREEN_WIDTH)
-            leaf_y = random.randint(road_y, road_y + road_height)
-            leaf_size = random.randint(2, 4)
-            leaf_color = random.choice([(200, 100, 50), (220, 120, 40), (180, 80, 30)])
+            leaf_x = rng.randint(0, SCREEN_WIDTH)
+            leaf_y = rng.randint(road_y, road_y + road_height)
+            leaf_size = rng.randint(2, 4)
+            leaf_color = rng.choice([(200, 100, 50), (220, 120, 40), (180, 80, 30)])
             pygame.draw.circle(bg, leaf_color, (leaf_x, leaf_y), leaf_size)
     
     elif season == "winter":
         # Snow patches on the road
         for _ in range(20):
-            snow_x = random.randint(0, SCREEN_WIDTH)
-            snow_y = random.randint(road_y, road_y + road_height)
-            snow_width = random.randint(10, 30)
-            snow_height = random.randint(5, 15)
+            snow_x = rng.randint(0, SCREEN_WIDTH)
+            snow_y = rng.randint(road_y, road_y + road_height)
+            snow_width = rng.randint(10, 30)
+            snow_height = rng.randint(5, 15)
             pygame.draw.ellipse(bg, (200, 200, 210), 
                                (snow_x, snow_y, snow_width, snow_height))
     
@@ -0,0 +1,312 @@
+"""
+Vectorized car physics for large batches of cars
+
+BatchCars keeps the physics state of N cars in NumPy arrays and advances
+all of them with one set of array operations per tick. The rules are the
+same as Car.update (boost, drag, in-air drag, spin slowdown, red light
+penalties, ramps, oil and jump arcs), so it can be used for AI tournaments
+and parameter sweeps with hundreds of cars. Visual effects and the bounce
+animation are not simulated.
+"""
+
+import random
+import numpy as np
+from car import Car, PlayerCar
+from simulation import RaceSimulation, create_ramps, create_traffic_lights, RACE_DISTANCE
+from track import HIT_RANGE, OilSpill
+from traffic_lights import LIGHT_STATES
+
+RED = LIGHT_STATES.index("red")
+
+class BatchTrack:
+    """Obstacle positions as arrays, in the form BatchCars.step expects"""
+    def __init__(self, ramps, oil_spills, traffic_lights, light_tick=0):
+        self.ramp_positions = np.array([ramp.position for ramp in ramps], dtype=float)
+        self.oil_positions = np.array([spill.position for spill in oil_spills], dtype=float)
+        self.oil_lanes = np.array([spill.lane for spill in oil_spills], dtype=int)
+        self.light_positions = np.array([light.position for light in traffic_lights], dtype=float)
+        self.light_phases = np.array([light.phase for light in traffic_lights], dtype=int)
+        self.light_cycles = np.array([light.cycle_time for light in traffic_lights], dtype=int)
+        self.light_red = np.zeros(len(traffic_lights), dtype=bool)
+        self.sync_lights(light_tick)
+
+    def sync_lights(self, tick):
+        """Work out which lights are red at the given tick of the light clock"""
+        self.light_red[:] = (self.light_phases + tick) // self.light_cycles % len(LIGHT_STATES) == RED
+
+class BatchCars:
+    def __init__(self, count, lanes=None, difficulty=None, ai=False, seed=None):
+        """
+        count cars, optionally with per-car lanes and difficulty
+
+        Difficulty scales acceleration and drag the same way AICar does.
+        With ai=True every car is driven by the vectorized AI policy.
+        """
+        # Tuning comes straight from Car so both implementations stay in step
+        prototype = Car(0, 0, None, 0, effects=False)
+        self.count = count
+        self.lane = np.zeros(count, dtype=int) if lanes is None else np.asarray(lanes, dtype=int)
+
+        self.max_speed = prototype.max_speed
+        self.gravity = prototype.gravity
+        self.boost_duration = prototype.boost_duration
+        self.boost_cooldown = prototype.boost_cooldown
+        self.spin_duration = prototype.spin_duration
+        self.penalty_duration = prototype.penalty_duration
+
+        self.base_acceleration = np.full(count, prototype.base_acceleration)
+        self.drag = np.full(count, prototype.drag)
+        if difficulty is not None:
+            difficulty = np.broadcast_to(np.asarray(difficulty, dtype=float), (count,))
+            self.base_acceleration = self.base_acceleration * difficulty
+            self.drag = self.drag * ((2 - difficulty) * 0.8)
+
+        # Motion
+        self.speed = np.zeros(count)
+        self.acceleration = np.zeros(count)
+        self.distance = np.zeros(count)
+
+        # Race progress
+        self.finished = np.zeros(count, dtype=bool)
+        self.finish_tick = np.full(count, -1)
+
+        # Boost
+        self.boost_available = np.ones(count, dtype=bool)
+        self.boosting = np.zeros(count, dtype=bool)
+        self.boost_time = np.zeros(count, dtype=int)
+        self.boost_timer = np.zeros(count, dtype=int)
+
+        # Jumps
+        self.in_air = np.zeros(count, dtype=bool)
+        self.jump_height = np.zeros(count)
+        self.jump_velocity = np.zeros(count)
+        self.rotation = np.zeros(count)
+        self.air_time = np.zeros(count, dtype=int)
+
+        # Oil
+        self.spinning = np.zeros(count, dtype=bool)
+        self.spin_time = np.zeros(count, dtype=int)
+        self.spin_angle = np.zeros(count)
+
+        # Traffic light penalty
+        self.penalized = np.zeros(count, dtype=bool)
+        self.penalty_time = np.zeros(count, dtype=int)
+
+        # Vectorized AI (same rules as AICar, drawn from a NumPy generator)
+        self.ai = ai
+        self.rng = np.random.default_rng(seed)
+        if ai:
+            self.difficulty = np.ones(count) if difficulty is None else np.array(difficulty)
+            self.reaction_timer = self.rng.uniform(30, 60, count) / self.difficulty
+            self.decision_timer = np.zeros(count, dtype=int)
+            self.decision_interval = self.rng.integers(30, 91, count)
+
+        self.tick = 0
+
+    def apply_input(self, accelerate, boost):
+        """Per-car driver input for the next step (boolean arrays), like PlayerCar.apply_input"""
+        accelerate = np.asarray(accelerate, dtype=bool)
+        self.acceleration = np.where(accelerate, self.base_acceleration, 0.0)
+        self.activate_boost(np.asarray(boost, dtype=bool))
+
+    def activate_boost(self, mask):
+        start = mask & self.boost_available & ~self.boosting
+        self.boosting |= start
+        self.boost_time[start] = self.boost_duration
+        self.boost_available &= ~start
+        return start
+
+    def step(self, track, race_distance=RACE_DISTANCE):
+        """Advance every car by one tick against a BatchTrack"""
+        racing = ~self.finished
+
+        # Penalized cars stand still and skip the rest of the step
+        serving = racing & self.penalized
+        self.penalty_time[serving] += 1
+        self.speed[serving] = 0
+        self.acceleration[serving] = 0
+        served = serving & (self.penalty_time >= self.penalty_duration)
+        self.penalized[served] = False
+        self.penalty_time[served] = 0
+
+        active = racing & ~serving
+
+        # Acceleration (boost overrides the pedal)
+        boosting = active & self.boosting
+        self.speed = np.where(boosting, self.speed + self.base_acceleration * 2, self.speed)
+        self.speed = np.where(active & ~self.boosting, self.speed + self.acceleration, self.speed)
+        self.boost_time[boosting] -= 1
+        boost_over = boosting & (self.boost_time <= 0)
+        self.boosting[boost_over] = False
+        self.boost_available[boost_over] = False
+        self.boost_timer[boost_over] = self.boost_cooldown
+
+        # Drag (halved in the air)
+        drag = np.where(self.in_air, self.drag * 0.5, self.drag)
+        self.speed = np.where(active, self.speed - drag * self.speed, self.speed)
+
+        # Clamp speed
+        self.speed = np.where(active, np.clip(self.speed, 0, self.max_speed), self.speed)
+
+        # Spinning on oil
+        spinning = active & self.spinning
+        self.spin_time[spinning] += 1
+        self.spin_angle[spinning] += 15
+        self.speed = np.where(spinning, self.speed * 0.95, self.speed)
+        spin_over = spinning & (self.spin_time >= self.spin_duration)
+        self.spinning[spin_over] = False
+        self.spin_time[spin_over] = 0
+        self.spin_angle[spin_over] = 0
+
+        # Move
+        old_distance = self.distance
+        self.distance = np.where(active, self.distance + self.speed, self.distance)
+
+        # Boost cooldown
+        cooling = active & ~self.boost_available & ~self.boosting
+        self.boost_timer[cooling] -= 1
+        self.boost_available[cooling & (self.boost_timer <= 0)] = True
+
+        # Swept collisions over the stretch covered this step (see collision.sweep)
+        low = (old_distance - HIT_RANGE)[:, None]
+        high = (self.distance + HIT_RANGE)[:, None]
+
+        # Running a red light
+        if len(track.light_positions):
+            crossed = ((old_distance[:, None] < track.light_positions)
+                       & (self.distance[:, None] >= track.light_positions)
+                       & track.light_red)
+            caught = active & crossed.any(axis=1)
+            self.penalized[caught] = True
+            self.penalty_time[caught] = 0
+
+        # Ramps
+        if len(track.ramp_positions):
+            on_ramp = (track.ramp_positions > low) & (track.ramp_positions < high)
+            jumping = active & ~self.in_air & on_ramp.any(axis=1)
+            self.jump_velocity = np.where(jumping, 15 + self.speed * 0.8, self.jump_velocity)
+            self.in_air |= jumping
+            self.air_time[jumping] = 0
+
+        # Oil spills (only in the car's own lane)
+        if len(track.oil_positions):
+            on_oil = ((track.oil_positions > low) & (track.oil_positions < high)
+                      & (self.lane[:, None] == track.oil_lanes))
+            slipping = active & ~self.in_air & ~self.spinning & on_oil.any(axis=1)
+            self.spinning |= slipping
+            self.spin_time[slipping] = 0
+
+        # Jump arcs
+        flying = active & self.in_air
+        self.air_time[flying] += 1
+        self.jump_height = np.where(flying, self.jump_height + self.jump_velocity, self.jump_height)
+        self.jump_velocity = np.where(flying, self.jump_velocity - self.gravity, self.jump_velocity)
+        self.rotation = np.where(
+            flying,
+            np.where(self.jump_velocity > 0,
+                     np.minimum(30, self.rotation + 1),
+                     np.maximum(-30, self.rotation - 1)),
+            self.rotation
+        )
+        landed = flying & (self.jump_height <= 0) & (self.jump_velocity < 0)
+        self.in_air[landed] = False
+        self.jump_height[landed] = 0
+        self.jump_velocity[landed] = 0
+        self.rotation[landed] = 0
+
+        if self.ai:
+            self.ai_step(racing)
+
+        # Finish line
+        crossing = racing & (self.distance >= race_distance)
+        self.finished |= crossing
+        self.finish_tick[crossing] = self.tick
+
+        self.tick += 1
+
+    def ai_step(self, racing):
+        """AICar's driving rules for every AI car at once"""
+        waiting = racing & (self.reaction_timer > 0)
+        self.reaction_timer[waiting] -= 1
+        self.acceleration[waiting] = 0
+
+        driving = racing & ~waiting
+        throttle = self.rng.uniform(0.8, 1.0, self.count)
+        self.acceleration = np.where(driving, self.base_acceleration * throttle, self.acceleration)
+
+        self.decision_timer[driving] += 1
+        deciding = driving & (self.decision_timer >= self.decision_interval)
+        self.decision_timer[deciding] = 0
+        self.decision_interval = np.where(deciding, self.rng.integers(30, 91, self.count), self.decision_interval)
+        wants_boost = deciding & (self.rng.random(self.count) < 0.3 * self.difficulty)
+        self.activate_boost(wants_boost)
+
+    def run(self, track, cycle_lights=True, race_distance=RACE_DISTANCE, max_ticks=None):
+        """
+        Step until every car finishes (AI cars only); returns finish ticks
+
+        With cycle_lights the traffic lights run on the race clock the
+        same way RaceSimulation drives them; otherwise they keep the
+        states the track was built with.
+        """
+        while not self.finished.all() and (max_ticks is None or self.tick < max_ticks):
+            if cycle_lights:
+                track.sync_lights(self.tick + 1)
+            self.step(track, race_distance)
+        return self.finish_tick
+
+def tournament(count, difficulty=None, seed=None, max_ticks=None):
+    """Race count AI cars on the standard track; returns their finish ticks"""
+    track = BatchTrack(create_ramps(), [], create_traffic_lights())
+    cars = BatchCars(count, lanes=np.arange(count) % 2, difficulty=difficulty, ai=True, seed=seed)
+    return cars.run(track, max_ticks=max_ticks)
+
+def compare_with_scalar(count=64, ticks=1500, seed=0):
+    """
+    Drive the same random inputs through BatchCars and scalar PlayerCars
+
+    Uses the standard track with oil spills and cycling traffic lights.
+    Returns the largest absolute difference in distance, speed and jump
+    height seen over the run (0.0 when both agree exactly).
+    """
+    rng = random.Random(seed)
+    lanes = [i % 2 for i in range(count)]
+    scalar_cars = [PlayerCar(100, 0, None, lane, effects=False) for lane in lanes]
+    batch = BatchCars(count, lanes)
+
+    # The standard track plus a few fixed oil spills
+    race = RaceSimulation(scalar_cars[0], scalar_cars[1 % count])
+    race.oil_spills.extend([
+        OilSpill(700, 0),
+        OilSpill(2000, 1),
+        OilSpill(3500, 0),
+        OilSpill(5000, 1)
+    ])
+    track = BatchTrack(race.ramps, race.oil_spills, race.traffic_lights)
+
+    worst = 0.0
+    for tick in range(ticks):
+        accelerate = [rng.random() < 0.9 for _ in range(count)]
+        boost = [rng.random() < 0.02 for _ in range(count)]
+
+        race.update_traffic_lights()
+        track.sync_lights(race.traffic_lights.tick)
+
+        for car, acc, bst in zip(scalar_cars, accelerate, boost):
+            car.apply_input(acc, bst)
+            car.update(True, race.ramps, race.oil_spills, race.traffic_lights)
+            if car.distance >= RACE_DISTANCE and not car.finished:
+                car.finished = True
+                car.finish_tick = tick
+        batch.apply_input(accelerate, boost)
+        batch.step(track)
+
+        for i, car in enumerate(scalar_cars):
+            worst = max(worst,
+                        abs(car.distance - batch.distance[i]),
+                        abs(car.speed - batch.speed[i]),
+                        abs(car.jump_height - batch.jump_height[i]))
+    return worst
+
+if __name__ == "__main__":
+    print(f"max deviation from scalar Car: {compare_with_scalar()}")
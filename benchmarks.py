@@ -0,0 +1,409 @@
+#!/usr/bin/env python3
+"""
+Performance benchmarks for the drag race
+
+Run with: python benchmarks.py <benchmark> [options]
+Rendering benchmarks use the SDL dummy video driver, so no window is opened.
+"""
+
+import os
+import sys
+import time
+import argparse
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+def report(name, samples):
+    """Print mean and percentile timings for a list of durations (seconds)"""
+    samples = sorted(samples)
+    count = len(samples)
+    mean = sum(samples) / count
+    p50 = samples[count // 2]
+    p99 = samples[min(count - 1, int(count * 0.99))]
+    print(f"{name}: mean {mean * 1e6:.1f}us  p50 {p50 * 1e6:.1f}us  p99 {p99 * 1e6:.1f}us  ({count} samples)")
+
+def bench_finish_screen(args):
+    """Steady-state frame time of the finished screen"""
+    import fixed_game_new
+
+    game = fixed_game_new.DragRaceGame()
+    game.start_race()
+    game.player.finished = True
+    game.player.finish_time = game.race_start_time + 41230
+    game.opponent.finished = True
+    game.opponent.finish_time = game.race_start_time + 43870
+    game.game_state = "finished"
+
+    # Warm up (the overlay is built on the first draw)
+    for _ in range(10):
+        game.update()
+        game.draw()
+
+    frame_times = []
+    for _ in range(args.frames):
+        start = time.perf_counter()
+        game.update()
+        game.draw()
+        frame_times.append(time.perf_counter() - start)
+    report("finished frame (update + draw)", frame_times)
+
+    # The old code paid for this on every finished frame
+    build_times = []
+    for _ in range(args.frames):
+        start = time.perf_counter()
+        game.build_finish_overlay()
+        build_times.append(time.perf_counter() - start)
+    report("finish overlay build (once per race)", build_times)
+
+def bench_headless_races(args):
+    """Throughput of complete headless races (full throttle vs AI), stepped and fast-forwarded"""
+    from simulation import simulate_race
+
+    for fast_forward in (False, True):
+        race_times = []
+        for seed in range(args.races):
+            start = time.perf_counter()
+            simulate_race(seed=seed, fast_forward=fast_forward)
+            race_times.append(time.perf_counter() - start)
+        mode = "fast-forward" if fast_forward else "stepped"
+        report(f"headless race ({mode})", race_times)
+        print(f"races per second: {len(race_times) / sum(race_times):.0f}")
+
+def bench_batch_physics(args):
+    """Vectorized AI tournament throughput at several field sizes"""
+    import numpy as np
+    from batch_physics import tournament, compare_with_scalar
+
+    print(f"max deviation from scalar Car: {compare_with_scalar()}")
+    for count in (1, 100, 1000, 10000):
+        start = time.perf_counter()
+        finish_ticks = tournament(count, difficulty=np.linspace(0.8, 1.5, count), seed=0)
+        elapsed = time.perf_counter() - start
+        ticks = int(finish_ticks.max()) + 1
+        print(f"{count} cars: {elapsed * 1000:.1f}ms, {count * ticks / elapsed:.0f} car-ticks/s")
+
+def bench_obstacle_index(args):
+    """Car update cost on tracks with many obstacles"""
+    from car import PlayerCar
+    from track import ObstacleIndex, Ramp, OilSpill
+    from traffic_lights import TrafficLightSchedule, TrafficLight
+
+    for count in (10, 1000, 10000):
+        ramps = ObstacleIndex(Ramp(700 + i * 97, 80) for i in range(count))
+        oil_spills = ObstacleIndex((OilSpill(750 + i * 89, i % 2) for i in range(count)), lane_key="lane")
+        traffic_lights = TrafficLightSchedule(TrafficLight(800 + i * 101, 0, 180) for i in range(count))
+        car = PlayerCar(100, 0, None, 0, effects=False)
+        car.apply_input(True, False)
+
+        update_times = []
+        for _ in range(args.frames):
+            start = time.perf_counter()
+            car.update(True, ramps, oil_spills, traffic_lights)
+            update_times.append(time.perf_counter() - start)
+        report(f"car update, {count} obstacles of each type", update_times)
+
+def bench_car_state(args):
+    """Memory per car and per-frame update time for fields of 1, 100 and 10,000 cars"""
+    import random
+    import tracemalloc
+    from car import AICar
+    from simulation import create_headless_race
+
+    def make_cars(count, effects, rng):
+        return [AICar(100, 0, None, i % 2, difficulty=1.0, rng=rng, effects=effects) for i in range(count)]
+
+    for count in (1, 100, 10000):
+        for effects in (False, True):
+            # Created outside the traced window: it is shared, not part of any car
+            rng = random.Random(0)
+            tracemalloc.start()
+            before = tracemalloc.get_traced_memory()[0]
+            cars = make_cars(count, effects, rng)
+            used = tracemalloc.get_traced_memory()[0] - before
+            tracemalloc.stop()
+            label = "with effects" if effects else "headless"
+            print(f"{count} cars ({label}): {used / count:.0f} bytes per car")
+
+        # The standard track (from a race of its own), shared by every car in the field
+        cars = make_cars(count, False, random.Random(0))
+        race = create_headless_race(seed=0)
+        frames = max(5, min(args.frames, 100000 // count))
+        frame_times = []
+        for _ in range(frames):
+            start = time.perf_counter()
+            race.traffic_lights.advance()
+            for car in cars:
+                car.update(True, race.ramps, race.oil_spills, race.traffic_lights)
+            frame_times.append(time.perf_counter() - start)
+        report(f"{count} cars: frame update", frame_times)
+
+def bench_ghost(args):
+    """Per-frame update cost of a ghost opponent against an AI one"""
+    import random
+    import tempfile
+    from car import AICar, GhostCar
+    from ghost import GhostRecorder, GhostRun
+    from simulation import create_headless_race, full_throttle
+
+    # Record a full-throttle run to play back
+    race = create_headless_race(seed=0)
+    recorder = GhostRecorder()
+    while not race.player.finished:
+        race.player.apply_input(*full_throttle(race.tick))
+        race.step()
+        recorder.record(race.player)
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "bench.ghost")
+        recorder.save(path, race.player.finish_tick)
+        run = GhostRun(path)
+        print(f"ghost file: {os.path.getsize(path)} bytes for {run.ticks} ticks")
+
+        for label, make_car in (
+            ("AI", lambda race: AICar(100, 0, None, 1, rng=random.Random(0), effects=False)),
+            ("ghost", lambda race: GhostCar(100, 0, None, 1, run)),
+        ):
+            race = create_headless_race(seed=0)
+            car = make_car(race)
+            frame_times = []
+            for _ in range(min(args.frames, run.ticks)):
+                start = time.perf_counter()
+                car.update(True, race.ramps, race.oil_spills, race.traffic_lights)
+                frame_times.append(time.perf_counter() - start)
+                race.traffic_lights.advance()
+            report(f"{label} opponent update", frame_times)
+
+def bench_snapshot(args):
+    """Time to snapshot and restore a game mid-race, and the snapshot size"""
+    import fixed_game_new
+
+    game = fixed_game_new.DragRaceGame(seed=0)
+    game.start_countdown()
+    while game.race.tick < 600:
+        if game.game_state == "racing":
+            game.apply_controls([(True, True)])
+        game.update()
+
+    snapshot_times = []
+    for _ in range(args.frames):
+        start = time.perf_counter()
+        data = game.snapshot()
+        snapshot_times.append(time.perf_counter() - start)
+    report("snapshot", snapshot_times)
+
+    restore_times = []
+    for _ in range(args.frames):
+        start = time.perf_counter()
+        game.restore(data)
+        restore_times.append(time.perf_counter() - start)
+    report("restore", restore_times)
+    print(f"snapshot size: {len(data)} bytes")
+
+def bench_rollback(args):
+    """Cost of rolling back and re-simulating MAX_ROLLBACK ticks of a network race"""
+    import fixed_game_new
+    from netplay import MAX_ROLLBACK, INPUTS, INPUTS_HEADER
+
+    class LoopbackInbox:
+        """Stands in for the socket: packets are handed over directly"""
+        def __init__(self):
+            self.packets = []
+
+        def send(self, data):
+            pass
+
+        def receive(self):
+            packets, self.packets = self.packets, []
+            return packets
+
+    inbox = LoopbackInbox()
+    game = fixed_game_new.DragRaceGame(seed=0)
+    game.start_netplay(inbox, 0)
+    session = game.netplay
+
+    # The remote input arrives MAX_ROLLBACK ticks late and flips between
+    # coasting and full throttle with boost, so every batch was mispredicted
+    # from its first tick and is a full rollback
+    rollback_times = []
+    code = 0
+    while not game.race.finished:
+        first = game.race.tick
+        for _ in range(MAX_ROLLBACK):
+            session.update((True, False))
+        code ^= 3
+        inbox.packets.append(INPUTS_HEADER.pack(INPUTS, first + MAX_ROLLBACK - 1, first, MAX_ROLLBACK)
+                             + bytes([code] * MAX_ROLLBACK))
+        start = time.perf_counter()
+        session.poll()
+        rollback_times.append(time.perf_counter() - start)
+    report(f"rollback of {MAX_ROLLBACK} ticks", rollback_times)
+    print(f"{session.rollbacks} rollbacks, {session.resimulated} ticks re-simulated")
+
+def bench_state_sync(args):
+    """Bytes per tick and encode/decode cost of delta-compressed race state"""
+    from simulation import create_headless_race
+    from state_sync import StateEncoder, StateDecoder
+
+    ack_delay = 6  # Ticks before an acknowledgement gets back (a 100ms round trip)
+    encoder = StateEncoder()
+    decoder = StateDecoder()
+    in_flight = []  # (tick the ack arrives, tick acknowledged)
+    sizes = []
+    encode_times = []
+    decode_times = []
+    race = create_headless_race("ai", seed=0)
+    while not race.finished:
+        race.player.apply_input(True, race.tick % 240 == 0)
+        race.step()
+        while in_flight and in_flight[0][0] <= race.tick:
+            encoder.ack(in_flight.pop(0)[1])
+
+        start = time.perf_counter()
+        data = encoder.encode(race)
+        encode_times.append(time.perf_counter() - start)
+        start = time.perf_counter()
+        view = decoder.decode(data)
+        decode_times.append(time.perf_counter() - start)
+        sizes.append(len(data))
+        in_flight.append((race.tick + ack_delay, view.tick))
+    report("encode", encode_times)
+    report("decode", decode_times)
+    print(f"{len(sizes)} ticks: first message {sizes[0]} bytes, then {sum(sizes[1:]) / (len(sizes) - 1):.1f} "
+          f"bytes/tick on average (max {max(sizes[1:])}), acks {ack_delay} ticks behind")
+
+def bench_spectator(args):
+    """Per-tick cost of publishing the game state to spectators"""
+    import fixed_game_new
+    from spectator import SpectatorPublisher
+
+    game = fixed_game_new.DragRaceGame(seed=0)
+    game.spectator = SpectatorPublisher(game.random.seed)
+    game.start_countdown()
+    publish_times = []
+    try:
+        while game.game_state != "finished":
+            if game.game_state == "racing":
+                game.apply_controls([(True, True)])
+            game.update()
+            start = time.perf_counter()
+            game.spectator.publish(game)
+            publish_times.append(time.perf_counter() - start)
+    finally:
+        game.spectator.close()
+    report("publish", publish_times)
+
+def bench_fixed_point(args):
+    """Fixed-point physics against float physics: cost per tick and how far the races drift apart"""
+    import random
+    from simulation import create_headless_race
+
+    tick_times = {False: [], True: []}
+    drift = 0.0
+    mismatched = 0
+    for seed in range(args.races):
+        rng = random.Random(seed)
+        inputs = [(rng.random() < 0.8, rng.random() < 0.03) for _ in range(3000)]
+        races = {fixed: create_headless_race("ai", seed=seed, fixed_point=fixed) for fixed in (False, True)}
+        while not all(race.finished for race in races.values()) and races[False].tick < len(inputs):
+            for fixed, race in races.items():
+                start = time.perf_counter()
+                race.player.apply_input(*inputs[race.tick])
+                race.step()
+                tick_times[fixed].append(time.perf_counter() - start)
+            for float_car, fixed_car in zip(races[False].cars, races[True].cars):
+                if not float_car.finished:
+                    drift = max(drift, abs(float_car.distance - fixed_car.distance))
+        if races[False].result().finish_ticks != races[True].result().finish_ticks:
+            mismatched += 1
+    report("float physics tick", tick_times[False])
+    report("fixed-point physics tick", tick_times[True])
+    print(f"{args.races} races: largest distance difference {drift:.5f}, "
+          f"{mismatched} with different finish ticks")
+
+def bench_state_hash(args):
+    """Overhead of hashing the race state as it runs, on a headless step and on a game update"""
+    import fixed_game_new
+    from simulation import create_headless_race
+    from state_hash import StateHasher
+
+    # Whole races are timed (per-tick means as samples): the hash costs less than timing single steps would
+    step_times = {False: [], True: []}
+    for seed in range(args.races):
+        for hashed in (False, True):
+            race = create_headless_race("ai", seed=seed)
+            player = race.player
+            start = time.perf_counter()
+            if hashed:
+                # Recording after each step, as hash_replay() does
+                hasher = StateHasher(race)
+                while not race.finished:
+                    player.apply_input(True, race.tick % 240 == 0)
+                    race.step()
+                    hasher.record()
+                hasher.finish()
+            else:
+                while not race.finished:
+                    player.apply_input(True, race.tick % 240 == 0)
+                    race.step()
+            step_times[hashed].append((time.perf_counter() - start) / race.tick)
+    report("headless step", step_times[False])
+    report("headless step + hash", step_times[True])
+
+    # In the game the hash is the same cost on top of a much longer update
+    game = fixed_game_new.DragRaceGame(seed=0)
+    game.start_countdown()
+    update_times = []
+    while game.game_state != "finished":
+        if game.game_state == "racing":
+            game.apply_controls([(True, True)])
+        start = time.perf_counter()
+        game.update()
+        update_times.append(time.perf_counter() - start)
+    report("game update", update_times)
+
+    def mean(samples):
+        return sum(samples) / len(samples)
+    overhead = mean(step_times[True]) - mean(step_times[False])
+    print(f"hash overhead {overhead * 1e6:.2f}us per tick: {overhead / mean(step_times[False]):.1%} of a headless "
+          f"step, {overhead / mean(update_times):.2%} of a game update")
+
+    # The same from the recording cost alone, which whole-race timings are too noisy to resolve
+    race = create_headless_race("ai", seed=0)
+    hasher = StateHasher(race)
+    record_times = []
+    while not race.finished:
+        race.player.apply_input(True, False)
+        race.step()
+        start = time.perf_counter()
+        hasher.record()
+        record_times.append(time.perf_counter() - start)
+    per_tick = mean(record_times)
+    print(f"record {per_tick * 1e6:.2f}us per tick (a checkpoint every {hasher.interval}): "
+          f"{per_tick / mean(step_times[False]):.2%} of a headless step")
+
+BENCHMARKS = {
+    "finish-screen": bench_finish_screen,
+    "headless-races": bench_headless_races,
+    "batch-physics": bench_batch_physics,
+    "obstacle-index": bench_obstacle_index,
+    "car-state": bench_car_state,
+    "ghost": bench_ghost,
+    "snapshot": bench_snapshot,
+    "rollback": bench_rollback,
+    "state-sync": bench_state_sync,
+    "spectator": bench_spectator,
+    "fixed-point": bench_fixed_point,
+    "state-hash": bench_state_hash,
+}
+
+def main():
+    parser = argparse.ArgumentParser(description="Drag race benchmarks")
+    parser.add_argument("benchmark", choices=sorted(BENCHMARKS))
+    parser.add_argument("--frames", type=int, default=500, help="Frames to measure")
+    parser.add_argument("--races", type=int, default=200, help="Races to simulate")
+    args = parser.parse_args()
+    BENCHMARKS[args.benchmark](args)
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -2,9 +2,28 @@ import pygame
 import random
 import math
 from particles import ParticleSystem
+from timers import TimerQueue
+from track import ObstacleIndex, Ramp, OilSpill, HIT_RANGE
+from traffic_lights import TrafficLightSchedule
+from collision import sweep, RAMP, LIGHT
+import fixed_point
 
 class Car:
-    def __init__(self, x, y, image, lane):
+    # Fixed attribute slots keep cars small and attribute access fast
+    __slots__ = (
+        "x", "y", "image", "lane", "original_y",
+        "speed", "max_speed", "acceleration", "base_acceleration", "drag",
+        "distance", "prev_distance", "finished", "start_time", "finish_time", "finish_tick",
+        "bounce_offset", "bounce_direction", "bounce_speed", "bounce_max",
+        "boost_available", "boosting", "boost_duration", "boost_cooldown",
+        "in_air", "jump_height", "prev_jump_height", "jump_velocity", "gravity", "rotation", "air_time",
+        "spinning", "spin_duration", "spin_angle",
+        "penalized", "penalty_duration",
+        "timers", "boost_countdown", "cooldown_countdown", "spin_countdown", "penalty_countdown",
+        "effects", "particles", "on_event", "coast_stop", "coast_reach", "fixed_point"
+    )
+    
+    def __init__(self, x, y, image, lane, effects=True, effects_rng=None, fixed_point=False):
         self.x = x
         self.y = y
         self.image = image
@@ -20,9 +39,11 @@ class Car:
         
         # Race properties
         self.distance = 0
+        self.prev_distance = 0  # Distance at the start of the last step (for render interpolation)
         self.finished = False
         self.start_time = 0
         self.finish_time = 0
+        self.finish_tick = None  # Race tick the car crossed the line on
         
         # Animation properties
         self.bounce_offset = 0
@@ -33,14 +54,13 @@ class Car:
         # Special effects
         self.boost_available = True
         self.boosting = False
-        self.boost_time = 0
         self.boost_duration = 60  # frames
         self.boost_cooldown = 180  # frames
-        self.boost_timer = 0
         
         # Jump/ramp properties
         self.in_air = False
         self.jump_height = 0
+        self.prev_jump_height = 0
         self.jump_velocity = 0
         self.gravity = 0.5
         self.rotation = 0  # For rotation in air
@@ -48,174 +68,217 @@ class Car:
         
         # Oil spill effect
         self.spinning = False
-        self.spin_time = 0
         self.spin_duration = 60  # 1 second at 60 FPS
         self.spin_angle = 0
         
         # Traffic light penalty
         self.penalized = False
-        self.penalty_time = 0
         self.penalty_duration = 120  # 2 seconds at 60 FPS
         
-        # Particles
-        self.particles = ParticleSystem()
+        # Countdowns (boost, cooldown, spin, penalty) fire as callbacks from
+        # a queue that ticks once per race update
+        self.timers = TimerQueue()
+        self.boost_countdown = None
+        self.cooldown_countdown = None
+        self.spin_countdown = None
+        self.penalty_countdown = None
+        
+        # Particles (headless simulations turn visual effects off and don't need any)
+        self.effects = effects
+        self.particles = ParticleSystem(effects_rng) if effects else None
+        
+        # Optional callback(car, event_name) for race events such as "jump" or "spin"
+        self.on_event = None
+        
+        # Fast-forward limits (see plan_coast)
+        self.coast_stop = 0
+        self.coast_reach = 0
+        
+        # Integer speed and jump arithmetic, the same on every machine (see fixed_point.py)
+        self.fixed_point = fixed_point
+    
+    def emit(self, event):
+        """Report a race event to the listener, if any"""
+        if self.on_event:
+            self.on_event(self, event)
+    
+    def schedule(self, delay, callback):
+        """Start a physics countdown (these don't run while a penalty is being served)"""
+        if self.penalized:
+            delay += self.timers.remaining(self.penalty_countdown)
+        return self.timers.schedule(delay, callback)
+    
+    def ticks_left(self, timer):
+        """Physics ticks until a countdown started with schedule() fires"""
+        left = self.timers.remaining(timer)
+        if self.penalized:
+            left -= self.timers.remaining(self.penalty_countdown)
+        return left
+    
+    def countdowns(self):
+        """(handle attribute, callback) of each kind of countdown, used to save and restore timers"""
+        return (
+            ("boost_countdown", self.end_boost),
+            ("cooldown_countdown", self.boost_ready),
+            ("spin_countdown", self.end_spin),
+            ("penalty_countdown", self.end_penalty)
+        )
+    
+    @property
+    def effects_rng(self):
+        """Random stream for cosmetic effects (only used when effects are on)"""
+        return self.particles.rng
+    
+    @property
+    def boost_time(self):
+        """Boost ticks left"""
+        return self.ticks_left(self.boost_countdown) if self.boosting else 0
+    
+    @property
+    def boost_timer(self):
+        """Cooldown ticks left before boost is available again"""
+        if self.boost_available or self.boosting or self.cooldown_countdown is None:
+            return 0
+        return self.ticks_left(self.cooldown_countdown)
+    
+    @property
+    def spin_time(self):
+        """Ticks spent spinning so far"""
+        return self.spin_duration - self.ticks_left(self.spin_countdown) if self.spinning else 0
+    
+    @property
+    def penalty_time(self):
+        """Ticks of the current penalty served so far"""
+        if not self.penalized:
+            return 0
+        return self.penalty_duration - self.timers.remaining(self.penalty_countdown)
     
     def update(self, race_active=True, ramps=None, oil_spills=None, traffic_lights=None):
+        """
+        Advance the car by one tick
+        
+        Obstacles are ObstacleIndex instances (oil spills indexed by lane,
+        traffic lights a TrafficLightSchedule); plain lists of dicts from
+        older game loops are converted on the fly.
+        """
+        # Remember where this step started so drawing can interpolate
+        self.prev_distance = self.distance
+        self.prev_jump_height = self.jump_height
+        
+        if ramps and not isinstance(ramps, ObstacleIndex):
+            ramps = ObstacleIndex(Ramp(ramp["position"], ramp["height"]) for ramp in ramps)
+        if oil_spills and not isinstance(oil_spills, ObstacleIndex):
+            oil_spills = ObstacleIndex((OilSpill(spill["position"], spill["lane"]) for spill in oil_spills),
+                                       lane_key="lane")
+        if traffic_lights and not isinstance(traffic_lights, TrafficLightSchedule):
+            traffic_lights = TrafficLightSchedule.from_states(traffic_lights)
+        
         # Only update physics if race is active
         if race_active and not self.finished:
             # Handle traffic light penalty
             if self.penalized:
-                self.penalty_time += 1
                 # Force car to stop during penalty
                 self.speed = 0
                 self.acceleration = 0
                 
-                # Add penalty particles (red flashing)
-                if self.penalty_time % 10 < 5:  # Flash every 5 frames
-                    for _ in range(2):
-                        self.particles.add_particle(
-                            self.x + random.uniform(-20, 20),
-                            self.y + random.uniform(-20, 20),
-                            (255, 0, 0),
-                            random.uniform(3, 6),
-                            random.uniform(0.5, 1.5),
-                            random.uniform(0, 2 * math.pi),
-                            random.randint(10, 20),
-                            150
-                        )
+                # Serve a tick (the penalty timer ends it after its duration)
+                self.timers.advance()
                 
-                # End penalty after duration
-                if self.penalty_time >= self.penalty_duration:
-                    self.penalized = False
-                    self.penalty_time = 0
+                if self.effects and self.penalized:
+                    # Add penalty particles (red flashing)
+                    if self.penalty_time % 10 < 5:  # Flash every 5 frames
+                        for _ in range(2):
+                            self.particles.add_particle(
+                                self.x + self.effects_rng.uniform(-20, 20),
+                                self.y + self.effects_rng.uniform(-20, 20),
+                                (255, 0, 0),
+                                self.effects_rng.uniform(3, 6),
+                                self.effects_rng.uniform(0.5, 1.5),
+                                self.effects_rng.uniform(0, 2 * math.pi),
+                                self.effects_rng.randint(10, 20),
+                                150
+                            )
                     
                 # Don't process other physics while penalized
                 return
             
-            # Apply acceleration and drag
-            if self.boosting:
-                self.speed += self.base_acceleration * 2
-                self.boost_time -= 1
-                if self.boost_time <= 0:
-                    self.boosting = False
-                    self.boost_available = False
-                    self.boost_timer = self.boost_cooldown
+            if self.fixed_point:
+                # The same steps in integer arithmetic, spin slowdown included
+                self.speed = fixed_point.step_speed(
+                    self, self.base_acceleration * 2 if self.boosting else self.acceleration)
             else:
-                self.speed += self.acceleration
-            
-            # Apply drag (less drag when in air)
-            if self.in_air:
-                self.speed -= (self.drag * 0.5) * self.speed
-            else:
-                self.speed -= self.drag * self.speed
-            
-            # Clamp speed
-            if self.speed > self.max_speed:
-                self.speed = self.max_speed
-            elif self.speed < 0:
-                self.speed = 0
+                # Apply acceleration and drag
+                if self.boosting:
+                    self.speed += self.base_acceleration * 2
+                else:
+                    self.speed += self.acceleration
+                
+                # Apply drag (less drag when in air)
+                if self.in_air:
+                    self.speed -= (self.drag * 0.5) * self.speed
+                else:
+                    self.speed -= self.drag * self.speed
+                
+                # Clamp speed
+                if self.speed > self.max_speed:
+                    self.speed = self.max_speed
+                elif self.speed < 0:
+                    self.speed = 0
             
             # Handle spinning from oil
             if self.spinning:
-                self.spin_time += 1
                 self.spin_angle += 15  # Rotate 15 degrees per frame
                 
                 # Slow down while spinning
-                self.speed *= 0.95
+                if not self.fixed_point:
+                    self.speed *= 0.95
                 
-                # Add oil particles
-                if random.random() > 0.7:
-                    self.particles.add_particle(
-                        self.x + random.uniform(-20, 20),
-                        self.y + 35,
-                        (30, 30, 30),
-                        random.uniform(3, 6),
-                        random.uniform(0.5, 1.5),
-                        random.uniform(0, 2 * math.pi),
-                        random.randint(20, 40),
-                        150
-                    )
-                
-                # End spinning after duration
-                if self.spin_time >= self.spin_duration:
-                    self.spinning = False
-                    self.spin_time = 0
-                    self.spin_angle = 0
+                if self.effects:
+                    # Add oil particles
+                    if self.effects_rng.random() > 0.7:
+                        self.particles.add_particle(
+                            self.x + self.effects_rng.uniform(-20, 20),
+                            self.y + 35,
+                            (30, 30, 30),
+                            self.effects_rng.uniform(3, 6),
+                            self.effects_rng.uniform(0.5, 1.5),
+                            self.effects_rng.uniform(0, 2 * math.pi),
+                            self.effects_rng.randint(20, 40),
+                            150
+                        )
             
             # Update position
             old_distance = self.distance
             self.distance += self.speed
             
-            # Check for traffic light violations
-            if traffic_lights:
-                for light in traffic_lights:
-                    # Check if we just crossed this light
-                    if old_distance < light["position"] and self.distance >= light["position"]:
-                        if light["state"] == "red":
-                            # Apply penalty for running a red light
-                            self.penalized = True
-                            self.penalty_time = 0
-                            
-                            # Add penalty effect particles
-                            for _ in range(20):
-                                self.particles.add_particle(
-                                    self.x,
-                                    self.y,
-                                    (255, 0, 0),
-                                    random.uniform(3, 8),
-                                    random.uniform(1, 3),
-                                    random.uniform(0, 2 * math.pi),
-                                    random.randint(20, 40),
-                                    200
-                                )
+            # Run out boost, cooldown and spin timers due this tick
+            self.timers.advance()
             
-            # Update boost cooldown
-            if not self.boost_available and not self.boosting:
-                self.boost_timer -= 1
-                if self.boost_timer <= 0:
-                    self.boost_available = True
-            
-            # Check for ramp collisions
-            if ramps and not self.in_air:
-                for ramp in ramps:
-                    if abs(self.distance - ramp['position']) < 30:
-                        self.jump_velocity = 15 + (self.speed * 0.8)  # Jump height based on speed
-                        self.in_air = True
-                        self.air_time = 0
-                        break
-            
-            # Check for oil spill collisions
-            if oil_spills and not self.in_air and not self.spinning:
-                for spill in oil_spills:
-                    if abs(self.distance - spill['position']) < 30 and self.lane == spill['lane']:
-                        self.spinning = True
-                        self.spin_time = 0
-                        
-                        # Add oil splash particles
-                        for _ in range(15):
-                            self.particles.add_particle(
-                                self.x + random.uniform(-20, 20),
-                                self.y + 35,
-                                (30, 30, 30),
-                                random.uniform(3, 8),
-                                random.uniform(1, 3),
-                                random.uniform(0, 2 * math.pi),
-                                random.randint(20, 40),
-                                180
-                            )
-                        break
+            # Handle everything touched along the way, in the order it was reached
+            for fraction, kind, obstacle in sweep(old_distance, self.distance, self.lane,
+                                                  ramps, oil_spills, traffic_lights):
+                if kind == LIGHT:
+                    self.hit_traffic_light(obstacle, traffic_lights)
+                elif kind == RAMP:
+                    self.hit_ramp(obstacle)
+                else:
+                    self.hit_oil(obstacle)
             
             # Handle jumping/flying physics
             if self.in_air:
                 self.air_time += 1
-                self.jump_height += self.jump_velocity
-                self.jump_velocity -= self.gravity
+                if self.fixed_point:
+                    self.jump_height, self.jump_velocity = fixed_point.step_jump(self)
+                else:
+                    self.jump_height += self.jump_velocity
+                    self.jump_velocity -= self.gravity
                 
                 # Rotate car in air
                 self.rotation = min(30, self.rotation + 1) if self.jump_velocity > 0 else max(-30, self.rotation - 1)
                 
                 # Add air effects
-                self.add_air_effects()
+                if self.effects:
+                    self.add_air_effects()
                 
                 # Check for landing
                 if self.jump_height <= 0 and self.jump_velocity < 0:
@@ -223,82 +286,302 @@ class Car:
                     self.jump_height = 0
                     self.jump_velocity = 0
                     self.rotation = 0
+                    self.emit("land")
                     
                     # Add landing effects
-                    for _ in range(10):
-                        self.particles.add_smoke(
-                            self.x + random.uniform(-20, 20),
-                            self.original_y + 35
-                        )
+                    if self.effects:
+                        for _ in range(10):
+                            self.particles.add_smoke(
+                                self.x + self.effects_rng.uniform(-20, 20),
+                                self.original_y + 35
+                            )
         
-        # Update bounce animation (only when not in air)
+        self.update_bounce()
+        
+        # Update particles
+        if self.particles is not None:
+            self.particles.update()
+    
+    def update_bounce(self):
+        """Bounce animation (only when not in air)"""
         if not self.in_air and not self.spinning and not self.penalized:
             self.bounce_offset += self.bounce_direction * self.bounce_speed * (0.5 + self.speed / self.max_speed)
             if abs(self.bounce_offset) > self.bounce_max:
                 self.bounce_direction *= -1
+    
+    def plan_coast(self, race_distance, ramps, oil_spills, traffic_lights):
+        """
+        Work out how far the car can go before it needs a full update
         
-        # Update particles
-        self.particles.update()
+        Coasted ticks must leave the car short of coast_stop (the next light
+        or the finish line) and no further than coast_reach (where the next
+        ramp or oil spill comes within HIT_RANGE; obstacles can't be hit
+        while in the air).
+        """
+        stops = [race_distance]
+        light = traffic_lights.next_position(self.distance) if traffic_lights else None
+        if light is not None:
+            stops.append(light)
+        self.coast_stop = min(stops)
+        
+        self.coast_reach = float("inf")
+        if not self.in_air:
+            for obstacles, lane in ((ramps, None), (oil_spills, self.lane)):
+                position = obstacles.next_position(self.distance - HIT_RANGE, lane) if obstacles else None
+                if position is not None:
+                    self.coast_reach = min(self.coast_reach, position - HIT_RANGE)
+    
+    def coast_run(self, tick, limit, source=None, rng=None, reacting=False):
+        """
+        Work out up to limit uneventful ticks from race tick tick
+        
+        Mirrors update() (and the input or AI throttle around it) with the
+        state in locals, stopping before the first tick that needs a full
+        update: an obstacle or light is reached (see plan_coast), the car
+        lands, or source presses boost while it can fire. Returns (ticks,
+        motion) for apply_coast(); the car itself is left untouched, though
+        rng (the AI throttle) is drawn from on every tick covered.
+        """
+        speed = self.speed
+        distance = self.distance
+        prev_distance = self.prev_distance
+        jump_height = self.jump_height
+        prev_jump_height = self.prev_jump_height
+        jump_velocity = self.jump_velocity
+        rotation = self.rotation
+        air_time = self.air_time
+        spin_angle = self.spin_angle
+        bounce_offset = self.bounce_offset
+        bounce_direction = self.bounce_direction
+        acceleration = self.acceleration
+        
+        base_acceleration = self.base_acceleration
+        boost_acceleration = base_acceleration * 2 if self.boosting else None
+        drag = self.drag * 0.5 if self.in_air else self.drag
+        max_speed = self.max_speed
+        gravity = self.gravity
+        in_air = self.in_air
+        spinning = self.spinning
+        penalized = self.penalized
+        bouncing = not in_air and not spinning
+        bounce_step = self.bounce_speed
+        bounce_max = self.bounce_max
+        can_boost = self.boost_available and not self.boosting
+        stop = self.coast_stop
+        reach = self.coast_reach
+        
+        ticks = 0
+        while ticks < limit:
+            if source is not None:
+                accelerate, boost = source(tick + ticks)
+                if boost and can_boost:
+                    break
+                acceleration = base_acceleration if accelerate else 0
+            
+            if penalized:
+                prev_distance = distance
+                prev_jump_height = jump_height
+                speed = 0
+                acceleration = 0
+            else:
+                new_speed = speed + (boost_acceleration if boost_acceleration is not None else acceleration)
+                new_speed -= drag * new_speed
+                if new_speed > max_speed:
+                    new_speed = max_speed
+                elif new_speed < 0:
+                    new_speed = 0
+                if spinning:
+                    new_speed *= 0.95
+                
+                new_distance = distance + new_speed
+                if new_distance >= stop or new_distance > reach:
+                    break
+                
+                if in_air:
+                    new_height = jump_height + jump_velocity
+                    new_velocity = jump_velocity - gravity
+                    if new_height <= 0 and new_velocity < 0:
+                        break
+                    prev_jump_height = jump_height
+                    jump_height = new_height
+                    jump_velocity = new_velocity
+                    rotation = min(30, rotation + 1) if jump_velocity > 0 else max(-30, rotation - 1)
+                    air_time += 1
+                elif bouncing:
+                    bounce_offset += bounce_direction * bounce_step * (0.5 + new_speed / max_speed)
+                    if abs(bounce_offset) > bounce_max:
+                        bounce_direction *= -1
+                
+                if spinning:
+                    spin_angle += 15
+                if not in_air:
+                    prev_jump_height = jump_height
+                prev_distance = distance
+                speed = new_speed
+                distance = new_distance
+            
+            if rng is not None:
+                acceleration = 0 if reacting else base_acceleration * rng.uniform(0.8, 1.0)
+            ticks += 1
+        
+        return ticks, (speed, distance, prev_distance, jump_height, prev_jump_height, jump_velocity,
+                       rotation, air_time, spin_angle, bounce_offset, bounce_direction, acceleration)
+    
+    def apply_coast(self, motion):
+        """Take on the state from coast_run() (the caller advances the timers)"""
+        (self.speed, self.distance, self.prev_distance, self.jump_height, self.prev_jump_height,
+         self.jump_velocity, self.rotation, self.air_time, self.spin_angle, self.bounce_offset,
+         self.bounce_direction, self.acceleration) = motion
+    
+    def coast_idle(self, ticks):
+        """Skip ticks after the finish (only the bounce animation runs)"""
+        if ticks <= 0:
+            return
+        self.prev_distance = self.distance
+        self.prev_jump_height = self.jump_height
+        for _ in range(ticks):
+            self.update_bounce()
+    
+    def end_boost(self):
+        self.boosting = False
+        self.boost_available = False
+        # This tick already counts towards the cooldown
+        self.cooldown_countdown = self.schedule(self.boost_cooldown - 1, self.boost_ready)
+        self.emit("boost_end")
+    
+    def boost_ready(self):
+        self.boost_available = True
+        self.emit("boost_ready")
+    
+    def end_spin(self):
+        self.spinning = False
+        self.spin_angle = 0
+        self.emit("spin_end")
+    
+    def end_penalty(self):
+        self.penalized = False
+        self.emit("penalty_end")
+    
+    def hit_traffic_light(self, light, traffic_lights):
+        """Crossed a traffic light's stop line"""
+        if traffic_lights.state(light) == "red":
+            # Apply penalty for running a red light; the car's other
+            # countdowns are frozen until it has been served
+            for timer in (self.boost_countdown, self.cooldown_countdown, self.spin_countdown):
+                if timer is not None and timer.active:
+                    self.timers.postpone(timer, self.penalty_duration)
+            self.penalized = True
+            self.penalty_countdown = self.timers.schedule(self.penalty_duration, self.end_penalty)
+            self.emit("penalty")
+            
+            # Add penalty effect particles
+            if self.effects:
+                for _ in range(20):
+                    self.particles.add_particle(
+                        self.x,
+                        self.y,
+                        (255, 0, 0),
+                        self.effects_rng.uniform(3, 8),
+                        self.effects_rng.uniform(1, 3),
+                        self.effects_rng.uniform(0, 2 * math.pi),
+                        self.effects_rng.randint(20, 40),
+                        200
+                    )
+    
+    def hit_ramp(self, ramp):
+        if not self.in_air:
+            if self.fixed_point:
+                self.jump_velocity = fixed_point.launch_velocity(self.speed)
+            else:
+                self.jump_velocity = 15 + (self.speed * 0.8)  # Jump height based on speed
+            self.in_air = True
+            self.air_time = 0
+            self.emit("jump")
+    
+    def hit_oil(self, spill):
+        if not self.in_air and not self.spinning:
+            self.spinning = True
+            self.spin_countdown = self.schedule(self.spin_duration, self.end_spin)
+            self.emit("spin")
+            
+            # Add oil splash particles
+            if self.effects:
+                for _ in range(15):
+                    self.particles.add_particle(
+                        self.x + self.effects_rng.uniform(-20, 20),
+                        self.y + 35,
+                        (30, 30, 30),
+                        self.effects_rng.uniform(3, 8),
+                        self.effects_rng.uniform(1, 3),
+                        self.effects_rng.uniform(0, 2 * math.pi),
+                        self.effects_rng.randint(20, 40),
+                        180
+                    )
     
     def add_air_effects(self):
         """Add special effects when car is in the air"""
         # Air stream particles
-        if random.random() > 0.5:
+        if self.effects_rng.random() > 0.5:
             for _ in range(3):
                 self.particles.add_particle(
-                    self.x + random.uniform(-30, 30),
-                    self.y + random.uniform(-10, 30),
+                    self.x + self.effects_rng.uniform(-30, 30),
+                    self.y + self.effects_rng.uniform(-10, 30),
                     (200, 200, 255),
-                    random.uniform(1, 3),
-                    random.uniform(2, 4),
-                    math.pi + random.uniform(-0.3, 0.3),
-                    random.randint(10, 20),
+                    self.effects_rng.uniform(1, 3),
+                    self.effects_rng.uniform(2, 4),
+                    math.pi + self.effects_rng.uniform(-0.3, 0.3),
+                    self.effects_rng.randint(10, 20),
                     150,
-                    "rect" if random.random() > 0.7 else "circle"
+                    "rect" if self.effects_rng.random() > 0.7 else "circle"
                 )
         
         # Add extra boost effects if boosting in air
         if self.boosting:
             for _ in range(5):
                 self.particles.add_particle(
-                    self.x + 10 + random.uniform(-10, 10),
-                    self.y + 30 + random.uniform(-5, 5),
+                    self.x + 10 + self.effects_rng.uniform(-10, 10),
+                    self.y + 30 + self.effects_rng.uniform(-5, 5),
                     (255, 150, 50),
-                    random.uniform(3, 8),
-                    random.uniform(3, 6),
-                    math.pi + random.uniform(-0.5, 0.5),
-                    random.randint(15, 30),
+                    self.effects_rng.uniform(3, 8),
+                    self.effects_rng.uniform(3, 6),
+                    math.pi + self.effects_rng.uniform(-0.5, 0.5),
+                    self.effects_rng.randint(15, 30),
                     200
                 )
     
     def activate_boost(self):
         if self.boost_available and not self.boosting:
             self.boosting = True
-            self.boost_time = self.boost_duration
+            self.boost_countdown = self.schedule(self.boost_duration, self.end_boost)
             self.boost_available = False
+            self.emit("boost")
             
             # Add boost particles
-            for _ in range(20):
-                self.particles.add_sparks(self.x + 10, self.y + 30, 20)
+            if self.effects:
+                for _ in range(20):
+                    self.particles.add_sparks(self.x + 10, self.y + 30, 20)
             
             return True
         return False
     
     def add_effects(self):
+        if not self.effects:
+            return
+        
         # Add exhaust flames based on speed
         if self.speed > 0:
             intensity = int(self.speed / 2) + 1
             for _ in range(intensity):
                 self.particles.add_flame(
                     self.x + 10, 
-                    self.y + 30 + random.uniform(-3, 3)
+                    self.y + 30 + self.effects_rng.uniform(-3, 3)
                 )
         
         # Add tire smoke when accelerating hard
         if self.acceleration > 0.1 and self.speed < 5 and not self.in_air:
             for _ in range(2):
                 self.particles.add_smoke(
-                    self.x + 20 + random.uniform(-5, 5),
+                    self.x + 20 + self.effects_rng.uniform(-5, 5),
                     self.y + 35
                 )
         
@@ -306,21 +589,27 @@ class Car:
         if self.boosting:
             for _ in range(3):
                 self.particles.add_sparks(
-                    self.x + 10 + random.uniform(-5, 5),
-                    self.y + 30 + random.uniform(-3, 3),
+                    self.x + 10 + self.effects_rng.uniform(-5, 5),
+                    self.y + 30 + self.effects_rng.uniform(-3, 3),
                     3
                 )
     
-    def draw(self, surface, camera_offset=0):
+    def draw(self, surface, camera_offset=0, alpha=1.0):
+        """
+        Draw the car and return the list of screen regions it touched
+        
+        alpha is how far rendering is between the previous and the current
+        simulation step (0.0 to 1.0)
+        """
         # Draw particles first (behind car)
-        self.particles.draw(surface)
+        dirty_rects = self.particles.draw(surface) if self.particles is not None else []
         
         # Calculate draw position
         draw_y = self.y + self.bounce_offset
         
         # Apply jump height if in air
         if self.in_air:
-            draw_y -= self.jump_height
+            draw_y -= self.prev_jump_height + (self.jump_height - self.prev_jump_height) * alpha
         
         # Create a rotated copy of the car image if in air or spinning
         if self.in_air or self.spinning:
@@ -329,22 +618,22 @@ class Car:
             rotated_image = pygame.transform.rotate(self.image, angle)
             # Adjust position to account for rotation
             rect = rotated_image.get_rect(center=self.image.get_rect(topleft=(self.x - camera_offset, draw_y)).center)
-            surface.blit(rotated_image, rect.topleft)
+            dirty_rects.append(surface.blit(rotated_image, rect.topleft))
         else:
-            surface.blit(self.image, (self.x - camera_offset, draw_y))
+            dirty_rects.append(surface.blit(self.image, (self.x - camera_offset, draw_y)))
         
         # Draw boost indicator
         if self.boost_available:
-            pygame.draw.circle(surface, (0, 255, 0), (int(self.x - camera_offset + 70), int(draw_y + 10)), 5)
+            dirty_rects.append(pygame.draw.circle(surface, (0, 255, 0), (int(self.x - camera_offset + 70), int(draw_y + 10)), 5))
         elif self.boosting:
-            pygame.draw.circle(surface, (255, 165, 0), (int(self.x - camera_offset + 70), int(draw_y + 10)), 5)
+            dirty_rects.append(pygame.draw.circle(surface, (255, 165, 0), (int(self.x - camera_offset + 70), int(draw_y + 10)), 5))
         else:
             cooldown_percent = 1 - (self.boost_timer / self.boost_cooldown)
             if cooldown_percent > 0.5:
                 color = (255, 255, 0)  # Yellow when more than half ready
             else:
                 color = (150, 150, 150)  # Gray when less than half ready
-            pygame.draw.circle(surface, color, (int(self.x - camera_offset + 70), int(draw_y + 10)), 5)
+            dirty_rects.append(pygame.draw.circle(surface, color, (int(self.x - camera_offset + 70), int(draw_y + 10)), 5))
         
         # Draw air effect indicator when in air
         if self.in_air:
@@ -354,86 +643,94 @@ class Car:
                 start_y = draw_y + 20 + (i * 5) - (i * 5)
                 end_x = start_x - 20
                 end_y = start_y
-                pygame.draw.line(surface, (200, 200, 255, 150), 
-                                (start_x, start_y), (end_x, end_y), 2)
+                dirty_rects.append(pygame.draw.line(surface, (200, 200, 255, 150), 
+                                (start_x, start_y), (end_x, end_y), 2))
         
         # Draw spinning indicator
         if self.spinning:
             spin_text = pygame.font.SysFont(None, 24).render("SPINNING!", True, (255, 50, 50))
-            surface.blit(spin_text, (self.x - camera_offset - 20, draw_y - 30))
+            dirty_rects.append(surface.blit(spin_text, (self.x - camera_offset - 20, draw_y - 30)))
             
         # Draw penalty indicator
         if self.penalized:
             penalty_text = pygame.font.SysFont(None, 24).render("PENALTY!", True, (255, 0, 0))
-            surface.blit(penalty_text, (self.x - camera_offset - 20, draw_y - 50))
+            dirty_rects.append(surface.blit(penalty_text, (self.x - camera_offset - 20, draw_y - 50)))
             
             # Draw red flashing rectangle around car
             if self.penalty_time % 10 < 5:  # Flash every 5 frames
-                pygame.draw.rect(surface, (255, 0, 0), 
+                dirty_rects.append(pygame.draw.rect(surface, (255, 0, 0), 
                                (self.x - camera_offset - 10, draw_y - 10, 
                                 self.image.get_width() + 20, self.image.get_height() + 20), 
-                               2)
+                               2))
+        
+        return dirty_rects
 
 class PlayerCar(Car):
-    def __init__(self, x, y, image, lane, player_num=1):
-        super().__init__(x, y, image, lane)
+    __slots__ = ("player_num",)
+    
+    def __init__(self, x, y, image, lane, player_num=1, effects=True, effects_rng=None, fixed_point=False):
+        super().__init__(x, y, image, lane, effects, effects_rng, fixed_point)
         self.player_num = player_num  # 1 or 2
     
     def handle_input(self, keys):
+        self.apply_input(*self.read_input(keys))
+    
+    def read_input(self, keys):
+        """The (accelerate, boost) controls held on the keyboard"""
         # Different controls based on player number
         if self.player_num == 1:
-            # Player 1 controls: Arrow keys
-            if keys[pygame.K_RIGHT] or keys[pygame.K_UP]:
-                self.acceleration = self.base_acceleration
-                self.add_effects()
-            else:
-                self.acceleration = 0
-            
-            # Boost
-            if keys[pygame.K_SPACE]:
-                if self.activate_boost():
-                    # Add extra boost effects
-                    if self.in_air:
-                        # Enhanced air boost effects
-                        for _ in range(15):
-                            self.particles.add_boost_trail(
-                                self.x + 10 + random.uniform(-10, 10),
-                                self.y + 30 + random.uniform(-5, 5)
-                            )
-                    else:
-                        self.add_effects()
+            # Player 1 controls: Arrow keys, SPACE to boost
+            accelerate = keys[pygame.K_RIGHT] or keys[pygame.K_UP]
+            boost = keys[pygame.K_SPACE]
         else:
-            # Player 2 controls: WASD
-            if keys[pygame.K_d] or keys[pygame.K_w]:
-                self.acceleration = self.base_acceleration
-                self.add_effects()
-            else:
-                self.acceleration = 0
-            
-            # Boost
-            if keys[pygame.K_LSHIFT]:
-                if self.activate_boost():
-                    # Add extra boost effects
-                    if self.in_air:
-                        # Enhanced air boost effects
-                        for _ in range(15):
-                            self.particles.add_boost_trail(
-                                self.x + 10 + random.uniform(-10, 10),
-                                self.y + 30 + random.uniform(-5, 5)
-                            )
-                    else:
-                        self.add_effects()
+            # Player 2 controls: WASD, LEFT SHIFT to boost
+            accelerate = keys[pygame.K_d] or keys[pygame.K_w]
+            boost = keys[pygame.K_LSHIFT]
+        return bool(accelerate), bool(boost)
+    
+    def apply_input(self, accelerate, boost):
+        """Apply one step of driver input (also used for scripted and replayed races)"""
+        if accelerate:
+            self.acceleration = self.base_acceleration
+            self.add_effects()
+        else:
+            self.acceleration = 0
+        
+        # Boost
+        if boost:
+            if self.activate_boost():
+                # Add extra boost effects
+                if self.in_air and self.effects:
+                    # Enhanced air boost effects
+                    for _ in range(15):
+                        self.particles.add_boost_trail(
+                            self.x + 10 + self.effects_rng.uniform(-10, 10),
+                            self.y + 30 + self.effects_rng.uniform(-5, 5)
+                        )
+                else:
+                    self.add_effects()
 
 class AICar(Car):
-    def __init__(self, x, y, image, lane, difficulty=1.0):
-        super().__init__(x, y, image, lane)
+    __slots__ = ("rng", "difficulty", "reaction_time", "decision_interval", "reacting", "decision_due",
+                 "reaction_countdown", "decision_countdown")
+    
+    def __init__(self, x, y, image, lane, difficulty=1.0, rng=None, effects=True, effects_rng=None,
+                 fixed_point=False):
+        super().__init__(x, y, image, lane, effects, effects_rng, fixed_point)
+        
+        # Random source for AI decisions (kept apart from the one cosmetic
+        # effects use, so races don't depend on how many frames were drawn)
+        self.rng = rng or random
         
         # AI properties
         self.difficulty = difficulty  # 0.0 to 2.0, with 1.0 being "normal"
-        self.reaction_time = random.uniform(30, 60) / difficulty  # Frames before AI starts
-        self.reaction_timer = self.reaction_time
-        self.decision_timer = 0
-        self.decision_interval = random.randint(30, 90)  # How often AI makes decisions
+        self.reaction_time = self.rng.uniform(30, 60) / difficulty  # Frames before AI starts
+        self.decision_interval = self.rng.randint(30, 90)  # How often AI makes decisions
+        self.reacting = True
+        self.decision_due = False
+        # The AI drives from the first update after its reaction time, penalty or not
+        self.reaction_countdown = self.timers.schedule(math.ceil(self.reaction_time) + 1, self.end_reaction)
+        self.decision_countdown = None
         
         # Adjust car properties based on difficulty
         self.base_acceleration *= difficulty
@@ -444,21 +741,76 @@ class AICar(Car):
         
         if race_active and not self.finished:
             # Handle AI reaction time at start
-            if self.reaction_timer > 0:
-                self.reaction_timer -= 1
+            if self.reacting:
                 self.acceleration = 0
             else:
                 # Basic AI: accelerate most of the time
-                self.acceleration = self.base_acceleration * random.uniform(0.8, 1.0)
+                self.acceleration = self.base_acceleration * self.rng.uniform(0.8, 1.0)
                 self.add_effects()
                 
                 # Occasionally use boost
-                self.decision_timer += 1
-                if self.decision_timer >= self.decision_interval:
-                    self.decision_timer = 0
-                    self.decision_interval = random.randint(30, 90)
+                if self.decision_due:
+                    self.decision_due = False
+                    self.decision_interval = self.rng.randint(30, 90)
+                    self.decision_countdown = self.timers.schedule(self.decision_interval, self.decide)
                     
                     # Higher chance to boost with higher difficulty
-                    if random.random() < 0.3 * self.difficulty:
+                    if self.rng.random() < 0.3 * self.difficulty:
                         if self.activate_boost():
                             self.add_effects()
+    
+    def coast_run(self, tick, limit, source=None):
+        return super().coast_run(tick, limit, rng=self.rng, reacting=self.reacting)
+    
+    def countdowns(self):
+        return super().countdowns() + (
+            ("reaction_countdown", self.end_reaction),
+            ("decision_countdown", self.decide)
+        )
+    
+    def end_reaction(self):
+        self.reacting = False
+        # The first driving tick counts towards the first decision
+        self.decision_countdown = self.timers.schedule(self.decision_interval - 1, self.decide)
+    
+    def decide(self):
+        self.decision_due = True
+
+class GhostCar(Car):
+    """
+    A recorded run played back in a lane
+    
+    The ghost's position comes straight from its run's stream of (distance,
+    jump height) samples, one per race tick, so it runs no physics, hits
+    no obstacles and has no particles.
+    """
+    __slots__ = ("run", "samples")
+    
+    def __init__(self, x, y, image, lane, run):
+        super().__init__(x, y, image, lane, effects=False)
+        self.run = run  # A GhostRun
+        self.samples = run.samples()
+    
+    def seek(self, tick):
+        """Carry on from the sample for race tick tick (e.g. after restoring a snapshot)"""
+        self.samples.close()
+        self.samples = self.run.samples(tick)
+    
+    def update(self, race_active=True, ramps=None, oil_spills=None, traffic_lights=None):
+        self.prev_distance = self.distance
+        self.prev_jump_height = self.jump_height
+        
+        if race_active and not self.finished:
+            sample = next(self.samples, None)
+            if sample is not None:  # A run that ended early just stops
+                self.distance, self.jump_height = sample
+                self.speed = self.distance - self.prev_distance
+                self.in_air = self.jump_height > 0
+        
+        self.update_bounce()
+    
+    def draw(self, surface, camera_offset=0, alpha=1.0):
+        """Draw the ghost (its image is expected to be translucent) and return the region touched"""
+        draw_y = self.y + self.bounce_offset
+        draw_y -= self.prev_jump_height + (self.jump_height - self.prev_jump_height) * alpha
+        return [surface.blit(self.image, (self.x - camera_offset, draw_y))]
@@ -0,0 +1,53 @@
+"""
+Swept (continuous) collision between a car and the track
+
+Instead of testing only where a car ends up after a step, sweep() looks
+at the whole stretch of road covered during the step, so no obstacle can
+be skipped however far the car moves in one step.
+"""
+
+from track import HIT_RANGE
+
+# Obstacle kinds reported by sweep()
+RAMP = "ramp"
+OIL = "oil"
+LIGHT = "light"
+
+def entry_fraction(old_distance, travel, edge):
+    """How far into the step (0.0 to 1.0) a car moving from old_distance reaches edge"""
+    if travel <= 0 or edge <= old_distance:
+        return 0.0
+    return (edge - old_distance) / travel
+
+def sweep(old_distance, new_distance, lane, ramps=None, oil_spills=None, traffic_lights=None):
+    """
+    Every obstacle touched while moving from old_distance to new_distance
+
+    Ramps and oil spills (in the car's lane) are touched when the covered
+    stretch comes within HIT_RANGE of them; traffic lights when the car
+    crosses their stop line (old < position <= new). Obstacles are
+    ObstacleIndex instances.
+
+    Returns (fraction, kind, obstacle) tuples in the order they are reached,
+    fraction being how far into the step the first contact happens.
+    """
+    travel = new_distance - old_distance
+    low = old_distance - HIT_RANGE
+    high = new_distance + HIT_RANGE
+    hits = []
+
+    if traffic_lights:
+        for light in traffic_lights.crossed(old_distance, new_distance):
+            hits.append((entry_fraction(old_distance, travel, light.position), LIGHT, light))
+
+    if ramps:
+        for ramp in ramps.within(low, high):
+            hits.append((entry_fraction(old_distance, travel, ramp.position - HIT_RANGE), RAMP, ramp))
+
+    if oil_spills:
+        for spill in oil_spills.within(low, high, lane):
+            hits.append((entry_fraction(old_distance, travel, spill.position - HIT_RANGE), OIL, spill))
+
+    # Stable sort: obstacles reached at the same moment keep the order above
+    hits.sort(key=lambda hit: hit[0])
+    return hits
@@ -1,96 +1,252 @@
 import pygame
+import os
 import sys
-import random
 import math
+import argparse
 from pygame.locals import *
 from assets import load_assets, SCREEN_WIDTH, SCREEN_HEIGHT
 from particles import ParticleSystem
-from car import PlayerCar, AICar
+from car import PlayerCar, AICar, GhostCar
+from simulation import RaceSimulation, TICK_RATE, RACE_DISTANCE
+from rendering import DirtyRectTracker, FrameScheduler
+from hud import Hud
+from replay import ReplayRecorder
+from ghost import GhostRecorder, load_ghost
+from snapshot import snapshot_game, restore_game
+from netplay import UdpTransport, RollbackSession, connect
+from spectator import SpectatorPublisher, launch_spectator
+from random_streams import RandomStreams, AI, TRACK, ASSETS, EFFECTS
 
 # Initialize pygame
 pygame.init()
 
 # Game constants
-FPS = 60
-RACE_DISTANCE = 6000  # Extended race distance (was 3000)
+FPS = 60  # Rendering frame rate cap
+TICK_MS = 1000 / TICK_RATE
+MAX_SUBSTEPS = 5  # Most simulation steps run per rendered frame before dropping time
 LANE_HEIGHT = 80
 
+# Replays (every race is recorded; finished ones can be written to REPLAY_DIR)
+SAVE_REPLAYS = False
+REPLAY_DIR = "replays"
+
+# Ghost mode: the player's fastest finished run is kept and can be raced in lane 2
+GHOST_FILE = os.path.join(REPLAY_DIR, "best_run.ghost")
+GHOST_ALPHA = 110  # Ghost car opacity (0-255)
+
+# Rendering options
+DIRTY_RECTS = False  # Only push changed screen regions while the camera is still
+SHOW_HUD_STATS = False  # Show how many HUD fields were re-rendered per frame
+
+# Menu screens run at a lower frame rate and only redraw when something changed
+IDLE_STATE_FPS = {
+    "title": 20,
+    "ready": 20,
+    "finished": 20
+}
+
 # Set up the display
 screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
 pygame.display.set_caption("Pixel Art Drag Race")
 clock = pygame.time.Clock()
 
 class DragRaceGame:
-    def __init__(self):
-        self.assets = load_assets()
+    def __init__(self, seed=None, fixed_point=False, record_ghost=False):
+        # Separate seeded random streams for AI, track, generated art and
+        # effects (a given seed always gives the same race)
+        self.seed = seed
+        self.fixed_point = fixed_point  # Integer car physics (see fixed_point.py)
+        self.record_ghost = record_ghost  # Save the player's best run to GHOST_FILE (live games only)
+        self.random = RandomStreams(seed)
+        self.effects_rng = self.random.stream(EFFECTS)
+        
+        self.assets = load_assets(self.random.stream(ASSETS))
         self.game_state = "title"  # title, ready, countdown, racing, finished
         self.countdown = 3
         self.countdown_timer = 0
         self.race_start_time = 0
         self.camera_offset = 0
+        self.prev_camera_offset = 0
+        
+        # Fixed-timestep simulation
+        self.ticks = 0  # Simulation steps run since the game was created
+        self.accumulator = 0.0  # Real time (ms) not yet simulated
         
         # Game mode
         self.two_player_mode = False
+        self.ghost_mode = False
+        self.best_run = load_ghost(GHOST_FILE)
+        self.ghost_recorder = None
         
         # Season tracking
         self.seasons = ["spring", "summer", "autumn", "winter"]
         self.current_season = 0
         self.season_change_distance = RACE_DISTANCE / len(self.seasons)
         
-        # Create ramps
-        self.ramps = [
-            {"position": 1000, "height": 80},
-            {"position": 2500, "height": 100},
-            {"position": 4000, "height": 120},
-            {"position": 5500, "height": 90}
-        ]
-        
-        # Create oil spills
-        self.oil_spills = []
-        self.next_oil_spawn = 0
-        self.oil_spawn_interval = 300  # Frames between oil spawn attempts
-        self.max_oil_spills = 5
-        
-        # Create traffic lights
-        self.traffic_lights = [
-            {"position": 1500, "state": "green", "timer": 0, "cycle_time": 180},  # 3 seconds at 60 FPS
-            {"position": 3000, "state": "green", "timer": 60, "cycle_time": 180},
-            {"position": 4500, "state": "green", "timer": 120, "cycle_time": 180}
-        ]
-        
         # Create lanes
         self.lanes = [
             {"y": SCREEN_HEIGHT - 180},  # Player 1 lane
             {"y": SCREEN_HEIGHT - 260}   # Player 2/AI lane
         ]
         
-        # Create cars
-        self.player = PlayerCar(100, self.lanes[0]["y"], self.assets['player_car'], 0)
-        self.opponent = AICar(100, self.lanes[1]["y"], self.assets['opponent_car'], 1, difficulty=1.0)
+        # Create cars and the race they drive in (ramps, oil spills, traffic lights)
+        player = PlayerCar(100, self.lanes[0]["y"], self.assets['player_car'], 0, effects_rng=self.effects_rng,
+                           fixed_point=fixed_point)
+        self.race = RaceSimulation(player, self.create_opponent(), rng=self.random.stream(TRACK))
         
         # Create global particle system for environment effects
-        self.particles = ParticleSystem()
+        self.particles = ParticleSystem(self.effects_rng)
         
         # Create finish line
         self.finish_line_x = RACE_DISTANCE
+        self.finish_overlay = None
+        
+        # Replay of the current race (recording starts with the countdown)
+        self.recorder = None
+        self.replay = None
+        self.controls = None  # Controls for the next race step
+        
+        # Rollback session when racing another player over the network
+        self.netplay = None
+        
+        # Shared memory the state is published to every tick for spectators (see spectator.py)
+        self.spectator = None
         
         # UI elements
         self.font = pygame.font.SysFont(None, 48)
         self.small_font = pygame.font.SysFont(None, 24)
+        
+        # Racing HUD (fields are only re-rendered when their text changes)
+        self.hud = Hud(self.small_font)
+        self.hud.add_field("speed", (20, 20))
+        self.hud.add_field("distance", (20, 50))
+        self.hud.add_field("boost", (20, 80))
+        self.hud.add_field("season", (20, 110))
+        self.hud.add_field("air", (20, 140))
+        self.hud.add_field("spin", (20, 170))
+        self.hud.add_field("penalty", (20, 200))
+        self.hud.add_field("penalty_time", (20, 230))
+        self.hud.add_field("time", (SCREEN_WIDTH - 150, 20))
+        
+        # Dirty-rect rendering
+        self.dirty = DirtyRectTracker(DIRTY_RECTS)
+        self.last_drawn_camera = None
+        self.last_drawn_state = None
+    
+    # The race simulation owns the cars and the track
+    @property
+    def player(self):
+        return self.race.player
+    
+    @player.setter
+    def player(self, car):
+        self.race.player = car
+    
+    @property
+    def opponent(self):
+        return self.race.opponent
+    
+    @opponent.setter
+    def opponent(self, car):
+        self.race.opponent = car
+    
+    @property
+    def ramps(self):
+        return self.race.ramps
+    
+    @property
+    def oil_spills(self):
+        return self.race.oil_spills
+    
+    @property
+    def traffic_lights(self):
+        return self.race.traffic_lights
+    
+    def sim_time(self):
+        """Simulated time in milliseconds (independent of the rendering frame rate)"""
+        return self.ticks * 1000 / TICK_RATE
+    
+    def start_netplay(self, transport, local_player):
+        """
+        Race another player over the network (see netplay.py)
+        
+        The game must have been created with the seed connect() agreed on.
+        local_player is 0 to drive lane 1 and 1 for lane 2; either way the
+        player 1 keys drive the local car.
+        """
+        self.two_player_mode = True
+        self.ghost_mode = False
+        self.opponent = self.create_opponent()
+        self.netplay = RollbackSession(self.race, local_player, transport, self.random.seed)
+        local_car, remote_car = self.netplay.cars
+        local_car.player_num = 1
+        remote_car.player_num = 2
+        self.game_state = "ready"
     
     def start_countdown(self):
+        # Ghost races depend on the ghost file as well as the seed, and
+        # network races are rolled back and re-simulated, so neither is recorded
+        if isinstance(self.opponent, GhostCar) or self.netplay:
+            self.recorder = None
+        else:
+            self.recorder = ReplayRecorder(self.random.seed, self.two_player_mode, self.race,
+                                           fixed_point=self.fixed_point)
+        self.ghost_recorder = GhostRecorder() if self.record_ghost and not self.netplay else None
         self.game_state = "countdown"
         self.countdown = 3
-        self.countdown_timer = pygame.time.get_ticks()
+        self.countdown_timer = self.sim_time()
     
     def start_race(self):
         self.game_state = "racing"
-        self.race_start_time = pygame.time.get_ticks()
+        self.race_start_time = self.sim_time()
         self.player.start_time = self.race_start_time
         self.opponent.start_time = self.race_start_time
     
+    def human_cars(self):
+        """The cars driven by players on this machine (the second one only in two-player mode)"""
+        if self.netplay:
+            return (self.netplay.cars[0],)
+        if self.two_player_mode and isinstance(self.opponent, PlayerCar):
+            return (self.player, self.opponent)
+        return (self.player,)
+    
+    def apply_inputs(self, keys):
+        """Feed the held keys to the human-controlled cars for the next step"""
+        if self.game_state == "racing":
+            self.apply_controls([car.read_input(keys) for car in self.human_cars()])
+    
+    def apply_controls(self, controls):
+        """Set the (accelerate, boost) controls per human car for the next race step"""
+        self.controls = controls
+    
+    def advance(self, elapsed_ms, keys):
+        """
+        Run as many fixed simulation steps as the elapsed real time allows
+        
+        Returns the interpolation factor (0.0 to 1.0) between the previous
+        and the current step for drawing
+        """
+        self.accumulator += elapsed_ms
+        
+        substeps = 0
+        while self.accumulator >= TICK_MS and substeps < MAX_SUBSTEPS:
+            self.apply_inputs(keys)
+            self.update()
+            self.accumulator -= TICK_MS
+            substeps += 1
+        
+        # Too far behind (slow machine or a stall): drop the backlog rather
+        # than trying to catch up and falling further behind
+        if self.accumulator >= TICK_MS:
+            self.accumulator %= TICK_MS
+        
+        return self.accumulator / TICK_MS
+    
     def update(self):
-        current_time = pygame.time.get_ticks()
+        """Advance the game by one fixed simulation step"""
+        self.ticks += 1
+        current_time = self.sim_time()
+        self.prev_camera_offset = self.camera_offset
         
         # Handle countdown
         if self.game_state == "countdown":
@@ -109,129 +265,124 @@ class DragRaceGame:
                 if self.countdown <= 0:
                     self.start_race()
         
-        # Update traffic lights
         if self.game_state == "racing":
-            for light in self.traffic_lights:
-                light["timer"] += 1
-                if light["timer"] >= light["cycle_time"]:
-                    light["timer"] = 0
-                    # Cycle through states: green -> yellow -> red -> green
-                    if light["state"] == "green":
-                        light["state"] = "yellow"
-                    elif light["state"] == "yellow":
-                        light["state"] = "red"
-                    else:  # red
-                        light["state"] = "green"
-        
-        # Update cars
-        race_active = self.game_state == "racing"
-        self.player.update(race_active, self.ramps, self.oil_spills, self.traffic_lights)
-        self.opponent.update(race_active, self.ramps, self.oil_spills, self.traffic_lights)
-        
-        # Spawn oil spills randomly during race
-        if race_active and len(self.oil_spills) < self.max_oil_spills:
-            self.next_oil_spawn -= 1
-            if self.next_oil_spawn <= 0:
-                # Reset timer
-                self.next_oil_spawn = self.oil_spawn_interval
-                
-                # Random chance to spawn oil
-                if random.random() < 0.3:  # 30% chance
-                    # Find a position that's not too close to existing obstacles
-                    valid_position = False
-                    position = 0
-                    lane = 0
-                    
-                    for _ in range(10):  # Try 10 times to find a valid position
-                        # Random position between 800 and RACE_DISTANCE - 800
-                        position = random.randint(800, int(RACE_DISTANCE - 800))
-                        lane = random.randint(0, 1)  # Random lane
-                        
-                        # Check if too close to ramps
-                        too_close_to_ramp = False
-                        for ramp in self.ramps:
-                            if abs(position - ramp["position"]) < 300:
-                                too_close_to_ramp = True
-                                break
-                        
-                        # Check if too close to other oil spills
-                        too_close_to_oil = False
-                        for spill in self.oil_spills:
-                            if abs(position - spill["position"]) < 500:
-                                too_close_to_oil = True
-                                break
-                                
-                        # Check if too close to traffic lights
-                        too_close_to_light = False
-                        for light in self.traffic_lights:
-                            if abs(position - light["position"]) < 300:
-                                too_close_to_light = True
-                                break
-                        
-                        if not too_close_to_ramp and not too_close_to_oil and not too_close_to_light:
-                            valid_position = True
-                            break
-                    
-                    if valid_position:
-                        self.oil_spills.append({
-                            "position": position,
-                            "lane": lane,
-                            "time": current_time
-                        })
-        
-        # Check for finish
-        if race_active:
-            # Update camera to follow player
-            target_offset = max(0, self.player.distance - 300)
-            self.camera_offset += (target_offset - self.camera_offset) * 0.1
-            
-            # Check if player finished
-            if self.player.distance >= RACE_DISTANCE and not self.player.finished:
-                self.player.finished = True
-                self.player.finish_time = current_time
-                
+            # Record and apply what drives this step (nothing is pressed on the step the countdown ends with)
+            controls = self.controls or [(False, False)] * len(self.human_cars())
+            self.controls = None
+            if self.netplay:
+                # The session applies both players' inputs and advances the race
+                # (or waits for the other player when too far ahead of them)
+                finished_now = self.netplay.update(controls[0])
+            else:
+                if self.recorder:
+                    self.recorder.record(controls)
+                for car, (accelerate, boost) in zip(self.human_cars(), controls):
+                    car.apply_input(accelerate, boost)
+                
+                # Advance the race itself
+                finished_now = self.race.step()
+            if self.ghost_recorder and (not self.player.finished or self.player in finished_now):
+                self.ghost_recorder.record(self.player)
+            for car in finished_now:
                 # Add finish effects
                 for _ in range(50):
                     self.particles.add_sparks(
-                        SCREEN_WIDTH - 100 + random.uniform(-20, 20),
-                        self.player.y + random.uniform(-20, 20),
+                        SCREEN_WIDTH - 100 + self.effects_rng.uniform(-20, 20),
+                        car.y + self.effects_rng.uniform(-20, 20),
                         50
                     )
             
-            # Check if opponent finished
-            if self.opponent.distance >= RACE_DISTANCE and not self.opponent.finished:
-                self.opponent.finished = True
-                self.opponent.finish_time = current_time
-                
-                # Add finish effects
-                for _ in range(50):
-                    self.particles.add_sparks(
-                        SCREEN_WIDTH - 100 + random.uniform(-20, 20),
-                        self.opponent.y + random.uniform(-20, 20),
-                        50
-                    )
+            # Update camera to follow player
+            target_offset = max(0, self.player.distance - 300)
+            self.camera_offset += (target_offset - self.camera_offset) * 0.1
             
-            # Check if race is over
-            if self.player.finished and self.opponent.finished:
+            # Check if race is over (over the network, once the result can't be rolled back)
+            if self.race.finished and (not self.netplay or self.netplay.result_final()):
                 self.game_state = "finished"
+                self.finish_overlay = self.build_finish_overlay()
+                self.save_replay()
+                self.save_best_run()
+        else:
+            # Cars only animate outside of the race
+            self.player.update(False)
+            self.opponent.update(False)
+            
+            # Keep answering the other player (who may still need our inputs)
+            if self.netplay:
+                self.netplay.sync()
         
         # Update particles
         self.particles.update()
         
         # Add random environment particles
-        if random.random() < 0.1 and self.game_state in ["racing", "countdown"]:
+        if self.effects_rng.random() < 0.1 and self.game_state in ["racing", "countdown"]:
             self.particles.add_particle(
-                random.randint(0, SCREEN_WIDTH),
-                random.randint(0, SCREEN_HEIGHT // 2),
+                self.effects_rng.randint(0, SCREEN_WIDTH),
+                self.effects_rng.randint(0, SCREEN_HEIGHT // 2),
                 (255, 255, 255),
-                random.uniform(1, 3),
-                random.uniform(0.5, 2),
-                math.pi / 2 + random.uniform(-0.2, 0.2),
-                random.randint(30, 90),
+                self.effects_rng.uniform(1, 3),
+                self.effects_rng.uniform(0.5, 2),
+                math.pi / 2 + self.effects_rng.uniform(-0.2, 0.2),
+                self.effects_rng.randint(30, 90),
                 100
             )
+        
+        if self.spectator:
+            self.spectator.publish(self)
+    
+    def save_replay(self):
+        """Keep the finished race's replay (and write it out if SAVE_REPLAYS is on)"""
+        if not self.recorder:
+            return
+        self.replay = self.recorder.finish()
+        self.recorder = None
+        if SAVE_REPLAYS:
+            os.makedirs(REPLAY_DIR, exist_ok=True)
+            self.replay.save(os.path.join(REPLAY_DIR, f"race-{self.replay.seed}.drr"))
     
-    def draw(self):
+    def snapshot(self):
+        """The complete game state as bytes (see snapshot.py)"""
+        return snapshot_game(self)
+    
+    def restore(self, data):
+        """Go back to the state a snapshot() was taken in"""
+        restore_game(self, data)
+    
+    def save_best_run(self):
+        """Keep the player's run as the ghost if it beat the best one so far"""
+        recorder, self.ghost_recorder = self.ghost_recorder, None
+        if not recorder or self.player.finish_tick is None:
+            return
+        if self.best_run and self.best_run.finish_tick <= self.player.finish_tick:
+            return
+        if isinstance(self.opponent, GhostCar):
+            self.opponent.samples.close()  # Done with the old file
+        os.makedirs(os.path.dirname(GHOST_FILE), exist_ok=True)
+        recorder.save(GHOST_FILE, self.player.finish_tick)
+        self.best_run = load_ghost(GHOST_FILE)
+    
+    def frame_signature(self):
+        """Summary of what is visible on idle screens, used to skip redundant redraws"""
+        particles_alive = (self.particles.particles or self.player.particles.particles
+                           or (self.opponent.particles is not None and self.opponent.particles.particles))
+        return (
+            int(self.player.y + self.player.bounce_offset),
+            int(self.opponent.y + self.opponent.bounce_offset),
+            self.two_player_mode,
+            # Live particles move every frame
+            self.ticks if particles_alive else 0
+        )
+    
+    def draw(self, alpha=1.0):
+        """Draw the game, interpolating moving things alpha of the way into the last step"""
+        camera_offset = self.prev_camera_offset + (self.camera_offset - self.prev_camera_offset) * alpha
+        
+        # Anything that scrolls with the camera invalidates the whole frame
+        if camera_offset != self.last_drawn_camera or self.game_state != self.last_drawn_state:
+            self.dirty.invalidate()
+            self.last_drawn_camera = camera_offset
+            self.last_drawn_state = self.game_state
+        
         # Determine which season background to use based on player's progress
         if self.game_state == "racing" or self.game_state == "finished":
             progress = min(1.0, self.player.distance / RACE_DISTANCE)
@@ -256,8 +407,8 @@ class DragRaceGame:
                     if abs(self.player.distance - boundary) < 100:
                         # Add particles for season transition
                         for _ in range(5):
-                            x = random.randint(0, SCREEN_WIDTH)
-                            y = random.randint(0, SCREEN_HEIGHT // 2)
+                            x = self.effects_rng.randint(0, SCREEN_WIDTH)
+                            y = self.effects_rng.randint(0, SCREEN_HEIGHT // 2)
                             
                             if i == 1:  # Spring to Summer
                                 color = (255, 255, 100)  # Yellow for summer sun
@@ -269,23 +420,23 @@ class DragRaceGame:
                             self.particles.add_particle(
                                 x, y,
                                 color,
-                                random.uniform(2, 5),
-                                random.uniform(1, 3),
-                                math.pi / 2 + random.uniform(-0.5, 0.5),
-                                random.randint(30, 60),
+                                self.effects_rng.uniform(2, 5),
+                                self.effects_rng.uniform(1, 3),
+                                math.pi / 2 + self.effects_rng.uniform(-0.5, 0.5),
+                                self.effects_rng.randint(30, 60),
                                 150
                             )
         else:
             # Default to summer background for menus
             screen.blit(self.assets['background_summer'], (0, 0))
         
-        # Draw ramps
-        for ramp in self.ramps:
-            ramp_x = ramp["position"] - self.camera_offset
+        # Draw ramps (only the ones on screen are looked up)
+        for ramp in self.ramps.between(camera_offset, camera_offset + SCREEN_WIDTH):
+            ramp_x = ramp.position - camera_offset
             if 0 <= ramp_x <= SCREEN_WIDTH:
                 # Draw ramp base
                 ramp_width = 120
-                ramp_height = ramp["height"]
+                ramp_height = ramp.height
                 
                 # Calculate color based on season
                 progress = min(1.0, self.player.distance / RACE_DISTANCE)
@@ -363,8 +514,8 @@ class DragRaceGame:
                     )
                 
                 # Add ramp particles for visual interest
-                if random.random() > 0.8:
-                    particle_x = ramp_x + random.randint(0, ramp_width)
+                if self.effects_rng.random() > 0.8:
+                    particle_x = ramp_x + self.effects_rng.randint(0, ramp_width)
                     particle_y = road_y - (ramp_height * (particle_x - ramp_x) / ramp_width // 2)
                     
                     if current_season == "spring":
@@ -380,15 +531,15 @@ class DragRaceGame:
                         particle_x,
                         particle_y,
                         color,
-                        random.uniform(1, 3),
-                        random.uniform(0.5, 1.5),
-                        -math.pi/2 + random.uniform(-0.3, 0.3),
-                        random.randint(20, 40),
+                        self.effects_rng.uniform(1, 3),
+                        self.effects_rng.uniform(0.5, 1.5),
+                        -math.pi/2 + self.effects_rng.uniform(-0.3, 0.3),
+                        self.effects_rng.randint(20, 40),
                         150
                     )
         
         # Draw finish line
-        finish_x = self.finish_line_x - self.camera_offset
+        finish_x = self.finish_line_x - camera_offset
         if 0 <= finish_x <= SCREEN_WIDTH:
             for y in range(0, SCREEN_HEIGHT, 20):
                 color = (255, 255, 255) if (y // 10) % 2 == 0 else (0, 0, 0)
@@ -396,20 +547,20 @@ class DragRaceGame:
         
         # Draw distance markers
         for i in range(1, int(RACE_DISTANCE / 500) + 1):
-            marker_x = i * 500 - self.camera_offset
+            marker_x = i * 500 - camera_offset
             if 0 <= marker_x <= SCREEN_WIDTH:
                 pygame.draw.line(screen, (200, 200, 200), (marker_x, SCREEN_HEIGHT - 300), (marker_x, SCREEN_HEIGHT))
                 text = self.small_font.render(f"{i*500}m", True, (255, 255, 255))
                 screen.blit(text, (marker_x - text.get_width() // 2, SCREEN_HEIGHT - 320))
         
         # Draw environment particles
-        self.particles.draw(screen)
+        self.dirty.add(self.particles.draw(screen))
         
         # Draw cars with camera offset
-        self.player.x = 100 + self.player.distance
-        self.opponent.x = 100 + self.opponent.distance
-        self.player.draw(screen, self.camera_offset)
-        self.opponent.draw(screen, self.camera_offset)
+        for car in (self.player, self.opponent):
+            car.x = 100 + car.prev_distance + (car.distance - car.prev_distance) * alpha
+        self.dirty.add(self.player.draw(screen, camera_offset, alpha))
+        self.dirty.add(self.opponent.draw(screen, camera_offset, alpha))
         
         # Draw UI
         if self.game_state == "title":
@@ -421,12 +572,19 @@ class DragRaceGame:
             screen.blit(subtitle, (SCREEN_WIDTH // 2 - subtitle.get_width() // 2, 160))
             
             # Game mode indicator
-            mode_text = "TWO PLAYER MODE" if self.two_player_mode else "ONE PLAYER MODE"
-            mode_color = (0, 255, 255) if self.two_player_mode else (255, 255, 255)
+            if self.two_player_mode:
+                mode_text, mode_color = "TWO PLAYER MODE", (0, 255, 255)
+            elif self.ghost_mode:
+                mode_text, mode_color = "GHOST MODE", (180, 180, 255)
+            else:
+                mode_text, mode_color = "ONE PLAYER MODE", (255, 255, 255)
             mode_render = self.small_font.render(mode_text, True, mode_color)
             screen.blit(mode_render, (SCREEN_WIDTH // 2 - mode_render.get_width() // 2, 200))
             
-            toggle_text = self.small_font.render("Press T to toggle game mode", True, (200, 200, 200))
+            toggle_label = "Press T to toggle game mode"
+            if self.best_run:
+                toggle_label += ", G to race your best run"
+            toggle_text = self.small_font.render(toggle_label, True, (200, 200, 200))
             screen.blit(toggle_text, (SCREEN_WIDTH // 2 - toggle_text.get_width() // 2, 230))
             
             # Instructions
@@ -459,106 +617,175 @@ class DragRaceGame:
         
         elif self.game_state == "countdown":
             text = self.font.render(str(self.countdown), True, (255, 0, 0))
-            screen.blit(text, (SCREEN_WIDTH // 2 - text.get_width() // 2, 100))
+            self.dirty.add(screen.blit(text, (SCREEN_WIDTH // 2 - text.get_width() // 2, 100)))
         
         elif self.game_state == "racing" or self.game_state == "finished":
-            # Draw speed
-            speed_text = self.small_font.render(f"Speed: {int(self.player.speed * 20)} km/h", True, (255, 255, 255))
-            screen.blit(speed_text, (20, 20))
+            # Speed
+            self.hud.set("speed", f"Speed: {int(self.player.speed * 20)} km/h")
             
-            # Draw distance
-            distance_text = self.small_font.render(f"Distance: {int(self.player.distance)} / {RACE_DISTANCE}", True, (255, 255, 255))
-            screen.blit(distance_text, (20, 50))
+            # Distance
+            self.hud.set("distance", f"Distance: {int(self.player.distance)} / {RACE_DISTANCE}")
             
-            # Draw boost status
+            # Boost status
             if self.player.boost_available:
-                boost_text = self.small_font.render("BOOST: READY", True, (0, 255, 0))
+                self.hud.set("boost", "BOOST: READY", (0, 255, 0))
             elif self.player.boosting:
-                boost_text = self.small_font.render("BOOST: ACTIVE", True, (255, 165, 0))
+                self.hud.set("boost", "BOOST: ACTIVE", (255, 165, 0))
             else:
-                boost_text = self.small_font.render("BOOST: CHARGING", True, (150, 150, 150))
-            screen.blit(boost_text, (20, 80))
+                self.hud.set("boost", "BOOST: CHARGING", (150, 150, 150))
             
-            # Draw current season
+            # Current season
             progress = min(1.0, self.player.distance / RACE_DISTANCE)
             season_index = min(3, int(progress * 4))
-            season_text = self.small_font.render(f"Season: {self.seasons[season_index].capitalize()}", True, (255, 255, 255))
-            screen.blit(season_text, (20, 110))
+            self.hud.set("season", f"Season: {self.seasons[season_index].capitalize()}")
             
-            # Draw air status if player is in air
+            # Air status if player is in air
             if self.player.in_air:
-                air_text = self.small_font.render("AIR TIME!", True, (100, 200, 255))
-                screen.blit(air_text, (20, 140))
+                self.hud.set("air", "AIR TIME!", (100, 200, 255))
+            else:
+                self.hud.hide("air")
                 
-            # Draw spinning status if player is spinning
+            # Spinning status if player is spinning
             if self.player.spinning:
-                spin_text = self.small_font.render("SPINNING!", True, (255, 50, 50))
-                screen.blit(spin_text, (20, 170))
+                self.hud.set("spin", "SPINNING!", (255, 50, 50))
+            else:
+                self.hud.hide("spin")
                 
-            # Draw penalty status if player is penalized
+            # Penalty status if player is penalized
             if self.player.penalized:
-                penalty_text = self.small_font.render("RED LIGHT PENALTY!", True, (255, 0, 0))
-                screen.blit(penalty_text, (20, 200))
+                self.hud.set("penalty", "RED LIGHT PENALTY!", (255, 0, 0))
                 
                 # Show remaining penalty time
-                remaining = (self.player.penalty_duration - self.player.penalty_time) / 60  # Convert to seconds
-                time_text = self.small_font.render(f"Stop: {remaining:.1f}s", True, (255, 0, 0))
-                screen.blit(time_text, (20, 230))
+                remaining = (self.player.penalty_duration - self.player.penalty_time) / TICK_RATE  # Convert to seconds
+                self.hud.set("penalty_time", f"Stop: {remaining:.1f}s", (255, 0, 0))
+            else:
+                self.hud.hide("penalty")
+                self.hud.hide("penalty_time")
             
-            # Draw race time
+            # Race time
             if self.game_state == "racing":
-                elapsed = (pygame.time.get_ticks() - self.race_start_time) / 1000
-                time_text = self.small_font.render(f"Time: {elapsed:.2f}s", True, (255, 255, 255))
-                screen.blit(time_text, (SCREEN_WIDTH - 150, 20))
-        
-        # Draw finish screen
-        if self.game_state == "finished":
-            overlay = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT), pygame.SRCALPHA)
-            overlay.fill((0, 0, 0, 150))
-            screen.blit(overlay, (0, 0))
-            
-            player_time = (self.player.finish_time - self.race_start_time) / 1000
-            opponent_time = (self.opponent.finish_time - self.race_start_time) / 1000
-            
-            if player_time < opponent_time:
-                result = "YOU WIN!"
-                color = (0, 255, 0)
-            elif opponent_time < player_time:
-                result = "YOU LOSE!"
-                color = (255, 0, 0)
+                elapsed = (self.sim_time() - self.race_start_time) / 1000
+                self.hud.set("time", f"Time: {elapsed:.2f}s")
             else:
-                result = "IT'S A TIE!"
-                color = (255, 255, 0)
+                self.hud.hide("time")
             
-            result_text = self.font.render(result, True, color)
-            player_time_text = self.small_font.render(f"Your Time: {player_time:.2f}s", True, (255, 255, 255))
-            opponent_time_text = self.small_font.render(f"Opponent Time: {opponent_time:.2f}s", True, (255, 255, 255))
-            restart_text = self.small_font.render("Press R to restart or ESC to quit", True, (200, 200, 200))
+            self.dirty.add(self.hud.draw(screen))
             
-            screen.blit(result_text, (SCREEN_WIDTH // 2 - result_text.get_width() // 2, SCREEN_HEIGHT // 2 - 60))
-            screen.blit(player_time_text, (SCREEN_WIDTH // 2 - player_time_text.get_width() // 2, SCREEN_HEIGHT // 2))
-            screen.blit(opponent_time_text, (SCREEN_WIDTH // 2 - opponent_time_text.get_width() // 2, SCREEN_HEIGHT // 2 + 30))
-            screen.blit(restart_text, (SCREEN_WIDTH // 2 - restart_text.get_width() // 2, SCREEN_HEIGHT // 2 + 80))
+            if SHOW_HUD_STATS:
+                stats_text = self.small_font.render(
+                    f"HUD renders: {self.hud.renders_last_frame}/frame (avg {self.hud.average_renders():.2f})",
+                    True, (255, 255, 0))
+                self.dirty.add(screen.blit(stats_text, (SCREEN_WIDTH - stats_text.get_width() - 20, SCREEN_HEIGHT - 30)))
+        
+        # Draw finish screen (built once when the race finishes)
+        if self.game_state == "finished":
+            if self.finish_overlay is None:
+                self.finish_overlay = self.build_finish_overlay()
+            screen.blit(self.finish_overlay, (0, 0))
+    
+    def build_finish_overlay(self):
+        """Pre-render the darkened finish overlay together with the results panel"""
+        overlay = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT), pygame.SRCALPHA)
+        overlay.fill((0, 0, 0, 150))
+        
+        player_time = (self.player.finish_time - self.race_start_time) / 1000
+        opponent_time = (self.opponent.finish_time - self.race_start_time) / 1000
+        
+        if player_time < opponent_time:
+            result = "YOU WIN!"
+            color = (0, 255, 0)
+        elif opponent_time < player_time:
+            result = "YOU LOSE!"
+            color = (255, 0, 0)
+        else:
+            result = "IT'S A TIE!"
+            color = (255, 255, 0)
+        
+        result_text = self.font.render(result, True, color)
+        player_time_text = self.small_font.render(f"Your Time: {player_time:.2f}s", True, (255, 255, 255))
+        opponent_time_text = self.small_font.render(f"Opponent Time: {opponent_time:.2f}s", True, (255, 255, 255))
+        restart_text = self.small_font.render("Press R to restart or ESC to quit", True, (200, 200, 200))
+        
+        overlay.blit(result_text, (SCREEN_WIDTH // 2 - result_text.get_width() // 2, SCREEN_HEIGHT // 2 - 60))
+        overlay.blit(player_time_text, (SCREEN_WIDTH // 2 - player_time_text.get_width() // 2, SCREEN_HEIGHT // 2))
+        overlay.blit(opponent_time_text, (SCREEN_WIDTH // 2 - opponent_time_text.get_width() // 2, SCREEN_HEIGHT // 2 + 30))
+        overlay.blit(restart_text, (SCREEN_WIDTH // 2 - restart_text.get_width() // 2, SCREEN_HEIGHT // 2 + 80))
+        
+        return overlay
+    
+    def create_opponent(self):
+        """The lane 2 car: a second player in two-player mode, the best run in ghost mode, otherwise the AI"""
+        if self.two_player_mode:
+            return PlayerCar(100, self.lanes[1]["y"], self.assets['opponent_car'], 1, player_num=2,
+                             effects_rng=self.effects_rng, fixed_point=self.fixed_point)
+        if self.ghost_mode and self.best_run:
+            image = self.assets['opponent_car'].copy()
+            image.set_alpha(GHOST_ALPHA)
+            return GhostCar(100, self.lanes[1]["y"], image, 1, self.best_run)
+        # A fresh AI stream, so the race only depends on the seed and not on
+        # how often the mode was switched
+        return AICar(100, self.lanes[1]["y"], self.assets['opponent_car'], 1, difficulty=1.0,
+                     rng=self.random.restart(AI), effects_rng=self.effects_rng, fixed_point=self.fixed_point)
     
     def reset(self):
-        # Keep the two_player_mode setting
+        # Keep the game mode (and the seed, if one was given)
         two_player_mode = self.two_player_mode
-        self.__init__()
+        ghost_mode = self.ghost_mode
+        spectator = self.spectator
+        self.__init__(self.seed, self.fixed_point, self.record_ghost)
         self.two_player_mode = two_player_mode
+        self.ghost_mode = ghost_mode
+        self.spectator = spectator
         self.game_state = "ready"
         
-        # If in two-player mode, replace AI with a second player
-        if self.two_player_mode:
-            self.opponent = PlayerCar(100, self.lanes[1]["y"], self.assets['opponent_car'], 1, player_num=2)
+        # In two-player or ghost mode, replace the AI
+        if self.two_player_mode or self.ghost_mode:
+            self.opponent = self.create_opponent()
 
 # Main game loop
-def main():
-    game = DragRaceGame()
+def main(args=None):
+    parser = argparse.ArgumentParser(description="Pixel Art Drag Race")
+    parser.add_argument("--seed", type=int, help="Race seed (random by default)")
+    parser.add_argument("--peer", metavar="HOST:PORT", help="Race another player over UDP")
+    parser.add_argument("--port", type=int, default=5100, help="Local UDP port for network races")
+    parser.add_argument("--player", type=int, choices=(1, 2), default=1,
+                        help="Lane to drive in a network race (player 1 picks the seed)")
+    parser.add_argument("--fixed-point", action="store_true",
+                        help="Integer car physics, identical on every machine (both players need it)")
+    parser.add_argument("--spectate", action="store_true",
+                        help="Publish the race to shared memory and open a spectator window on it")
+    parser.add_argument("--save-replays", action="store_true",
+                        help=f"Write every finished race's replay to {REPLAY_DIR}/ (see render_video.py)")
+    options = parser.parse_args(args)
+    if options.save_replays:
+        global SAVE_REPLAYS
+        SAVE_REPLAYS = True
+    
+    if options.peer:
+        host, port = options.peer.rsplit(":", 1)
+        transport = UdpTransport(options.port, (host, int(port)),
+                                 "127.0.0.1" if host in ("127.0.0.1", "localhost") else "")
+        local_player = options.player - 1
+        print("Waiting for the other player...")
+        game = DragRaceGame(connect(transport, local_player, options.seed), options.fixed_point, record_ghost=True)
+        game.start_netplay(transport, local_player)
+    else:
+        game = DragRaceGame(options.seed, options.fixed_point, record_ghost=True)
+    spectator_process = None
+    if options.spectate:
+        game.spectator = SpectatorPublisher(game.random.seed)
+        print(f"Publishing to spectators as {game.spectator.name}")
+        spectator_process = launch_spectator(game.spectator.name)
+    scheduler = FrameScheduler(FPS, IDLE_STATE_FPS)
+    elapsed_ms = TICK_MS  # Run one step on the first frame
     running = True
     
     while running:
         # Handle events
+        had_input = False
         for event in pygame.event.get():
+            had_input = True
+            
             if event.type == QUIT:
                 running = False
             
@@ -572,41 +799,49 @@ def main():
                     elif game.game_state == "ready":
                         game.start_countdown()
                 
-                if event.key == K_r and game.game_state in ["finished", "racing"]:
+                if event.key == K_r and game.game_state in ["finished", "racing"] and not game.netplay:
                     game.reset()
                     
                 # Toggle two-player mode
                 if event.key == K_t and game.game_state == "title":
                     # Force toggle two-player mode
                     game.two_player_mode = not game.two_player_mode
+                    game.ghost_mode = False
                     
                     # Replace opponent with player 2 or AI based on mode
-                    if game.two_player_mode:
-                        game.opponent = PlayerCar(100, game.lanes[1]["y"], game.assets['opponent_car'], 1, player_num=2)
-                    else:
-                        game.opponent = AICar(100, game.lanes[1]["y"], game.assets['opponent_car'], 1, difficulty=1.0)
+                    game.opponent = game.create_opponent()
+                    # The mode and instruction text change without a camera or state change
+                    game.dirty.invalidate()
                     
                     print(f"Game mode changed to: {'Two Player' if game.two_player_mode else 'One Player'}")
+                
+                # Toggle racing against the best run (once there is one)
+                if event.key == K_g and game.game_state == "title" and game.best_run:
+                    game.ghost_mode = not game.ghost_mode
+                    game.two_player_mode = False
+                    game.opponent = game.create_opponent()
+                    game.dirty.invalidate()
+                    
+                    print(f"Game mode changed to: {'Ghost' if game.ghost_mode else 'One Player'}")
         
-        # Handle player input
+        # Update game state in fixed steps, feeding the held keys to each step
         keys = pygame.key.get_pressed()
-        if game.game_state == "racing":
-            game.player.handle_input(keys)
-            
-            # If in two-player mode, handle player 2 input
-            if hasattr(game, 'two_player_mode') and game.two_player_mode and isinstance(game.opponent, PlayerCar):
-                game.opponent.handle_input(keys)
-        
-        # Update game state
-        game.update()
+        alpha = game.advance(elapsed_ms, keys)
         
-        # Draw everything
-        game.draw()
+        # Idle screens only redraw when something visible changed
+        if scheduler.should_draw(game.game_state, had_input, game.frame_signature()):
+            # Draw everything
+            game.draw(alpha)
+            
+            # Update display (only the dirty regions when the camera is still)
+            game.dirty.present()
         
-        # Update display
-        pygame.display.flip()
-        clock.tick(FPS)
+        elapsed_ms = clock.tick(scheduler.frame_rate(game.game_state))
     
+    if game.spectator:
+        game.spectator.close()
+        if spectator_process:
+            spectator_process.wait(5)
     pygame.quit()
     sys.exit()
 
@@ -674,11 +909,11 @@ if __name__ == "__main__":
         return self.two_player_mode
         # Draw ramps
         for ramp in self.ramps:
-            ramp_x = ramp["position"] - self.camera_offset
+            ramp_x = ramp.position - self.camera_offset
             if 0 <= ramp_x <= SCREEN_WIDTH:
                 # Draw ramp base
                 ramp_width = 120
-                ramp_height = ramp["height"]
+                ramp_height = ramp.height
                 
                 # Calculate color based on season
                 progress = min(1.0, self.player.distance / RACE_DISTANCE)
@@ -755,8 +990,8 @@ if __name__ == "__main__":
                     )
                 
                 # Add ramp particles for visual interest
-                if random.random() > 0.8:
-                    particle_x = ramp_x + random.randint(0, ramp_width)
+                if self.effects_rng.random() > 0.8:
+                    particle_x = ramp_x + self.effects_rng.randint(0, ramp_width)
                     particle_y = road_y - (ramp_height * (particle_x - ramp_x) / ramp_width // 2)
                     
                     if current_season == "spring":
@@ -772,15 +1007,16 @@ if __name__ == "__main__":
                         particle_x,
                         particle_y,
                         color,
-                        random.uniform(1, 3),
-                        random.uniform(0.5, 1.5),
-                        -math.pi/2 + random.uniform(-0.3, 0.3),
-                        random.randint(20, 40),
+                        self.effects_rng.uniform(1, 3),
+                        self.effects_rng.uniform(0.5, 1.5),
+                        -math.pi/2 + self.effects_rng.uniform(-0.3, 0.3),
+                        self.effects_rng.randint(20, 40),
                         150
                     )
         # Draw traffic lights - ENHANCED VISIBILITY
         for light in self.traffic_lights:
-            light_x = light["position"] - self.camera_offset
+            light_state = self.traffic_lights.state(light)
+            light_x = light.position - self.camera_offset
             if 0 <= light_x <= SCREEN_WIDTH:
                 # Draw traffic light pole
                 pole_height = 200
@@ -809,31 +1045,31 @@ if __name__ == "__main__":
                 light_spacing = 35
                 
                 # Red light
-                red_color = (255, 0, 0) if light["state"] == "red" else (80, 0, 0)
+                red_color = (255, 0, 0) if light_state == "red" else (80, 0, 0)
                 pygame.draw.circle(screen, red_color, 
                                  (light_x, housing_y + 20), light_radius)
                 pygame.draw.circle(screen, (20, 20, 20), 
                                  (light_x, housing_y + 20), light_radius, 2)
                 
                 # Yellow light
-                yellow_color = (255, 255, 0) if light["state"] == "yellow" else (80, 80, 0)
+                yellow_color = (255, 255, 0) if light_state == "yellow" else (80, 80, 0)
                 pygame.draw.circle(screen, yellow_color, 
                                  (light_x, housing_y + 60), light_radius)
                 pygame.draw.circle(screen, (20, 20, 20), 
                                  (light_x, housing_y + 60), light_radius, 2)
                 
                 # Green light
-                green_color = (0, 255, 0) if light["state"] == "green" else (0, 80, 0)
+                green_color = (0, 255, 0) if light_state == "green" else (0, 80, 0)
                 pygame.draw.circle(screen, green_color, 
                                  (light_x, housing_y + 100), light_radius)
                 pygame.draw.circle(screen, (20, 20, 20), 
                                  (light_x, housing_y + 100), light_radius, 2)
                 
                 # Add light glow effect
-                if light["state"] == "red":
+                if light_state == "red":
                     glow_color = (255, 100, 100, 150)
                     glow_pos = (light_x, housing_y + 20)
-                elif light["state"] == "yellow":
+                elif light_state == "yellow":
                     glow_color = (255, 255, 100, 150)
                     glow_pos = (light_x, housing_y + 60)
                 else:  # green
@@ -853,10 +1089,10 @@ if __name__ == "__main__":
 
         # Draw oil spills
         for spill in self.oil_spills:
-            spill_x = spill["position"] - self.camera_offset
+            spill_x = spill.position - self.camera_offset
             if 0 <= spill_x <= SCREEN_WIDTH:
                 # Determine which lane to draw in
-                spill_y = self.lanes[spill["lane"]]["y"] + 35
+                spill_y = self.lanes[spill.lane]["y"] + 35
                 
                 # Draw oil spill
                 oil_radius = 25
@@ -870,21 +1106,22 @@ if __name__ == "__main__":
                 pygame.draw.ellipse(screen, shine_color, (spill_x - oil_radius//2, spill_y - oil_radius//4, oil_radius, oil_radius//2))
                 
                 # Add random oil particles
-                if random.random() > 0.9:
+                if self.effects_rng.random() > 0.9:
                     self.particles.add_particle(
-                        spill_x + random.uniform(-oil_radius, oil_radius),
-                        spill_y + random.uniform(-oil_radius//2, oil_radius//2),
+                        spill_x + self.effects_rng.uniform(-oil_radius, oil_radius),
+                        spill_y + self.effects_rng.uniform(-oil_radius//2, oil_radius//2),
                         (30, 30, 30),
-                        random.uniform(1, 3),
-                        random.uniform(0.2, 0.5),
-                        random.uniform(0, 2 * math.pi),
-                        random.randint(10, 30),
+                        self.effects_rng.uniform(1, 3),
+                        self.effects_rng.uniform(0.2, 0.5),
+                        self.effects_rng.uniform(0, 2 * math.pi),
+                        self.effects_rng.randint(10, 30),
                         150
                     )
         
         # Draw traffic lights
         for light in self.traffic_lights:
-            light_x = light["position"] - self.camera_offset
+            light_state = self.traffic_lights.state(light)
+            light_x = light.position - self.camera_offset
             if 0 <= light_x <= SCREEN_WIDTH:
                 # Draw traffic light pole
                 pole_height = 150
@@ -913,25 +1150,25 @@ if __name__ == "__main__":
                 light_spacing = 25
                 
                 # Red light
-                red_color = (255, 0, 0) if light["state"] == "red" else (100, 0, 0)
+                red_color = (255, 0, 0) if light_state == "red" else (100, 0, 0)
                 pygame.draw.circle(screen, red_color, 
                                  (light_x, housing_y + 15), light_radius)
                 
                 # Yellow light
-                yellow_color = (255, 255, 0) if light["state"] == "yellow" else (100, 100, 0)
+                yellow_color = (255, 255, 0) if light_state == "yellow" else (100, 100, 0)
                 pygame.draw.circle(screen, yellow_color, 
                                  (light_x, housing_y + 40), light_radius)
                 
                 # Green light
-                green_color = (0, 255, 0) if light["state"] == "green" else (0, 100, 0)
+                green_color = (0, 255, 0) if light_state == "green" else (0, 100, 0)
                 pygame.draw.circle(screen, green_color, 
                                  (light_x, housing_y + 65), light_radius)
                 
                 # Add light glow effect
-                if light["state"] == "red":
+                if light_state == "red":
                     glow_color = (255, 100, 100, 100)
                     glow_pos = (light_x, housing_y + 15)
-                elif light["state"] == "yellow":
+                elif light_state == "yellow":
                     glow_color = (255, 255, 100, 100)
                     glow_pos = (light_x, housing_y + 40)
                 else:  # green
@@ -955,7 +1192,8 @@ if __name__ == "__main__":
         return self.two_player_mode
         # Draw traffic lights
         for light in self.traffic_lights:
-            light_x = light["position"] - self.camera_offset
+            light_state = self.traffic_lights.state(light)
+            light_x = light.position - self.camera_offset
             if 0 <= light_x <= SCREEN_WIDTH:
                 # Draw traffic light pole
                 pole_height = 150
@@ -984,25 +1222,25 @@ if __name__ == "__main__":
                 light_spacing = 25
                 
                 # Red light
-                red_color = (255, 0, 0) if light["state"] == "red" else (100, 0, 0)
+                red_color = (255, 0, 0) if light_state == "red" else (100, 0, 0)
                 pygame.draw.circle(screen, red_color, 
                                  (light_x, housing_y + 15), light_radius)
                 
                 # Yellow light
-                yellow_color = (255, 255, 0) if light["state"] == "yellow" else (100, 100, 0)
+                yellow_color = (255, 255, 0) if light_state == "yellow" else (100, 100, 0)
                 pygame.draw.circle(screen, yellow_color, 
                                  (light_x, housing_y + 40), light_radius)
                 
                 # Green light
-                green_color = (0, 255, 0) if light["state"] == "green" else (0, 100, 0)
+                green_color = (0, 255, 0) if light_state == "green" else (0, 100, 0)
                 pygame.draw.circle(screen, green_color, 
                                  (light_x, housing_y + 65), light_radius)
                 
                 # Add light glow effect
-                if light["state"] == "red":
+                if light_state == "red":
                     glow_color = (255, 100, 100, 100)
                     glow_pos = (light_x, housing_y + 15)
-                elif light["state"] == "yellow":
+                elif light_state == "yellow":
                     glow_color = (255, 255, 100, 100)
                     glow_pos = (light_x, housing_y + 40)
                 else:  # green
@@ -1015,7 +1253,8 @@ if __name__ == "__main__":
                 screen.blit(glow_surface, (glow_pos[0] - 20, glow_pos[1] - 20))
         # Draw traffic lights - ENHANCED VISIBILITY
         for light in self.traffic_lights:
-            light_x = light["position"] - self.camera_offset
+            light_state = self.traffic_lights.state(light)
+            light_x = light.position - self.camera_offset
             if 0 <= light_x <= SCREEN_WIDTH:
                 # Draw traffic light pole
                 pole_height = 200
@@ -1044,31 +1283,31 @@ if __name__ == "__main__":
                 light_spacing = 35
                 
                 # Red light
-                red_color = (255, 0, 0) if light["state"] == "red" else (80, 0, 0)
+                red_color = (255, 0, 0) if light_state == "red" else (80, 0, 0)
                 pygame.draw.circle(screen, red_color, 
                                  (light_x, housing_y + 20), light_radius)
                 pygame.draw.circle(screen, (20, 20, 20), 
                                  (light_x, housing_y + 20), light_radius, 2)
                 
                 # Yellow light
-                yellow_color = (255, 255, 0) if light["state"] == "yellow" else (80, 80, 0)
+                yellow_color = (255, 255, 0) if light_state == "yellow" else (80, 80, 0)
                 pygame.draw.circle(screen, yellow_color, 
                                  (light_x, housing_y + 60), light_radius)
                 pygame.draw.circle(screen, (20, 20, 20), 
                                  (light_x, housing_y + 60), light_radius, 2)
                 
                 # Green light
-                green_color = (0, 255, 0) if light["state"] == "green" else (0, 80, 0)
+                green_color = (0, 255, 0) if light_state == "green" else (0, 80, 0)
                 pygame.draw.circle(screen, green_color, 
                                  (light_x, housing_y + 100), light_radius)
                 pygame.draw.circle(screen, (20, 20, 20), 
                                  (light_x, housing_y + 100), light_radius, 2)
                 
                 # Add light glow effect
-                if light["state"] == "red":
+                if light_state == "red":
                     glow_color = (255, 100, 100, 150)
                     glow_pos = (light_x, housing_y + 20)
-                elif light["state"] == "yellow":
+                elif light_state == "yellow":
                     glow_color = (255, 255, 100, 150)
                     glow_pos = (light_x, housing_y + 60)
                 else:  # green
@@ -1088,10 +1327,10 @@ if __name__ == "__main__":
 
         # Draw oil spills
         for spill in self.oil_spills:
-            spill_x = spill["position"] - self.camera_offset
+            spill_x = spill.position - self.camera_offset
             if 0 <= spill_x <= SCREEN_WIDTH:
                 # Determine which lane to draw in
-                spill_y = self.lanes[spill["lane"]]["y"] + 35
+                spill_y = self.lanes[spill.lane]["y"] + 35
                 
                 # Draw oil spill
                 oil_radius = 25
@@ -1105,14 +1344,14 @@ if __name__ == "__main__":
                 pygame.draw.ellipse(screen, shine_color, (spill_x - oil_radius//2, spill_y - oil_radius//4, oil_radius, oil_radius//2))
                 
                 # Add random oil particles
-                if random.random() > 0.9:
+                if self.effects_rng.random() > 0.9:
                     self.particles.add_particle(
-                        spill_x + random.uniform(-oil_radius, oil_radius),
-                        spill_y + random.uniform(-oil_radius//2, oil_radius//2),
+                        spill_x + self.effects_rng.uniform(-oil_radius, oil_radius),
+                        spill_y + self.effects_rng.uniform(-oil_radius//2, oil_radius//2),
                         (30, 30, 30),
-                        random.uniform(1, 3),
-                        random.uniform(0.2, 0.5),
-                        random.uniform(0, 2 * math.pi),
-                        random.randint(10, 30),
+                        self.effects_rng.uniform(1, 3),
+                        self.effects_rng.uniform(0.2, 0.5),
+                        self.effects_rng.uniform(0, 2 * math.pi),
+                        self.effects_rng.randint(10, 30),
                         150
                     )
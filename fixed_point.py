@@ -0,0 +1,71 @@
+"""
+Fixed-point car physics
+
+Float speed updates (drag, spin slowdown, the AI's throttle, ramp launch
+speed) round differently depending on how they are computed, so the
+same race isn't guaranteed to come out identically on every machine and
+Python build. A car created with fixed_point=True does that arithmetic
+on integers in units of 1/SCALE instead: products are rounded with a
+shift, so every step is exact and the same everywhere.
+
+The car's float attributes still hold the state, but in fixed-point mode
+they are always whole multiples of 1/SCALE. Converting them to integers
+and back is exact, adding them up (distance += speed, the jump arc) is
+exact, and so are the collision tests that compare distances with the
+track's whole-unit positions, so nothing else has to change and
+snapshots, replays and rendering work as they are.
+
+Tuning constants are the float ones rounded to the nearest step, which
+keeps a fixed-point race within a few thousandths of a unit of the float
+race over its whole length, finishing on the same tick (see "python
+benchmarks.py fixed-point").
+"""
+
+SCALE_BITS = 24
+SCALE = 1 << SCALE_BITS  # Fixed-point steps per unit
+HALF = SCALE >> 1
+
+def to_fixed(value):
+    """A float as a whole number of 1/SCALE steps"""
+    return round(value * SCALE)
+
+def from_fixed(value):
+    return value / SCALE
+
+def multiply(a, b):
+    """Product of two fixed-point values (rounded to the nearest step, halves up)"""
+    return a * b + HALF >> SCALE_BITS
+
+# Constants Car.update uses as literals
+SPIN_SLOWDOWN = to_fixed(0.95)  # Speed kept per tick while spinning
+LAUNCH_BASE = to_fixed(15)  # Ramp launch velocity at a standstill
+LAUNCH_PER_SPEED = to_fixed(0.8)  # Extra launch velocity per unit of speed
+
+def step_speed(car, acceleration):
+    """The car's speed after one tick of acceleration, drag, clamping and spin slowdown"""
+    speed = to_fixed(car.speed) + to_fixed(acceleration)
+    drag = to_fixed(car.drag)
+    if car.in_air:
+        speed -= multiply(drag, speed) >> 1  # Half the drag in the air
+    else:
+        speed -= multiply(drag, speed)
+
+    max_speed = to_fixed(car.max_speed)
+    if speed > max_speed:
+        speed = max_speed
+    elif speed < 0:
+        speed = 0
+
+    if car.spinning:
+        speed = multiply(speed, SPIN_SLOWDOWN)
+    return from_fixed(speed)
+
+def step_jump(car):
+    """The car's (jump height, jump velocity) after one tick in the air"""
+    velocity = to_fixed(car.jump_velocity)
+    height = to_fixed(car.jump_height) + velocity
+    return from_fixed(height), from_fixed(velocity - to_fixed(car.gravity))
+
+def launch_velocity(speed):
+    """Upward velocity off a ramp taken at speed"""
+    return from_fixed(LAUNCH_BASE + multiply(to_fixed(speed), LAUNCH_PER_SPEED))
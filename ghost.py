@@ -0,0 +1,105 @@
+"""
+Ghost runs
+
+A ghost is a recorded run played back as an opponent. It is stored as
+the car's distance and jump height after every race tick, in fixed point
+(1/SCALE of a unit) as int16 deltas from the tick before, so a whole run
+is 4 bytes per tick. Deltas are grouped into chunks of CHUNK_TICKS ticks
+and playback reads the file one chunk at a time, so a ghost costs two
+additions per tick and never needs its run loaded or re-simulated.
+
+File layout: header, then per chunk the distance deltas followed by the
+jump height deltas (little-endian).
+"""
+
+import os
+import struct
+import sys
+from array import array
+from itertools import chain
+
+MAGIC = b"DRGH"
+VERSION = 1
+HEADER = struct.Struct("<4sBII")  # magic, version, ticks recorded, finish tick
+SCALE = 256  # Fixed-point steps per distance unit
+CHUNK_TICKS = 256  # Ticks per chunk read during playback
+
+def deltas(values):
+    """int16 differences between consecutive values (the first one from 0)"""
+    return array("h", (value - prev for prev, value in zip(chain((0,), values), values)))
+
+def little_endian(values):
+    if sys.byteorder == "big":
+        values.byteswap()
+    return values
+
+class GhostRecorder:
+    """Collects a car's position after every race tick"""
+    def __init__(self):
+        self.distances = array("i")  # Fixed point
+        self.heights = array("i")
+
+    def record(self, car):
+        self.distances.append(round(car.distance * SCALE))
+        self.heights.append(round(car.jump_height * SCALE))
+
+    def save(self, path, finish_tick):
+        """Write the run out (through a temporary file, so a crash never leaves half a ghost)"""
+        distance_deltas = little_endian(deltas(self.distances))
+        height_deltas = little_endian(deltas(self.heights))
+        ticks = len(distance_deltas)
+
+        temp_path = path + ".tmp"
+        with open(temp_path, "wb") as f:
+            f.write(HEADER.pack(MAGIC, VERSION, ticks, finish_tick))
+            for start in range(0, ticks, CHUNK_TICKS):
+                f.write(distance_deltas[start:start + CHUNK_TICKS].tobytes())
+                f.write(height_deltas[start:start + CHUNK_TICKS].tobytes())
+        os.replace(temp_path, path)
+
+class GhostRun:
+    """A ghost file (only its header is read until it is played)"""
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            magic, version, self.ticks, self.finish_tick = HEADER.unpack(f.read(HEADER.size))
+        if magic != MAGIC or version != VERSION:
+            raise ValueError("not a ghost run (or an unsupported version)")
+
+    def samples(self, first_tick=0):
+        """(distance, jump height) after each race tick from first_tick on, streamed from the file"""
+        distance = height = 0
+        with open(self.path, "rb") as f:
+            f.seek(HEADER.size)
+            for start in range(0, self.ticks, CHUNK_TICKS):
+                size = min(CHUNK_TICKS, self.ticks - start)
+                distance_deltas = array("h")
+                height_deltas = array("h")
+                distance_deltas.frombytes(f.read(size * 2))
+                height_deltas.frombytes(f.read(size * 2))
+                little_endian(distance_deltas)
+                little_endian(height_deltas)
+
+                # Chunks before the first tick wanted only move the totals on
+                skip = first_tick - start
+                if skip >= size:
+                    distance += sum(distance_deltas)
+                    height += sum(height_deltas)
+                    continue
+                if skip > 0:
+                    distance += sum(distance_deltas[:skip])
+                    height += sum(height_deltas[:skip])
+                    del distance_deltas[:skip]
+                    del height_deltas[:skip]
+
+                for distance_delta, height_delta in zip(distance_deltas, height_deltas):
+                    distance += distance_delta
+                    height += height_delta
+                    yield distance / SCALE, height / SCALE
+
+def load_ghost(path):
+    """The ghost run saved at path, or None if there isn't a usable one"""
+    try:
+        return GhostRun(path)
+    except (OSError, ValueError, struct.error):
+        return None
@@ -0,0 +1,87 @@
+import pygame
+from assets import SCREEN_WIDTH
+
+class HudField:
+    """A single HUD text slot with its cached rendered surface"""
+    def __init__(self, position):
+        self.position = position
+        self.text = None
+        self.color = None
+        self.surface = None
+        self.visible = False
+
+class Hud:
+    """
+    Racing HUD that only re-renders a field when its displayed text changes
+
+    Fields are composited into one pre-assembled surface, which is rebuilt
+    only when a field changed, shown or hidden since the last draw.
+    """
+    def __init__(self, font, height=260):
+        self.font = font
+        self.fields = {}
+        self.surface = pygame.Surface((SCREEN_WIDTH, height), pygame.SRCALPHA)
+        self.needs_composite = True
+
+        # Counters
+        self.renders_this_frame = 0
+        self.renders_last_frame = 0
+        self.total_renders = 0
+        self.composites = 0
+        self.frames = 0
+
+    def add_field(self, name, position):
+        self.fields[name] = HudField(position)
+
+    def set(self, name, text, color=(255, 255, 255)):
+        """Show a field, rendering it only if the text or color changed"""
+        field = self.fields[name]
+        if text != field.text or color != field.color:
+            field.text = text
+            field.color = color
+            field.surface = self.font.render(text, True, color)
+            self.renders_this_frame += 1
+            self.needs_composite = True
+
+        if not field.visible:
+            field.visible = True
+            self.needs_composite = True
+
+    def hide(self, name):
+        field = self.fields[name]
+        if field.visible:
+            field.visible = False
+            self.needs_composite = True
+
+    def draw(self, surface):
+        """
+        Blit the HUD to a surface
+
+        Returns the changed screen region, or None if the HUD looks the same
+        as on the previous draw
+        """
+        changed_rect = None
+        if self.needs_composite:
+            self.surface.fill((0, 0, 0, 0))
+            for field in self.fields.values():
+                if field.visible:
+                    self.surface.blit(field.surface, field.position)
+            self.needs_composite = False
+            self.composites += 1
+            changed_rect = self.surface.get_rect()
+
+        surface.blit(self.surface, (0, 0))
+
+        # Roll the per-frame counters
+        self.renders_last_frame = self.renders_this_frame
+        self.total_renders += self.renders_this_frame
+        self.renders_this_frame = 0
+        self.frames += 1
+
+        return changed_rect
+
+    def average_renders(self):
+        """Average number of field renders per drawn frame"""
+        if self.frames == 0:
+            return 0
+        return self.total_renders / self.frames
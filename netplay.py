@@ -0,0 +1,251 @@
+"""
+Networked two-player races with rollback
+
+Each peer simulates the whole race and only inputs are sent. When the
+remote player's input for a tick hasn't arrived yet it is predicted (the
+last one received is assumed to still be held) and the race moves on
+without waiting. Every simulated tick is snapshotted first, so when the
+real input turns out to differ from the prediction the race is restored
+to that tick and re-simulated with the right inputs, headless, up to the
+present. A peer never runs more than MAX_ROLLBACK ticks ahead of the
+inputs it has confirmed; past that it stalls until they come in, which
+also keeps the two peers in step.
+
+Inputs travel over UDP. Every packet repeats all local inputs the peer
+hasn't acknowledged yet, so lost packets need no retransmission logic.
+"""
+
+import socket
+import struct
+import time
+from random_streams import RandomStreams
+from snapshot import snapshot_race, restore_race
+
+MAX_ROLLBACK = 8  # Most ticks simulated on predicted input
+MAX_INPUTS_PER_PACKET = 64
+
+HELLO = 1
+INPUTS = 2
+HELLO_PACKET = struct.Struct("<BBBQ")  # type, sender's player, seen the peer's hello, seed
+INPUTS_HEADER = struct.Struct("<BiIB")  # type, last remote tick received, first tick, input count
+
+def encode_input(controls):
+    accelerate, boost = controls
+    return accelerate | boost << 1
+
+def decode_input(code):
+    return bool(code & 1), bool(code & 2)
+
+class UdpTransport:
+    """Non-blocking UDP socket talking to one peer (e.g. another process on 127.0.0.1)"""
+    def __init__(self, local_port, peer_address, local_host="127.0.0.1"):
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.socket.bind((local_host, local_port))
+        self.socket.setblocking(False)
+        host, port = peer_address
+        self.peer_address = (socket.gethostbyname(host), port)  # As recvfrom() reports it
+
+    def send(self, data):
+        try:
+            self.socket.sendto(data, self.peer_address)
+        except OSError:
+            pass  # The peer isn't listening yet; the next packet repeats everything
+
+    def receive(self):
+        """Packets waiting from the peer"""
+        packets = []
+        while True:
+            try:
+                data, address = self.socket.recvfrom(2048)
+            except BlockingIOError:
+                return packets
+            except ConnectionResetError:
+                continue  # Windows reports an earlier send to a closed port here
+            if address == self.peer_address:
+                packets.append(data)
+
+    def close(self):
+        self.socket.close()
+
+def connect(transport, local_player, seed=None, timeout=30.0):
+    """
+    Wait for the peer and agree on the race seed (player 0's)
+
+    Returns the seed, or raises TimeoutError if the peer didn't answer.
+    """
+    if local_player == 0:
+        seed = RandomStreams(seed).seed
+    else:
+        seed = None
+    seen_peer = False
+    deadline = time.monotonic() + timeout
+    while True:
+        transport.send(HELLO_PACKET.pack(HELLO, local_player, seen_peer, seed or 0))
+        for data in transport.receive():
+            if data[0] != HELLO or len(data) != HELLO_PACKET.size:
+                continue
+            _, player, peer_saw_us, peer_seed = HELLO_PACKET.unpack(data)
+            if player == local_player:
+                raise ValueError("both peers are the same player")
+            seen_peer = True
+            if player == 0:
+                seed = peer_seed
+            if peer_saw_us:
+                # One last hello so the peer knows we saw it too
+                transport.send(HELLO_PACKET.pack(HELLO, local_player, True, seed))
+                return seed
+        if time.monotonic() > deadline:
+            raise TimeoutError("no answer from the other player")
+        time.sleep(0.01)
+
+class RollbackSession:
+    """
+    Drives a RaceSimulation from one local and one remote player
+
+    local_player is 0 for race.player and 1 for race.opponent; both cars
+    must be PlayerCars. seed is the one connect() agreed on. Call update()
+    once per race tick with the local controls.
+    """
+    def __init__(self, race, local_player, transport, seed, max_rollback=MAX_ROLLBACK):
+        self.race = race
+        self.local_player = local_player
+        self.transport = transport
+        self.max_rollback = max_rollback
+        self.hello = HELLO_PACKET.pack(HELLO, local_player, True, seed)
+
+        self.local_inputs = {}  # tick -> code
+        self.remote_inputs = {}  # tick -> code, confirmed
+        self.predicted = {}  # tick -> remote code the tick was last simulated with
+        self.snapshots = {}  # tick -> race state before it, for ticks that may be rolled back
+        self.remote_tick = -1  # Remote input is confirmed for every tick up to this one
+        self.peer_has = -1  # The peer has every local input up to this tick
+        self.rollback_tick = None  # First tick simulated with a wrong prediction
+
+        # Stats
+        self.rollbacks = 0
+        self.resimulated = 0
+        self.stalls = 0
+
+    @property
+    def cars(self):
+        """(local car, remote car)"""
+        if self.local_player == 0:
+            return self.race.player, self.race.opponent
+        return self.race.opponent, self.race.player
+
+    def result_final(self):
+        """Whether the race is over on confirmed input up to the last finish (so no rollback can change it)"""
+        if not self.race.finished:
+            return False
+        return max(car.finish_tick for car in self.race.cars) <= self.remote_tick
+
+    def update(self, controls):
+        """
+        Exchange inputs and run the next race tick with the local controls
+
+        Returns the cars that crossed the finish line on it (none if the
+        session had to stall for the remote input).
+        """
+        self.poll()
+
+        tick = self.race.tick
+        if tick - self.remote_tick > self.max_rollback:
+            self.stalls += 1
+            self.send()
+            return []
+
+        self.local_inputs[tick] = encode_input(controls)
+        self.send()
+        return self.simulate(tick)
+
+    def sync(self):
+        """Exchange inputs without running a tick (keeps the peer going once this side is done)"""
+        self.poll()
+        self.send()
+
+    def simulate(self, tick):
+        """Run tick from the current state, predicting the remote input if it isn't in yet"""
+        if tick > self.remote_tick:
+            self.snapshots[tick] = snapshot_race(self.race)
+        remote = self.remote_inputs.get(tick)
+        if remote is None:
+            remote = self.remote_inputs.get(self.remote_tick, 0)  # Still holding what it last did
+            self.predicted[tick] = remote
+        else:
+            self.predicted.pop(tick, None)
+
+        local_car, remote_car = self.cars
+        local_car.apply_input(*decode_input(self.local_inputs[tick]))
+        remote_car.apply_input(*decode_input(remote))
+        return self.race.step()
+
+    def roll_back(self):
+        """Go back to the first mispredicted tick and re-simulate up to the present"""
+        present = self.race.tick
+        restore_race(self.race, self.snapshots[self.rollback_tick])
+        self.rollbacks += 1
+        self.resimulated += present - self.rollback_tick
+        self.rollback_tick = None
+
+        # The ticks were shown once already, so re-simulate them without effects
+        cars = self.race.cars
+        effects = [(car.effects, car.particles) for car in cars]
+        for car in cars:
+            car.effects = False
+            car.particles = None
+        try:
+            while self.race.tick < present:
+                self.simulate(self.race.tick)
+        finally:
+            for car, (car_effects, particles) in zip(cars, effects):
+                car.effects = car_effects
+                car.particles = particles
+
+    def forget(self):
+        """Drop what can no longer be needed (once any rollback is done)"""
+        for tick in [tick for tick in self.snapshots if tick <= self.remote_tick]:
+            del self.snapshots[tick]
+        for tick in [tick for tick in self.predicted if tick <= self.remote_tick]:
+            del self.predicted[tick]
+        # The newest confirmed input is kept for predicting from
+        done = min(self.remote_tick, self.race.tick)
+        for tick in [tick for tick in self.remote_inputs if tick < done]:
+            del self.remote_inputs[tick]
+        # Local inputs are needed until the peer has them and they can't be re-simulated
+        for tick in [tick for tick in self.local_inputs if tick <= min(self.peer_has, self.remote_tick)]:
+            del self.local_inputs[tick]
+
+    def poll(self):
+        """Take in the peer's packets, rolling back if a prediction turned out wrong"""
+        for data in self.transport.receive():
+            if not data:
+                continue
+            if data[0] == HELLO:
+                # The peer missed our last hello; tell it again that we're here
+                self.transport.send(self.hello)
+            elif data[0] == INPUTS:
+                self.receive_inputs(data)
+        if self.rollback_tick is not None:
+            self.roll_back()
+        self.forget()
+
+    def receive_inputs(self, data):
+        _, peer_has, first, count = INPUTS_HEADER.unpack_from(data)
+        self.peer_has = max(self.peer_has, peer_has)
+        for tick, code in enumerate(data[INPUTS_HEADER.size:INPUTS_HEADER.size + count], first):
+            if tick != self.remote_tick + 1:
+                continue  # Already have it (or a gap; it will be repeated)
+            self.remote_inputs[tick] = code
+            self.remote_tick = tick
+            predicted = self.predicted.get(tick)
+            if predicted is not None and predicted != code:
+                if self.rollback_tick is None or tick < self.rollback_tick:
+                    self.rollback_tick = tick
+
+    def send(self):
+        """Send every local input the peer hasn't acknowledged (up to a packet's worth)"""
+        first = self.peer_has + 1
+        codes = bytearray()
+        while first + len(codes) in self.local_inputs and len(codes) < MAX_INPUTS_PER_PACKET:
+            codes.append(self.local_inputs[first + len(codes)])
+        self.transport.send(INPUTS_HEADER.pack(INPUTS, self.remote_tick, first, len(codes)) + codes)
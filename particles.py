@@ -3,8 +3,9 @@ import random
 import math
 
 class ParticleSystem:
-    def __init__(self):
+    def __init__(self, rng=None):
         self.particles = []
+        self.rng = rng or random  # Cosmetic random stream
     
     def add_particle(self, x, y, color, size, speed, direction, lifetime, alpha=255, type="circle"):
         """
@@ -44,26 +45,26 @@ class ParticleSystem:
         for _ in range(3):
             self.add_particle(
                 x, y,
-                random.choice(colors),
-                random.uniform(3, 8),
-                random.uniform(1, 4),
-                math.pi + random.uniform(-0.3, 0.3),
-                random.randint(10, 30),
+                self.rng.choice(colors),
+                self.rng.uniform(3, 8),
+                self.rng.uniform(1, 4),
+                math.pi + self.rng.uniform(-0.3, 0.3),
+                self.rng.randint(10, 30),
                 200
             )
     
     def add_smoke(self, x, y):
         """Add tire smoke particles"""
-        gray = random.randint(180, 220)
+        gray = self.rng.randint(180, 220)
         
         for _ in range(2):
             self.add_particle(
                 x, y,
                 (gray, gray, gray),
-                random.uniform(5, 10),
-                random.uniform(0.5, 2),
-                random.uniform(0, 2 * math.pi),
-                random.randint(30, 60),
+                self.rng.uniform(5, 10),
+                self.rng.uniform(0.5, 2),
+                self.rng.uniform(0, 2 * math.pi),
+                self.rng.randint(30, 60),
                 150
             )
     
@@ -78,13 +79,13 @@ class ParticleSystem:
         for _ in range(count):
             self.add_particle(
                 x, y,
-                random.choice(colors),
-                random.uniform(1, 4),
-                random.uniform(2, 6),
-                random.uniform(0, 2 * math.pi),
-                random.randint(10, 25),
+                self.rng.choice(colors),
+                self.rng.uniform(1, 4),
+                self.rng.uniform(2, 6),
+                self.rng.uniform(0, 2 * math.pi),
+                self.rng.randint(10, 25),
                 255,
-                "rect" if random.random() > 0.7 else "circle"
+                "rect" if self.rng.random() > 0.7 else "circle"
             )
     
     def add_air_stream(self, x, y):
@@ -98,13 +99,13 @@ class ParticleSystem:
         for _ in range(5):
             self.add_particle(
                 x, y,
-                random.choice(colors),
-                random.uniform(2, 5),
-                random.uniform(3, 7),
-                math.pi + random.uniform(-0.2, 0.2),
-                random.randint(10, 20),
+                self.rng.choice(colors),
+                self.rng.uniform(2, 5),
+                self.rng.uniform(3, 7),
+                math.pi + self.rng.uniform(-0.2, 0.2),
+                self.rng.randint(10, 20),
                 150,
-                "rect" if random.random() > 0.5 else "circle"
+                "rect" if self.rng.random() > 0.5 else "circle"
             )
     
     def add_boost_trail(self, x, y):
@@ -117,29 +118,29 @@ class ParticleSystem:
         ]
         
         for _ in range(8):
-            size = random.uniform(3, 10)
+            size = self.rng.uniform(3, 10)
             self.add_particle(
-                x + random.uniform(-5, 5), 
-                y + random.uniform(-5, 5),
-                random.choice(colors),
+                x + self.rng.uniform(-5, 5), 
+                y + self.rng.uniform(-5, 5),
+                self.rng.choice(colors),
                 size,
-                random.uniform(2, 5),
-                math.pi + random.uniform(-0.5, 0.5),
-                random.randint(15, 35),
+                self.rng.uniform(2, 5),
+                math.pi + self.rng.uniform(-0.5, 0.5),
+                self.rng.randint(15, 35),
                 200,
                 "circle"
             )
             
             # Add smaller "spark" particles
-            if random.random() > 0.7:
+            if self.rng.random() > 0.7:
                 self.add_particle(
-                    x + random.uniform(-10, 10), 
-                    y + random.uniform(-10, 10),
+                    x + self.rng.uniform(-10, 10), 
+                    y + self.rng.uniform(-10, 10),
                     (255, 255, 200),
-                    random.uniform(1, 3),
-                    random.uniform(3, 8),
-                    random.uniform(0, 2 * math.pi),
-                    random.randint(5, 15),
+                    self.rng.uniform(1, 3),
+                    self.rng.uniform(3, 8),
+                    self.rng.uniform(0, 2 * math.pi),
+                    self.rng.randint(5, 15),
                     255,
                     "rect"
                 )
@@ -159,7 +160,8 @@ class ParticleSystem:
                 self.particles.remove(particle)
     
     def draw(self, surface):
-        """Draw all particles"""
+        """Draw all particles and return the screen regions they cover"""
+        dirty_rects = []
         for particle in self.particles:
             # Calculate fade based on lifetime
             fade_ratio = particle['lifetime'] / particle['max_lifetime']
@@ -187,7 +189,9 @@ class ParticleSystem:
                 )
             
             # Draw to main surface
-            surface.blit(particle_surface, (int(particle['x'] - current_size), int(particle['y'] - current_size)))
+            dirty_rects.append(surface.blit(particle_surface, (int(particle['x'] - current_size), int(particle['y'] - current_size))))
+        
+        return dirty_rects
     def add_oil_splash(self, x, y):
         """Add oil splash particles"""
         colors = [
@@ -198,12 +202,12 @@ class ParticleSystem:
         
         for _ in range(10):
             self.add_particle(
-                x + random.uniform(-15, 15),
-                y + random.uniform(-5, 5),
-                random.choice(colors),
-                random.uniform(3, 8),
-                random.uniform(0.5, 2),
-                random.uniform(0, 2 * math.pi),
-                random.randint(30, 60),
+                x + self.rng.uniform(-15, 15),
+                y + self.rng.uniform(-5, 5),
+                self.rng.choice(colors),
+                self.rng.uniform(3, 8),
+                self.rng.uniform(0.5, 2),
+                self.rng.uniform(0, 2 * math.pi),
+                self.rng.randint(30, 60),
                 180
             )
@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+"""
+Race server
+
+Hosts many independent headless races (a player against the AI, the
+same race DragRaceGame runs) in one asyncio process. All races advance
+together on a fixed 60 Hz tick. Clients connect over TCP, join with a
+seed, send their controls whenever they change and receive the race
+state at a configurable rate, then the result when the race ends.
+
+The server prints tick-time percentiles and an estimate of how many
+races one core can keep running in real time, for sizing hardware.
+"load" runs a load-test client with hundreds of simulated players.
+
+Usage:
+    python race_server.py serve [--port 5200] [--state-rate 20]
+    python race_server.py load [--clients 300] [--duration 30]
+
+Messages are fixed-size little-endian structs whose first byte is the
+message type.
+"""
+
+import argparse
+import asyncio
+import random
+import struct
+import time
+from simulation import create_headless_race, TICK_RATE, MAX_RACE_TICKS
+
+# Client -> server
+JOIN = 1
+INPUT = 2
+JOIN_MESSAGE = struct.Struct("<BQ")  # type, race seed
+INPUT_MESSAGE = struct.Struct("<BB")  # type, controls held (accelerate | boost << 1)
+
+# Server -> client
+STATE = 3
+RESULT = 4
+STATE_MESSAGE = struct.Struct("<BIffff")  # type, race tick, player distance and speed, opponent distance and speed
+RESULT_MESSAGE = struct.Struct("<Bii")  # type, player and opponent finish ticks (-1 if they didn't finish)
+MESSAGE_SIZES = {STATE: STATE_MESSAGE.size, RESULT: RESULT_MESSAGE.size}
+
+MAX_WRITE_BUFFER = 4096  # Skip state updates to clients this far behind (they only need the latest)
+
+def percentiles(samples):
+    """(p50, p99, max) of a list of durations"""
+    samples = sorted(samples)
+    count = len(samples)
+    return samples[count // 2], samples[min(count - 1, int(count * 0.99))], samples[-1]
+
+class RaceSession:
+    """One client's race"""
+    def __init__(self, race, writer):
+        self.race = race
+        self.writer = writer
+        self.controls = (False, False)
+
+class RaceServer:
+    def __init__(self, state_rate=20, tick_rate=TICK_RATE):
+        self.tick_rate = tick_rate
+        self.state_interval = max(1, round(tick_rate / state_rate))  # Ticks between state updates
+        self.sessions = set()
+
+        # Stats since the last report
+        self.tick_times = []
+        self.race_steps = 0
+        self.overruns = 0
+        self.races_finished = 0
+
+    async def handle_client(self, reader, writer):
+        session = None
+        try:
+            _, seed = JOIN_MESSAGE.unpack(await reader.readexactly(JOIN_MESSAGE.size))
+            session = RaceSession(create_headless_race("ai", seed=seed), writer)
+            self.sessions.add(session)
+            while True:
+                _, code = INPUT_MESSAGE.unpack(await reader.readexactly(INPUT_MESSAGE.size))
+                session.controls = (bool(code & 1), bool(code & 2))
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass  # The client left (or the race is over and the connection was closed)
+        finally:
+            self.sessions.discard(session)
+            writer.close()
+
+    def tick(self):
+        """Advance every race by one tick and send out what's due"""
+        for session in list(self.sessions):
+            race = session.race
+            race.player.apply_input(*session.controls)
+            race.step()
+
+            if race.finished or race.tick >= MAX_RACE_TICKS:
+                finish_ticks = [-1 if tick is None else tick for tick in race.result().finish_ticks]
+                session.writer.write(RESULT_MESSAGE.pack(RESULT, *finish_ticks))
+                session.writer.close()
+                self.sessions.discard(session)
+                self.races_finished += 1
+            elif race.tick % self.state_interval == 0:
+                if session.writer.transport.get_write_buffer_size() < MAX_WRITE_BUFFER:
+                    player, opponent = race.cars
+                    session.writer.write(STATE_MESSAGE.pack(
+                        STATE, race.tick, player.distance, player.speed, opponent.distance, opponent.speed
+                    ))
+        self.race_steps += len(self.sessions)
+
+    async def run_ticks(self):
+        """Tick at the fixed rate (running late ticks straight away, and giving up on far-behind ones)"""
+        loop = asyncio.get_running_loop()
+        interval = 1 / self.tick_rate
+        next_tick = loop.time()
+        while True:
+            start = time.perf_counter()
+            self.tick()
+            self.tick_times.append(time.perf_counter() - start)
+
+            next_tick += interval
+            delay = next_tick - loop.time()
+            if delay < 0:
+                self.overruns += 1
+                if delay < -0.25:
+                    next_tick = loop.time()
+                delay = 0  # Still let the network catch up between ticks
+            await asyncio.sleep(delay)
+
+    async def report(self, interval):
+        """Print tick-time percentiles and capacity every interval seconds"""
+        wall = time.perf_counter()
+        cpu = time.process_time()
+        while True:
+            await asyncio.sleep(interval)
+            now_wall = time.perf_counter()
+            now_cpu = time.process_time()
+            if self.tick_times:
+                ticks = len(self.tick_times)
+                p50, p99, worst = percentiles(self.tick_times)
+                average_races = self.race_steps / ticks
+                # Races a fully busy core could run at the tick rate, going by
+                # the CPU this process used (ticks and networking) for these races
+                busy = (now_cpu - cpu) / (now_wall - wall)
+                per_core = average_races / busy if busy > 0 else 0
+                print(f"{len(self.sessions)} races | tick p50 {p50 * 1000:.2f}ms p99 {p99 * 1000:.2f}ms "
+                      f"max {worst * 1000:.2f}ms | {ticks} ticks, {self.overruns} late | "
+                      f"{self.races_finished} finished | CPU {busy:.0%} | ~{per_core:.0f} races per core",
+                      flush=True)
+            self.tick_times = []
+            self.race_steps = 0
+            self.overruns = 0
+            self.races_finished = 0
+            wall = now_wall
+            cpu = now_cpu
+
+async def serve(host, port, state_rate, report_interval):
+    server = RaceServer(state_rate)
+    listener = await asyncio.start_server(server.handle_client, host, port, backlog=1024)
+    print(f"Race server on {host}:{port}, {TICK_RATE} ticks/s, state every {server.state_interval} ticks", flush=True)
+    async with listener:
+        await asyncio.gather(server.run_ticks(), server.report(report_interval))
+
+class LoadStats:
+    def __init__(self):
+        self.races = 0
+        self.states = 0
+        self.errors = 0
+        self.state_gaps = []  # Seconds between state updates a client received
+
+async def simulated_player(host, port, deadline, rng, stats):
+    """Race after race until the deadline, driving roughly like a person"""
+    while time.monotonic() < deadline:
+        try:
+            reader, writer = await asyncio.open_connection(host, port)
+        except OSError:
+            stats.errors += 1
+            await asyncio.sleep(1)
+            continue
+
+        writer.write(JOIN_MESSAGE.pack(JOIN, rng.randrange(2 ** 32)))
+        writer.write(INPUT_MESSAGE.pack(INPUT, 1))  # Off the line at full throttle
+        last_state = None
+        try:
+            while True:
+                kind = (await reader.readexactly(1))[0]
+                await reader.readexactly(MESSAGE_SIZES[kind] - 1)
+                if kind == RESULT:
+                    stats.races += 1
+                    break
+
+                now = time.perf_counter()
+                if last_state is not None:
+                    stats.state_gaps.append(now - last_state)
+                last_state = now
+                stats.states += 1
+
+                # Ease off or boost now and then
+                if rng.random() < 0.2:
+                    accelerate = rng.random() < 0.9
+                    boost = rng.random() < 0.3
+                    writer.write(INPUT_MESSAGE.pack(INPUT, accelerate | boost << 1))
+        except (asyncio.IncompleteReadError, ConnectionError, KeyError):
+            stats.errors += 1
+        writer.close()
+
+async def load_test(host, port, clients, duration):
+    stats = LoadStats()
+    deadline = time.monotonic() + duration
+    start = time.perf_counter()
+    await asyncio.gather(*(
+        simulated_player(host, port, deadline, random.Random(i), stats) for i in range(clients)
+    ))
+    elapsed = time.perf_counter() - start
+    print(f"{clients} players for {elapsed:.1f}s: {stats.races} races finished, "
+          f"{stats.states / elapsed:.0f} state updates/s, {stats.errors} errors")
+    if stats.state_gaps:
+        p50, p99, worst = percentiles(stats.state_gaps)
+        print(f"gap between state updates: p50 {p50 * 1000:.1f}ms p99 {p99 * 1000:.1f}ms max {worst * 1000:.1f}ms")
+
+def main():
+    parser = argparse.ArgumentParser(description="Headless race server and load tester")
+    parser.add_argument("mode", choices=("serve", "load"))
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5200)
+    parser.add_argument("--state-rate", type=float, default=20, help="State updates per second sent to clients")
+    parser.add_argument("--report-interval", type=float, default=5, help="Seconds between server reports")
+    parser.add_argument("--clients", type=int, default=300, help="Simulated players (load)")
+    parser.add_argument("--duration", type=float, default=30, help="Seconds to run (load)")
+    args = parser.parse_args()
+
+    try:
+        if args.mode == "serve":
+            asyncio.run(serve(args.host, args.port, args.state_rate, args.report_interval))
+        else:
+            asyncio.run(load_test(args.host, args.port, args.clients, args.duration))
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
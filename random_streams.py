@@ -0,0 +1,73 @@
+"""
+Seeded random number streams
+
+Every subsystem draws from its own stream, all derived from one seed, so
+a run can be reproduced from its seed and extra draws in one subsystem
+(another particle, a redrawn frame) never shift the numbers another one
+gets. Race outcomes only depend on the AI and track streams.
+"""
+
+import random
+
+# Stream names
+AI = "ai"  # AI driving decisions (the only randomness in car physics)
+TRACK = "track"  # Track generation (oil spill placement)
+ASSETS = "assets"  # Generated art (backgrounds, particle sprites)
+EFFECTS = "effects"  # Cosmetic particles
+
+MT_WORDS = 624  # 32-bit words the Mersenne Twister generates per refill
+MAX_DRAWS = 1 << 24  # Words draw_count() looks through before giving up
+
+def stream_seed(seed, name):
+    """What a subsystem's stream is seeded with, given the master seed"""
+    return f"{seed}:{name}"
+
+def draw_count(rng, seed):
+    """
+    How many 32-bit words rng has drawn since it was seeded with seed
+
+    Every random.Random draw takes whole words, so a stream is fully
+    described by its seed and this count (see seek_stream). Found by
+    running a fresh generator forward a refill at a time, which stays
+    cheap for the few thousand words a race draws.
+    """
+    state = rng.getstate()
+    if state[2] is not None:
+        raise ValueError("stream has a cached gauss value, which a draw count can't describe")
+    fresh = random.Random(seed)
+    if fresh.getstate() == state:
+        return 0
+    # The position within the current refill (1 to 624 once anything is drawn)
+    draws = state[1][MT_WORDS]
+    fresh.getrandbits(32 * draws)
+    while fresh.getstate() != state:
+        if draws > MAX_DRAWS:
+            raise ValueError("stream was not seeded with this seed")
+        fresh.getrandbits(32 * MT_WORDS)
+        draws += MT_WORDS
+    return draws
+
+def seek_stream(rng, seed, draws):
+    """Reseed rng with seed and skip draws 32-bit words, the state draw_count() describes"""
+    rng.seed(seed)
+    if draws:
+        rng.getrandbits(32 * draws)
+
+class RandomStreams:
+    def __init__(self, seed=None):
+        if seed is None:
+            seed = random.randrange(2 ** 32)  # Still kept, so an unseeded run can be replayed
+        self.seed = seed
+        self.streams = {}
+
+    def stream(self, name):
+        """The random.Random for a subsystem, seeded from the master seed and its name"""
+        rng = self.streams.get(name)
+        if rng is None:
+            rng = self.streams[name] = random.Random(stream_seed(self.seed, name))
+        return rng
+
+    def restart(self, name):
+        """Start a subsystem's stream again from the beginning (e.g. for a new car)"""
+        self.streams.pop(name, None)
+        return self.stream(name)
@@ -0,0 +1,254 @@
+#!/usr/bin/env python3
+"""
+Offline replay renderer
+
+Renders a recorded race (see replay.py; "python main.py --save-replays"
+writes one per finished race) to a numbered PNG sequence or a raw RGB24
+video stream, at a fixed frame rate and resolution, without a display.
+Frame i shows the race i / fps seconds after the countdown starts,
+interpolated between simulation ticks the way the game draws between
+steps.
+
+The frames are split into one contiguous range per worker process. A
+worker fast-forwards the race headless to SEEK_MARGIN ticks before its
+first frame (from the replay's nearest keyframe, see Replay.race_at),
+plays the game from there without drawing until its first frame, then
+draws each frame and hands it to a thread pool that scales and encodes
+it, so several frames are compressed at once while the next ones are
+drawn (zlib releases the GIL).
+
+Particles are cosmetic, don't carry across the seek and are partly
+spawned while drawing, so from the start of each worker's range on they
+come out differently than in a single-process render (though alike);
+everything else is the same however the frames are split (the camera to
+a tiny fraction of a pixel).
+
+Usage:
+    python render_video.py REPLAY FRAMES_DIR [--fps 30] [--size 1280x720] [--jobs 4]
+    python render_video.py REPLAY race.rgb --format raw
+    python render_video.py REPLAY - --format raw --size 1280x720 | \\
+        ffmpeg -f rawvideo -pix_fmt rgb24 -s 1280x720 -r 60 -i - race.mp4
+"""
+
+import os
+
+# Headless, and nothing but frames on stdout: must be set before pygame
+# is imported (here and in the workers, which inherit the environment)
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+os.environ["PYGAME_HIDE_SUPPORT_PROMPT"] = "1"
+
+import argparse
+import shutil
+import struct
+import sys
+import tempfile
+import time
+import zlib
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from multiprocessing import get_context
+from simulation import TICK_RATE
+
+DEFAULT_FPS = 60
+DEFAULT_TAIL = 2  # Seconds of the finish screen after the race
+SEEK_MARGIN = 2 * TICK_RATE  # Game updates a worker runs before its first frame (for the camera to settle)
+PNG_LEVEL = 6  # zlib compression level for PNG frames
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+def png_chunk(kind, data):
+    return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+def png_bytes(rgb, width, height, level=PNG_LEVEL):
+    """A PNG file of an RGB24 image (rows unfiltered)"""
+    stride = width * 3
+    rows = memoryview(rgb)
+    raw = b"".join(b"\x00" + rows[y * stride:(y + 1) * stride] for y in range(height))
+    return b"".join((
+        PNG_SIGNATURE,
+        png_chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)),
+        png_chunk(b"IDAT", zlib.compress(raw, level)),
+        png_chunk(b"IEND", b"")
+    ))
+
+def countdown_ticks():
+    """Game updates from starting the countdown to the race's first tick (inclusive)"""
+    from fixed_game_new import DragRaceGame
+
+    game = DragRaceGame(0)
+    game.start_countdown()
+    ticks = 0
+    while game.game_state == "countdown":
+        game.update()
+        ticks += 1
+    return ticks
+
+def frame_count(updates, fps):
+    """Frames in a video of a run of updates game updates"""
+    return (updates - 1) * fps // TICK_RATE + 1
+
+def race_updates(replay, tail_ticks, seek=0):
+    """replay_updates(), then tail_ticks more updates of the finish screen"""
+    from replay import replay_updates
+
+    game = None
+    for game in replay_updates(replay, seek):
+        yield game
+    if game is not None:
+        for _ in range(tail_ticks):
+            game.update()
+            yield game
+
+def encode_frame(surface, size, image_format):
+    """Scale a frame to size and encode it"""
+    import pygame
+
+    if surface.get_size() != size:
+        surface = pygame.transform.smoothscale(surface, size)
+    rgb = pygame.image.tobytes(surface, "RGB")
+    if image_format == "png":
+        return png_bytes(rgb, *size)
+    return rgb
+
+def render_range(path, start, stop, options):
+    """
+    Render frames start..stop-1 of a replay (in a worker process)
+
+    PNG frames are written into options["out"]; raw frames are written,
+    in order, to options["part"]. Returns the number of frames rendered.
+    """
+    import fixed_game_new
+    from replay import Replay
+
+    fps = options["fps"]
+    size = options["size"]
+    image_format = options["format"]
+    replay = Replay.load(path)
+    # Race tick to jump to: the countdown's last update runs race tick 0
+    first_update = start * TICK_RATE // fps + 1
+    seek = max(0, first_update - SEEK_MARGIN - options["countdown_ticks"] + 1)
+    updates = race_updates(replay, options["tail_ticks"], seek)
+    part = open(options["part"], "wb") if image_format == "raw" else None
+
+    def write(frame, data):
+        if part:
+            part.write(data)
+        else:
+            with open(os.path.join(options["out"], f"frame-{frame:06d}.png"), "wb") as f:
+                f.write(data)
+
+    done = 0
+    ticks = 0  # Updates the recorded game had run (including any skipped by seeking)
+    game = None
+    pending = deque()  # (frame, future), oldest first
+    with ThreadPoolExecutor(options["threads"]) as encoders:
+        for frame in range(start, stop):
+            # Frame time in ticks since the countdown started
+            tick, remainder = divmod(frame * TICK_RATE, fps)
+            while ticks <= tick:
+                game = next(updates, None)
+                if game is None:
+                    break
+                ticks = game.ticks
+                if ticks <= tick:
+                    # Not drawn, so put the cars where draw() would: their exhaust and smoke start there
+                    for car in game.race.cars:
+                        car.x = 100 + car.distance
+            if game is None:
+                break
+
+            game.draw(remainder / fps)
+            pending.append((frame, encoders.submit(encode_frame, fixed_game_new.screen.copy(), size, image_format)))
+            # Keep the encoders busy without holding the whole range in memory
+            while len(pending) > options["threads"] * 2:
+                done_frame, future = pending.popleft()
+                write(done_frame, future.result())
+                done += 1
+        while pending:
+            done_frame, future = pending.popleft()
+            write(done_frame, future.result())
+            done += 1
+
+    if part:
+        part.close()
+    return done
+
+def split_frames(frames, jobs):
+    """Split frames into up to jobs contiguous (start, stop) ranges of near-equal length"""
+    jobs = max(1, min(jobs, frames))
+    return [(frames * i // jobs, frames * (i + 1) // jobs) for i in range(jobs)]
+
+def render(path, out, image_format="png", fps=DEFAULT_FPS, size=None, jobs=None, threads=2, tail=DEFAULT_TAIL):
+    """Render a replay file to out (a directory for PNG, a file or "-" for raw); returns the frame count"""
+    from assets import SCREEN_WIDTH, SCREEN_HEIGHT
+    from replay import Replay
+
+    replay = Replay.load(path)
+    tail_ticks = round(tail * TICK_RATE)
+    countdown = countdown_ticks()
+    # The countdown's last update runs race tick 0
+    frames = frame_count(countdown + replay.ticks - 1 + tail_ticks, fps)
+    ranges = split_frames(frames, jobs or os.cpu_count() or 1)
+
+    work_dir = tempfile.mkdtemp(prefix="render-")
+    options = {
+        "fps": fps,
+        "size": size or (SCREEN_WIDTH, SCREEN_HEIGHT),
+        "format": image_format,
+        "threads": threads,
+        "tail_ticks": tail_ticks,
+        "countdown_ticks": countdown,
+        "out": out,
+    }
+    if image_format == "png":
+        os.makedirs(out, exist_ok=True)
+    parts = [os.path.join(work_dir, f"part-{i}.rgb") for i in range(len(ranges))]
+
+    try:
+        # Spawned rather than forked, so each worker starts pygame afresh
+        with ProcessPoolExecutor(len(ranges), mp_context=get_context("spawn")) as pool:
+            futures = [pool.submit(render_range, path, start, stop, dict(options, part=part))
+                       for (start, stop), part in zip(ranges, parts)]
+            rendered = sum(future.result() for future in futures)
+
+        if image_format == "raw":
+            stream = sys.stdout.buffer if out == "-" else open(out, "wb")
+            try:
+                for part in parts:
+                    with open(part, "rb") as f:
+                        shutil.copyfileobj(f, stream)
+            finally:
+                if stream is sys.stdout.buffer:
+                    stream.flush()
+                else:
+                    stream.close()
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    return rendered
+
+def parse_size(text):
+    width, _, height = text.lower().partition("x")
+    return int(width), int(height)
+
+def main():
+    parser = argparse.ArgumentParser(description="Render a race replay to images or raw video, headless")
+    parser.add_argument("replay")
+    parser.add_argument("out", help='Directory for PNG frames, or file (or "-" for stdout) for raw video')
+    parser.add_argument("--format", choices=("png", "raw"), default="png",
+                        help="PNG sequence or raw RGB24 frames back to back")
+    parser.add_argument("--fps", type=int, default=DEFAULT_FPS)
+    parser.add_argument("--size", type=parse_size, metavar="WxH", help="Output resolution (the game's by default)")
+    parser.add_argument("--jobs", type=int, help="Worker processes (one per CPU by default)")
+    parser.add_argument("--threads", type=int, default=2, help="Encoding threads per worker")
+    parser.add_argument("--tail", type=float, default=DEFAULT_TAIL, help="Seconds of the finish screen to include")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    frames = render(args.replay, args.out, args.format, args.fps, args.size, args.jobs, args.threads, args.tail)
+    elapsed = time.perf_counter() - start
+    length = frames / args.fps
+    print(f"{frames} frames ({length:.1f}s of video) in {elapsed:.1f}s, {length / elapsed:.1f}x real time",
+          file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
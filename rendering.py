@@ -0,0 +1,103 @@
+import pygame
+from assets import SCREEN_WIDTH, SCREEN_HEIGHT
+
+# Push the whole frame instead when the dirty regions cover more than this
+# fraction of the screen (or there are too many of them to be worth it)
+FULL_FLIP_AREA_RATIO = 0.6
+MAX_DIRTY_RECTS = 64
+
+class DirtyRectTracker:
+    """Collect the screen regions touched during a frame"""
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self.screen_rect = pygame.Rect(0, 0, SCREEN_WIDTH, SCREEN_HEIGHT)
+        self.rects = []
+        self.previous_rects = []
+        self.full_redraw = True
+
+    def add(self, rect):
+        """
+        Mark a region as changed this frame
+
+        Accepts a pygame.Rect, a list of rects or None (nothing drawn)
+        """
+        if not self.enabled or rect is None:
+            return
+
+        if isinstance(rect, list):
+            for r in rect:
+                self.add(r)
+            return
+
+        clipped = rect.clip(self.screen_rect)
+        if clipped.width > 0 and clipped.height > 0:
+            self.rects.append(clipped)
+
+    def invalidate(self):
+        """Force the next present to push the whole frame"""
+        self.full_redraw = True
+
+    def present(self):
+        """Push this frame to the display and start tracking the next one"""
+        if not self.enabled or self.full_redraw:
+            pygame.display.flip()
+            self.full_redraw = False
+            self.previous_rects = self.rects
+            self.rects = []
+            return
+
+        # Regions drawn last frame must be refreshed too so that whatever
+        # moved away from them gets erased on screen
+        update_rects = self.previous_rects + self.rects
+        self.previous_rects = self.rects
+        self.rects = []
+
+        if not update_rects:
+            return
+
+        if len(update_rects) > MAX_DIRTY_RECTS:
+            update_rects = [update_rects[0].unionall(update_rects[1:])]
+
+        area = sum(r.width * r.height for r in update_rects)
+        if area > FULL_FLIP_AREA_RATIO * SCREEN_WIDTH * SCREEN_HEIGHT:
+            pygame.display.flip()
+        else:
+            pygame.display.update(update_rects)
+
+class FrameScheduler:
+    """
+    Decide how fast each game state runs and whether a frame needs drawing
+
+    States listed in state_fps are idle states: they tick at their own
+    (lower) frame rate and only redraw when there was input, the state
+    changed or the frame signature reported by the game changed. Every
+    other state runs and redraws at the full frame rate.
+    """
+    def __init__(self, full_fps, state_fps=None):
+        self.full_fps = full_fps
+        self.state_fps = state_fps or {}
+        self.last_state = None
+        self.last_signature = None
+        self.frames_drawn = 0
+        self.frames_skipped = 0
+
+    def frame_rate(self, state):
+        """Frame rate cap for a game state"""
+        return self.state_fps.get(state, self.full_fps)
+
+    def is_idle(self, state):
+        return state in self.state_fps
+
+    def should_draw(self, state, had_input, signature):
+        """Return True if this frame has to be drawn and presented"""
+        changed = (had_input or state != self.last_state
+                   or signature != self.last_signature)
+        self.last_state = state
+        self.last_signature = signature
+
+        if changed or not self.is_idle(state):
+            self.frames_drawn += 1
+            return True
+
+        self.frames_skipped += 1
+        return False
@@ -0,0 +1,293 @@
+"""
+Race replays
+
+A race is fully determined by its seed, the opponent mode and the
+controls the human drivers held on each race tick, so that is what a
+replay stores. Each tick's controls are packed into a 4-bit code
+(accelerate and boost for up to two players) and runs of the same code
+are stored as varints, which keeps a two-minute race to a few hundred
+bytes. Replays play back through the normal DragRaceGame update path.
+
+To seek without replaying from the start, a snapshot of the race state
+(see snapshot.py) is kept every KEYFRAME_INTERVAL ticks, together with
+where that tick's controls are in the input runs. The file ends with an
+index of the keyframes, so Replay.open() can map a file and find any
+tick by restoring the keyframe before it and stepping at most
+KEYFRAME_INTERVAL - 1 ticks, reading nothing else.
+
+Keyframes store the random streams as draw counts from the replay's
+seed (see snapshot_race), so each is a few hundred bytes rather than
+about 5KB, and a typical race gets several. There is none at tick 0 (a
+new race is that state).
+
+File layout: header, input runs, keyframe snapshots, index, trailer.
+"""
+
+import mmap
+import struct
+from bisect import bisect_right
+from itertools import islice
+from simulation import create_headless_race
+from snapshot import snapshot_race, restore_race
+
+MAGIC = b"DRRP"
+VERSION = 3
+HEADER = struct.Struct("<4sBBQII")  # magic, version, flags, seed, race ticks, keyframe interval
+INDEX_ENTRY = struct.Struct("<IQIQI")  # tick, snapshot offset, snapshot size, run offset, codes of that run before the tick
+TRAILER = struct.Struct("<QQI4s")  # input runs size, index offset, keyframe count, index magic
+INDEX_MAGIC = b"DRIX"
+FLAG_TWO_PLAYER = 1
+FLAG_FIXED_POINT = 2  # Recorded with fixed-point car physics
+
+CODE_BITS = 4  # Bits per tick: accelerate and boost for each player
+CODE_MASK = (1 << CODE_BITS) - 1
+
+KEYFRAME_INTERVAL = 600  # Race ticks between keyframes (10 seconds)
+
+def pack_controls(controls):
+    """Bit-pack a tick's (accelerate, boost) pairs, player 1 in the low bits"""
+    code = 0
+    shift = 0
+    for accelerate, boost in controls:
+        if accelerate:
+            code |= 1 << shift
+        if boost:
+            code |= 2 << shift
+        shift += 2
+    return code
+
+def unpack_controls(code, players):
+    return [(bool(code >> (i * 2) & 1), bool(code >> (i * 2) & 2)) for i in range(players)]
+
+def write_varint(out, value):
+    """Append an unsigned LEB128 varint to a bytearray"""
+    while value >= 0x80:
+        out.append(value & 0x7F | 0x80)
+        value >>= 7
+    out.append(value)
+
+def read_varint(data, offset):
+    """Read an unsigned LEB128 varint; returns (value, offset after it)"""
+    value = 0
+    shift = 0
+    while True:
+        byte = data[offset]
+        offset += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, offset
+        shift += 7
+
+class Replay:
+    def __init__(self, seed, two_player=False, runs=b"", ticks=0, keyframes=(), keyframe_interval=0,
+                 fixed_point=False):
+        self.seed = seed
+        self.two_player = two_player
+        self.fixed_point = fixed_point
+        self.runs = runs  # Varints of (run length << CODE_BITS | code)
+        self.ticks = ticks  # Race ticks with recorded controls (tick 0 on)
+        # (tick, snapshot, run offset, codes of that run before the tick), in tick order
+        self.keyframes = list(keyframes)
+        self.keyframe_interval = keyframe_interval
+
+    @property
+    def players(self):
+        return 2 if self.two_player else 1
+
+    def codes(self, offset=0, skip=0):
+        """The packed controls for every race tick, in order (from a position in the runs)"""
+        runs = self.runs
+        while offset < len(runs):
+            value, offset = read_varint(runs, offset)
+            code = value & CODE_MASK
+            for _ in range((value >> CODE_BITS) - skip):
+                yield code
+            skip = 0
+
+    def controls(self, offset=0, skip=0):
+        """The (accelerate, boost) pairs of each human car for every race tick"""
+        players = self.players
+        for code in self.codes(offset, skip):
+            yield unpack_controls(code, players)
+
+    def keyframe_before(self, tick):
+        """The last keyframe at or before a race tick, or None"""
+        index = bisect_right([keyframe[0] for keyframe in self.keyframes], tick) - 1
+        return self.keyframes[index] if index >= 0 else None
+
+    def race_at(self, tick):
+        """
+        A headless race in the state the recorded one was in after tick race ticks
+
+        Starts from the nearest keyframe, so this costs at most
+        keyframe_interval steps wherever tick is (replays without
+        keyframes start from the beginning). Stops at the end of the
+        recording if tick is past it.
+        """
+        race = create_headless_race("player" if self.two_player else "ai", seed=self.seed,
+                                    fixed_point=self.fixed_point)
+        offset = skip = 0
+        keyframe = self.keyframe_before(tick)
+        if keyframe is not None:
+            _, snapshot, offset, skip = keyframe
+            restore_race(race, snapshot, self.seed)
+
+        humans = race.cars if self.two_player else (race.player,)
+        for tick_controls in self.controls(offset, skip):
+            if race.tick >= tick:
+                break
+            for car, (accelerate, boost) in zip(humans, tick_controls):
+                car.apply_input(accelerate, boost)
+            race.step()
+        return race
+
+    def to_bytes(self):
+        flags = (FLAG_TWO_PLAYER if self.two_player else 0) | (FLAG_FIXED_POINT if self.fixed_point else 0)
+        out = bytearray(HEADER.pack(MAGIC, VERSION, flags, self.seed, self.ticks, self.keyframe_interval))
+        out += self.runs
+
+        index = bytearray()
+        for tick, snapshot, run_offset, run_skip in self.keyframes:
+            index += INDEX_ENTRY.pack(tick, len(out), len(snapshot), run_offset, run_skip)
+            out += snapshot
+
+        index_offset = len(out)
+        out += index
+        out += TRAILER.pack(len(self.runs), index_offset, len(self.keyframes), INDEX_MAGIC)
+        return bytes(out)
+
+    @classmethod
+    def from_bytes(cls, data):
+        """Parse a replay from bytes or any buffer (the inputs and snapshots stay views into it)"""
+        view = memoryview(data)
+        magic, version, flags, seed, ticks, keyframe_interval = HEADER.unpack_from(view)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError("not a drag race replay (or an unsupported version)")
+        runs_size, index_offset, keyframe_count, index_magic = TRAILER.unpack_from(view, len(view) - TRAILER.size)
+        if index_magic != INDEX_MAGIC:
+            raise ValueError("replay is truncated (no keyframe index)")
+
+        keyframes = []
+        for i in range(keyframe_count):
+            tick, offset, size, run_offset, run_skip = INDEX_ENTRY.unpack_from(view, index_offset + i * INDEX_ENTRY.size)
+            keyframes.append((tick, view[offset:offset + size], run_offset, run_skip))
+        runs = view[HEADER.size:HEADER.size + runs_size]
+        return cls(seed, bool(flags & FLAG_TWO_PLAYER), runs, ticks, keyframes, keyframe_interval,
+                   bool(flags & FLAG_FIXED_POINT))
+
+    def save(self, path):
+        with open(path, "wb") as f:
+            f.write(self.to_bytes())
+
+    @classmethod
+    def load(cls, path):
+        with open(path, "rb") as f:
+            return cls.from_bytes(f.read())
+
+    @classmethod
+    def open(cls, path):
+        """Memory-map a replay file: only the header and index are read until a tick is asked for"""
+        with open(path, "rb") as f:
+            return cls.from_bytes(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+
+class ReplayRecorder:
+    """
+    Collects controls tick by tick, with a keyframe every keyframe_interval ticks
+
+    Recording must start before the race's first tick; record() is called
+    before each race step with the controls about to be applied (and
+    before they are, so keyframes hold the state the controls act on).
+    """
+    def __init__(self, seed, two_player=False, race=None, keyframe_interval=KEYFRAME_INTERVAL, fixed_point=False):
+        self.seed = seed
+        self.two_player = two_player
+        self.fixed_point = fixed_point
+        self.race = race  # Snapshotted for keyframes (None for inputs only)
+        self.keyframe_interval = keyframe_interval
+        self.runs = bytearray()
+        self.keyframes = []
+        self.code = None
+        self.run = 0
+        self.ticks = 0
+
+    def record(self, controls):
+        code = pack_controls(controls)
+        if code != self.code:
+            self.flush()
+            self.code = code
+        if self.race is not None and self.ticks and self.ticks % self.keyframe_interval == 0:
+            # This tick's controls are the next code of the open run
+            self.keyframes.append((self.ticks, snapshot_race(self.race, self.seed), len(self.runs), self.run))
+        self.run += 1
+        self.ticks += 1
+
+    def flush(self):
+        if self.run:
+            write_varint(self.runs, self.run << CODE_BITS | self.code)
+            self.run = 0
+
+    def finish(self):
+        """The replay recorded so far"""
+        self.flush()
+        self.code = None
+        return Replay(self.seed, self.two_player, bytes(self.runs), self.ticks,
+                      self.keyframes, self.keyframe_interval if self.race is not None else 0, self.fixed_point)
+
+def replay_updates(replay, seek=0):
+    """
+    Run a recorded race through DragRaceGame from the countdown to the end
+
+    Yields the game after every update, up to the one the race finishes
+    on (replays of abandoned races stop where the recording did).
+
+    With seek, the race jumps to race tick seek as soon as the countdown
+    is over, fast-forwarded headless (see race_at) rather than through the
+    game's updates; game.ticks still counts every update the recorded game
+    ran. Particles don't carry across the jump, the camera starts out on
+    the player, and the race is no longer recorded.
+    """
+    # Imported here so loading replays doesn't need a display
+    from fixed_game_new import DragRaceGame
+
+    game = DragRaceGame(replay.seed, replay.fixed_point)
+    game.two_player_mode = replay.two_player
+    game.opponent = game.create_opponent()
+
+    game.start_countdown()
+    controls = replay.controls()
+    next(controls, None)  # Race tick 0 runs as the countdown ends, before any input
+    while game.game_state != "finished":
+        if game.game_state == "racing":
+            if game.race.tick < seek:
+                race = replay.race_at(seek)
+                game.ticks += race.tick - game.race.tick
+                restore_race(game.race, snapshot_race(race))
+                # A headless race (or a keyframe from another game) started its clock elsewhere
+                for car in game.race.cars:
+                    shift = game.race_start_time - car.start_time
+                    car.start_time += shift
+                    if car.finished:
+                        car.finish_time += shift
+                controls = islice(replay.controls(), race.tick, None)
+                # Where the camera heads for when following the player
+                game.camera_offset = game.prev_camera_offset = max(0, game.player.distance - 300)
+                game.recorder = game.ghost_recorder = None
+                seek = 0
+            tick_controls = next(controls, None)
+            if tick_controls is None:
+                return
+            game.apply_controls(tick_controls)
+        game.update()
+        yield game
+
+def play_replay(replay, draw=False):
+    """
+    Play a replay to the end (see replay_updates) and return the game
+
+    With draw=True every step is drawn as well.
+    """
+    game = None
+    for game in replay_updates(replay):
+        if draw:
+            game.draw()
+    return game
@@ -0,0 +1,306 @@
+"""
+Headless race simulation
+
+RaceSimulation holds the race rules (car physics, ramps, oil spills and
+traffic lights) and advances them one fixed tick at a time. It needs no
+display and no fonts, so it is used both by the game and for running
+scripted races as fast as the CPU allows.
+"""
+
+import random
+from car import PlayerCar, AICar, GhostCar
+from track import ObstacleIndex, Ramp, OilSpill
+from traffic_lights import TrafficLightSchedule, TrafficLight
+from random_streams import RandomStreams, AI, TRACK
+
+# Race constants
+TICK_RATE = 60  # Simulation steps per second (all physics tuning is per step)
+RACE_DISTANCE = 6000  # Extended race distance (was 3000)
+MAX_RACE_TICKS = 120 * TICK_RATE  # Give up on races that never finish
+
+def create_ramps():
+    return [
+        Ramp(1000, 80),
+        Ramp(2500, 100),
+        Ramp(4000, 120),
+        Ramp(5500, 90)
+    ]
+
+def create_traffic_lights():
+    return [
+        TrafficLight(1500, 0, 180),  # 3 seconds per state at 60 FPS
+        TrafficLight(3000, 60, 180),
+        TrafficLight(4500, 120, 180)
+    ]
+
+class RaceResult:
+    """Outcome of a simulated race"""
+    def __init__(self, finish_ticks, ticks, events):
+        self.finish_ticks = finish_ticks  # Per car, None if it didn't finish
+        self.ticks = ticks
+        self.events = events  # List of (tick, lane, event) when tracing
+
+    @property
+    def finish_times(self):
+        """Finish times in seconds"""
+        return [None if tick is None else tick / TICK_RATE for tick in self.finish_ticks]
+
+    @property
+    def winner(self):
+        """Lane of the winning car, or None for a tie or an unfinished race"""
+        player_tick, opponent_tick = self.finish_ticks
+        if player_tick is None or opponent_tick is None or player_tick == opponent_tick:
+            return None
+        return 0 if player_tick < opponent_tick else 1
+
+class RaceSimulation:
+    def __init__(self, player, opponent, rng=None, race_distance=RACE_DISTANCE, trace=False):
+        self.player = player
+        self.opponent = opponent
+        self.rng = rng or random.Random()  # Track generation stream (oil spills)
+        self.race_distance = race_distance
+
+        # Track (obstacles are indexed by position for fast collision queries)
+        self.ramps = ObstacleIndex(create_ramps())
+        self.traffic_lights = TrafficLightSchedule(create_traffic_lights())
+
+        # Oil spills appear at random during the race
+        self.oil_spills = ObstacleIndex(lane_key="lane")
+        self.next_oil_spawn = 0
+        self.oil_spawn_interval = 300  # Ticks between oil spawn attempts
+        self.max_oil_spills = 5
+
+        self.tick = 0  # Race ticks run so far
+        self.finished = False
+
+        # Event trace
+        self.events = [] if trace else None
+        if trace:
+            self.player.on_event = self.record_event
+            self.opponent.on_event = self.record_event
+
+    @property
+    def cars(self):
+        return (self.player, self.opponent)
+
+    def record_event(self, car, event):
+        self.events.append((self.tick, car.lane, event))
+
+    def update_traffic_lights(self):
+        """Move the light clock on a tick (states are computed from it when queried)"""
+        self.traffic_lights.advance()
+
+    def spawn_oil(self):
+        """Every spawn interval, maybe drop an oil spill away from the other obstacles"""
+        if len(self.oil_spills) >= self.max_oil_spills:
+            return
+
+        self.next_oil_spawn -= 1
+        if self.next_oil_spawn > 0:
+            return
+
+        # Reset timer
+        self.next_oil_spawn = self.oil_spawn_interval
+
+        # Random chance to spawn oil
+        if self.rng.random() >= 0.3:  # 30% chance
+            return
+
+        for _ in range(10):  # Try 10 times to find a valid position
+            # Random position between 800 and race_distance - 800
+            position = self.rng.randint(800, int(self.race_distance - 800))
+            lane = self.rng.randint(0, 1)  # Random lane
+
+            too_close_to_ramp = self.ramps.any_near(position, 300)
+            too_close_to_oil = self.oil_spills.any_near(position, 500)
+            too_close_to_light = self.traffic_lights.any_near(position, 300)
+
+            if not too_close_to_ramp and not too_close_to_oil and not too_close_to_light:
+                self.oil_spills.add(OilSpill(position, lane, self.tick))
+                return
+
+    def step(self):
+        """
+        Advance the race by one tick
+
+        Returns the cars that crossed the finish line during this tick
+        """
+        self.update_traffic_lights()
+
+        for car in self.cars:
+            car.update(True, self.ramps, self.oil_spills, self.traffic_lights)
+
+        self.spawn_oil()
+
+        finished_now = []
+        for car in self.cars:
+            if car.distance >= self.race_distance and not car.finished:
+                car.finished = True
+                car.finish_tick = self.tick
+                car.finish_time = car.start_time + self.tick * 1000 / TICK_RATE
+                car.emit("finish")
+                finished_now.append(car)
+
+        if self.player.finished and self.opponent.finished:
+            self.finished = True
+
+        self.tick += 1
+        return finished_now
+
+    def coast(self, inputs, max_ticks=MAX_RACE_TICKS):
+        """
+        Skip through ticks on which nothing but motion happens
+
+        Runs the same arithmetic as step() in a tight loop while no car
+        reaches an obstacle, a light or the finish line, lands, has a timer
+        due or presses boost, and no oil spawn attempt is due. Stops before
+        the first tick where something does, which the caller plays with
+        step(), so the race ends up exactly as if every tick had been
+        stepped. inputs are (PlayerCar, source) pairs as in run(); sources
+        are read per tick and must give the same answer when read again.
+        Only for cars without visual effects, and not with ghosts (their
+        recorded runs are read a tick at a time) or fixed-point physics
+        (coasting runs the float arithmetic).
+        """
+        if any(car.effects or car.fixed_point or isinstance(car, GhostCar) for car in self.cars):
+            return
+
+        end = max_ticks
+        if len(self.oil_spills) < self.max_oil_spills:
+            end = min(end, self.tick + max(self.next_oil_spawn, 1) - 1)
+
+        ai_rngs = [car.rng for car in self.cars if isinstance(car, AICar)]
+        if len(set(map(id, ai_rngs))) < len(ai_rngs):
+            return  # AI cars drawing from one stream need their draws interleaved tick by tick
+        
+        racing = [car for car in self.cars if not car.finished]
+        for car in racing:
+            due = car.timers.next_due()
+            if due is not None:
+                end = min(end, due - 1)  # A timer due at d fires on tick d - 1
+            car.plan_coast(self.race_distance, self.ramps, self.oil_spills, self.traffic_lights)
+        
+        start = self.tick
+        if end <= start:
+            return
+        
+        # Each car coasts on its own as far as it can; the shortest run sets
+        # how far the whole race skips and the others are worked out again
+        # for that many ticks
+        sources = dict(inputs)
+        runs = []
+        skipped = end - start
+        for car in racing:
+            rng_state = car.rng.getstate() if isinstance(car, AICar) else None
+            ticks, motion = car.coast_run(start, skipped, sources.get(car))
+            runs.append((car, rng_state, ticks, motion))
+            skipped = min(skipped, ticks)
+        
+        # Finished cars still take input, and a boost they can fire is an event
+        for car, source in inputs:
+            if car.finished:
+                for ticks in range(skipped):
+                    if source(start + ticks)[1] and car.boost_available and not car.boosting:
+                        skipped = ticks
+                        break
+        
+        if skipped == 0:
+            for car, rng_state, ticks, motion in runs:
+                if rng_state is not None:
+                    car.rng.setstate(rng_state)
+            return
+        
+        for car, rng_state, ticks, motion in runs:
+            if ticks != skipped:
+                if rng_state is not None:
+                    car.rng.setstate(rng_state)
+                ticks, motion = car.coast_run(start, skipped, sources.get(car))
+            car.apply_coast(motion)
+            car.timers.advance(skipped)
+        for car, source in inputs:
+            if car.finished:
+                accelerate, boost = source(start + skipped - 1)
+                car.acceleration = car.base_acceleration if accelerate else 0
+        for car in self.cars:
+            if car.finished:
+                car.coast_idle(skipped)
+        
+        # Catch the race clocks up
+        self.tick += skipped
+        self.traffic_lights.advance(skipped)
+        if len(self.oil_spills) < self.max_oil_spills:
+            self.next_oil_spawn -= skipped
+    
+    def run(self, player_input=None, opponent_input=None, max_ticks=MAX_RACE_TICKS, fast_forward=False):
+        """
+        Race until both cars finish (or max_ticks pass)
+
+        Inputs drive PlayerCars and are either a callable tick -> (accelerate, boost)
+        or a sequence of (accelerate, boost) pairs; past its end a sequence
+        means no input. AICars drive themselves. With fast_forward the
+        uneventful stretches in between are skipped through with coast().
+        """
+        inputs = [
+            (car, make_input_source(source))
+            for car, source in ((self.player, player_input), (self.opponent, opponent_input))
+            if isinstance(car, PlayerCar)
+        ]
+
+        while not self.finished and self.tick < max_ticks:
+            if fast_forward:
+                self.coast(inputs, max_ticks)
+                if self.tick >= max_ticks:
+                    break
+            for car, source in inputs:
+                accelerate, boost = source(self.tick)
+                car.apply_input(accelerate, boost)
+            self.step()
+
+        return self.result()
+
+    def result(self):
+        return RaceResult(
+            [car.finish_tick for car in self.cars],
+            self.tick,
+            self.events
+        )
+
+def make_input_source(source):
+    """Turn a scripted input (callable, sequence or None) into a callable tick -> (accelerate, boost)"""
+    if source is None:
+        return lambda tick: (False, False)
+    if callable(source):
+        return source
+
+    def sequence_input(tick):
+        if tick < len(source):
+            return source[tick]
+        return (False, False)
+    return sequence_input
+
+def full_throttle(tick):
+    """Scripted input: hold the accelerator and boost whenever possible"""
+    return (True, True)
+
+def create_headless_race(opponent="ai", difficulty=1.0, seed=None, trace=False, fixed_point=False):
+    """
+    Build a race with effect-free cars that need no display
+
+    opponent is "ai" for an AICar or "player" for a second scripted PlayerCar;
+    fixed_point gives both cars integer physics (see fixed_point.py)
+    """
+    streams = RandomStreams(seed)
+    player = PlayerCar(100, 0, None, 0, effects=False, fixed_point=fixed_point)
+    if opponent == "ai":
+        rival = AICar(100, 0, None, 1, difficulty=difficulty, rng=streams.stream(AI), effects=False,
+                      fixed_point=fixed_point)
+    else:
+        rival = PlayerCar(100, 0, None, 1, player_num=2, effects=False, fixed_point=fixed_point)
+    return RaceSimulation(player, rival, rng=streams.stream(TRACK), trace=trace)
+
+def simulate_race(player_input=full_throttle, opponent_input=None, opponent="ai",
+                  difficulty=1.0, seed=None, trace=False, max_ticks=MAX_RACE_TICKS, fast_forward=False,
+                  fixed_point=False):
+    """Run one headless race from start to finish and return its RaceResult"""
+    race = create_headless_race(opponent, difficulty, seed, trace, fixed_point)
+    return race.run(player_input, opponent_input, max_ticks, fast_forward)
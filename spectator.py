@@ -0,0 +1,306 @@
+#!/usr/bin/env python3
+"""
+Spectator mode
+
+The game publishes its state after every tick into a ring buffer in
+shared memory (SpectatorPublisher); a spectator is a separate process
+that attaches to it (SpectatorFeed) and renders the race on its own,
+e.g. in a window on a second display, or writes every frame out as an
+image. The game never waits for a spectator and doesn't know whether one
+is attached, and publishing a tick costs about 10 microseconds (a
+handful of struct.pack_into calls; "python benchmarks.py spectator").
+
+Each ring slot holds one tick: a game header, both cars, the light
+states and the oil spills. A slot starts with a sequence number that is
+odd while the slot is being written, so a reader can tell a torn or
+overwritten copy and skip it. The ring lets a slow reader (a recorder)
+fall up to RING_SLOTS ticks behind without missing any.
+
+Usage:
+    python main.py --spectate        # Game plus a spectator window
+    python spectator.py NAME [--display 1] [--record DIR]
+"""
+
+import argparse
+import os
+import struct
+import subprocess
+import sys
+from operator import attrgetter
+from multiprocessing import shared_memory, resource_tracker
+from snapshot import car_kind, GAME_STATES
+from traffic_lights import LIGHT_STATES
+
+MAGIC = b"DRSP"
+VERSION = 1
+RING_SLOTS = 256  # Ticks kept (over 4 seconds)
+MAX_LIGHTS = 8
+MAX_SPILLS = 32  # Further oil spills aren't published
+
+# Buffer header: magic, version, publisher closed, slot count, slot size, game seed, ticks published
+HEADER = struct.Struct("<4sB?HIQQ")
+SEQUENCE = struct.Struct("<Q")  # Slot sequence number (odd while being written)
+
+# Game: state, countdown, race tick, light clock, game ticks, race start time, camera, previous camera,
+# two-player mode, ghost mode, opponent kind, light count, oil spill count
+FRAME = struct.Struct("<BbIIIddd??BBB")
+
+# Car state (attribute, struct format)
+CAR_STATE = (
+    ("distance", "d"), ("prev_distance", "d"), ("speed", "d"),
+    ("jump_height", "d"), ("prev_jump_height", "d"), ("bounce_offset", "d"),
+    ("rotation", "i"), ("spin_angle", "i"), ("boost_timer", "I"), ("penalty_time", "I"),
+    ("finish_time", "d")
+)
+CAR_FIELDS = tuple(name for name, _ in CAR_STATE)
+CAR_FLAGS = ("finished", "boost_available", "boosting", "in_air", "spinning", "penalized")
+CAR = struct.Struct("<" + "".join(fmt for _, fmt in CAR_STATE) + "Bi")  # ... flags, finish tick (-1 while unset)
+get_car_state = attrgetter(*CAR_FIELDS)
+get_car_flags = attrgetter(*CAR_FLAGS)
+SPILL = struct.Struct("<dB")  # position, lane
+
+CARS_OFFSET = SEQUENCE.size + FRAME.size
+LIGHTS_OFFSET = CARS_OFFSET + 2 * CAR.size
+SPILLS_OFFSET = LIGHTS_OFFSET + MAX_LIGHTS
+SLOT_SIZE = SPILLS_OFFSET + MAX_SPILLS * SPILL.size
+
+class SpectatorPublisher:
+    """Owns the shared memory and writes the game state into it once per tick"""
+    def __init__(self, seed, slots=RING_SLOTS):
+        self.seed = seed
+        self.slots = slots
+        self.memory = shared_memory.SharedMemory(create=True, size=HEADER.size + slots * SLOT_SIZE)
+        self.buffer = self.memory.buf
+        self.published = 0
+        self.closed = False
+        self.write_header()
+
+    @property
+    def name(self):
+        return self.memory.name
+
+    def write_header(self):
+        HEADER.pack_into(self.buffer, 0, MAGIC, VERSION, self.closed, self.slots, SLOT_SIZE,
+                         self.seed, self.published)
+
+    def publish(self, game):
+        buffer = self.buffer
+        sequence = self.published * 2 + 1
+        slot = HEADER.size + self.published % self.slots * SLOT_SIZE
+        SEQUENCE.pack_into(buffer, slot, sequence)
+
+        race = game.race
+        lights = race.traffic_lights
+        spills = race.oil_spills
+        light_count = min(len(lights), MAX_LIGHTS)
+        spill_count = min(len(spills), MAX_SPILLS)
+        FRAME.pack_into(
+            buffer, slot + SEQUENCE.size,
+            GAME_STATES.index(game.game_state), game.countdown, race.tick, lights.tick, game.ticks,
+            game.race_start_time, game.camera_offset, game.prev_camera_offset,
+            game.two_player_mode, game.ghost_mode, car_kind(game.opponent), light_count, spill_count
+        )
+
+        offset = slot + CARS_OFFSET
+        for car in race.cars:
+            flags = 0
+            for bit, flag in enumerate(get_car_flags(car)):
+                flags |= flag << bit
+            CAR.pack_into(buffer, offset, *get_car_state(car), flags,
+                          -1 if car.finish_tick is None else car.finish_tick)
+            offset += CAR.size
+
+        offset = slot + LIGHTS_OFFSET
+        for i in range(light_count):
+            buffer[offset + i] = LIGHT_STATES.index(lights.state(lights[i]))
+
+        offset = slot + SPILLS_OFFSET
+        for i in range(spill_count):
+            spill = spills[i]
+            SPILL.pack_into(buffer, offset, spill.position, spill.lane)
+            offset += SPILL.size
+
+        SEQUENCE.pack_into(buffer, slot, sequence + 1)
+        self.published += 1
+        self.write_header()
+
+    def close(self):
+        """Tell spectators the game is over and free the memory"""
+        self.closed = True
+        self.write_header()
+        self.buffer = None
+        self.memory.close()
+        self.memory.unlink()
+
+class CarFrame:
+    """A car as it was on a published tick"""
+    __slots__ = CAR_FIELDS + CAR_FLAGS + ("finish_tick",)
+
+class SpectatorFrame:
+    """One published tick"""
+    def __init__(self, index, data):
+        self.index = index  # Ticks published before this one
+        (state, self.countdown, self.tick, self.light_tick, self.ticks,
+         self.race_start_time, self.camera_offset, self.prev_camera_offset,
+         self.two_player_mode, self.ghost_mode, self.opponent_kind,
+         light_count, spill_count) = FRAME.unpack_from(data, SEQUENCE.size)
+        self.game_state = GAME_STATES[state]
+
+        self.cars = []
+        for offset in (CARS_OFFSET, CARS_OFFSET + CAR.size):
+            values = CAR.unpack_from(data, offset)
+            car = CarFrame()
+            for name, value in zip(CAR_FIELDS, values):
+                setattr(car, name, value)
+            flags = values[-2]
+            for bit, name in enumerate(CAR_FLAGS):
+                setattr(car, name, bool(flags >> bit & 1))
+            car.finish_tick = None if values[-1] < 0 else values[-1]
+            self.cars.append(car)
+
+        self.light_states = [LIGHT_STATES[state] for state in data[LIGHTS_OFFSET:LIGHTS_OFFSET + light_count]]
+        self.oil_spills = [SPILL.unpack_from(data, SPILLS_OFFSET + i * SPILL.size) for i in range(spill_count)]
+
+class SpectatorFeed:
+    """Read-only view of a publisher's ring buffer (from another process)"""
+    def __init__(self, name):
+        try:
+            self.memory = shared_memory.SharedMemory(name=name, track=False)
+        except TypeError:
+            # Before Python 3.13 attaching registers the memory to be freed when
+            # this process exits, which isn't ours to do
+            self.memory = shared_memory.SharedMemory(name=name)
+            resource_tracker.unregister(self.memory._name, "shared_memory")
+        magic, version, _, self.slots, slot_size, self.seed, _ = self.header()
+        if magic != MAGIC or version != VERSION or slot_size != SLOT_SIZE:
+            self.close()
+            raise ValueError("not a spectator buffer (or an unsupported version)")
+
+    def header(self):
+        return HEADER.unpack_from(self.memory.buf)
+
+    @property
+    def published(self):
+        return self.header()[6]
+
+    @property
+    def closed(self):
+        return self.header()[2]
+
+    def frame(self, index):
+        """The index'th published tick, or None if it has been overwritten (or is being written)"""
+        slot = HEADER.size + index % self.slots * SLOT_SIZE
+        expected = index * 2 + 2
+        if SEQUENCE.unpack_from(self.memory.buf, slot)[0] != expected:
+            return None
+        data = bytes(self.memory.buf[slot:slot + SLOT_SIZE])
+        # The copy is only good if the slot wasn't rewritten while it was made
+        if SEQUENCE.unpack_from(data)[0] != expected or SEQUENCE.unpack_from(self.memory.buf, slot)[0] != expected:
+            return None
+        return SpectatorFrame(index, data)
+
+    def latest(self):
+        """The newest published tick, or None before the first one"""
+        published = self.published
+        while published:
+            frame = self.frame(published - 1)
+            if frame is not None:
+                return frame
+            published = self.published  # Overtaken while reading; try the new newest one
+        return None
+
+    def close(self):
+        self.memory.close()
+
+def launch_spectator(name, *args):
+    """Start a spectator for the buffer name in its own process"""
+    return subprocess.Popen([sys.executable, os.path.abspath(__file__), name, *args])
+
+def show_frame(game, frame):
+    """Put a published tick into a DragRaceGame so that game.draw() shows it"""
+    from car import GhostCar
+    from timers import TimerQueue
+    from track import ObstacleIndex, OilSpill
+
+    if (frame.two_player_mode, frame.ghost_mode) != (game.two_player_mode, game.ghost_mode):
+        game.two_player_mode = frame.two_player_mode
+        game.ghost_mode = frame.ghost_mode
+        game.opponent = game.create_opponent()
+    if frame.game_state != game.game_state:
+        game.finish_overlay = None
+    game.game_state = frame.game_state
+    game.countdown = frame.countdown
+    game.ticks = frame.ticks
+    game.race_start_time = frame.race_start_time
+    game.camera_offset = frame.camera_offset
+    game.prev_camera_offset = frame.prev_camera_offset
+
+    race = game.race
+    race.tick = frame.tick
+    race.traffic_lights.tick = frame.light_tick
+    if len(race.oil_spills) != len(frame.oil_spills):
+        race.oil_spills = ObstacleIndex((OilSpill(position, lane) for position, lane in frame.oil_spills),
+                                        lane_key="lane")
+
+    for car, state in zip(race.cars, frame.cars):
+        for name in CAR_FIELDS + CAR_FLAGS:
+            if name not in ("boost_timer", "penalty_time"):
+                setattr(car, name, getattr(state, name))
+        car.finish_tick = state.finish_tick
+        if isinstance(car, GhostCar):
+            continue
+        # The boost and penalty indicators read the car's countdowns, so set
+        # up ones with the published time left (they never run here)
+        car.timers = TimerQueue()
+        car.cooldown_countdown = car.penalty_countdown = None
+        penalty_left = 0
+        if state.penalized:
+            penalty_left = car.penalty_duration - state.penalty_time
+            car.penalty_countdown = car.timers.schedule(penalty_left, car.end_penalty)
+        if state.boost_timer:
+            car.cooldown_countdown = car.timers.schedule(state.boost_timer + penalty_left, car.boost_ready)
+
+def run_spectator(name, display=0, record_dir=None):
+    """Show the race published under name until the game closes it"""
+    import pygame
+    import fixed_game_new
+    from assets import SCREEN_WIDTH, SCREEN_HEIGHT
+
+    feed = SpectatorFeed(name)
+    fixed_game_new.screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT), display=display)
+    pygame.display.set_caption("Pixel Art Drag Race - Spectator")
+    game = fixed_game_new.DragRaceGame(feed.seed)
+    if record_dir:
+        os.makedirs(record_dir, exist_ok=True)
+
+    clock = pygame.time.Clock()
+    shown = None
+    running = True
+    while running and not feed.closed:
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                running = False
+
+        frame = feed.latest()
+        if frame is not None and frame.index != shown:
+            show_frame(game, frame)
+            game.draw()
+            pygame.display.flip()
+            if record_dir:
+                pygame.image.save(fixed_game_new.screen, os.path.join(record_dir, f"frame-{frame.index:06d}.png"))
+            shown = frame.index
+        clock.tick(fixed_game_new.FPS)
+
+    feed.close()
+    pygame.quit()
+
+def main():
+    parser = argparse.ArgumentParser(description="Watch a race published by the game")
+    parser.add_argument("name", help="Shared memory name the game printed")
+    parser.add_argument("--display", type=int, default=0, help="Display to open the window on")
+    parser.add_argument("--record", metavar="DIR", help="Also save every frame shown as a PNG")
+    args = parser.parse_args()
+    run_spectator(args.name, args.display, args.record)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+"""
+Race state hashes for finding desyncs
+
+StateHasher steps a RaceSimulation and records a running hash of its
+state after every tick, so two runs of the same race (on different
+machines, Python builds or versions of the code) can be compared hash by
+hash and the tick where they first disagree found straight away.
+
+The hash is a CRC-32 chain over a fixed little-endian byte encoding of
+the state (struct-packed IEEE doubles and fixed-size integers), so it is
+the same on every platform and Python implementation that computes the
+same race. Discrete state changes (boosts, spins, penalties, jumps,
+landings, finishes) are folded in as the cars report them, and the ramps
+and light layout once at the start. Every tick folds in both cars'
+distance and speed (a single struct.pack), and every interval ticks
+(and at the end of the race) a checkpoint adds the race and light
+clocks, each car's full motion (jump height and velocity, rotation,
+spin) and finish tick, and any new oil spills.
+
+The first differing hash is the exact tick a difference first reaches a
+car's speed or distance (which nearly every desync does straight away)
+or sets off an event; anything else shows up at the next checkpoint.
+Hashing costs well under a microsecond a tick, about 6% of a bare
+headless step and 0.2% of a game update ("python benchmarks.py
+state-hash"). With debug=True there is a checkpoint every tick and
+each tick's full state is kept as well (see state_fields()), so a
+mismatch is explained field by field.
+
+Usage:
+    python state_hash.py REPLAY --save hashes.json [--debug]
+    python state_hash.py REPLAY --compare hashes.json [--debug]
+"""
+
+import argparse
+import json
+import struct
+import zlib
+from array import array
+from car import AICar
+from operator import attrgetter
+from snapshot import CAR_STATE, AI_STATE, pack_rng
+
+HASH_INTERVAL = 60  # Race ticks between checkpoints (one second; every tick in debug mode)
+
+# Car events, by code (events not listed fold in as UNKNOWN_EVENT)
+EVENTS = ("boost", "boost_end", "boost_ready", "spin", "spin_end", "penalty", "penalty_end",
+          "jump", "land", "finish")
+EVENT_CODES = {event: code for code, event in enumerate(EVENTS)}
+UNKNOWN_EVENT = 255
+
+EVENT = struct.Struct("<BB")  # lane, event code
+RAMP = struct.Struct("<dd")  # position, height
+LIGHT = struct.Struct("<dii")  # position, phase, cycle time
+TICK = struct.Struct("<dddd")  # Every tick: player distance and speed, opponent distance and speed
+# Checkpoint: race tick, light clock, next oil spawn, then per car its motion and finish tick (-1 while unset)
+MOTION_STATE = (("distance", "d"), ("speed", "d"), ("jump_height", "d"), ("jump_velocity", "d"),
+                ("rotation", "i"), ("spin_angle", "i"))
+CHECKPOINT = struct.Struct("<IIi" + ("".join(fmt for _, fmt in MOTION_STATE) + "i") * 2)
+get_motion = attrgetter(*(name for name, _ in MOTION_STATE))
+SPILL = struct.Struct("<dBI")  # position, lane, tick
+
+def rng_hash(rng):
+    out = bytearray()
+    pack_rng(out, rng)
+    return zlib.crc32(out)
+
+def state_fields(race):
+    """Everything that decides how a race goes on, as a flat {name: value} dict"""
+    fields = {
+        "race.tick": race.tick,
+        "race.light_tick": race.traffic_lights.tick,
+        "race.next_oil_spawn": race.next_oil_spawn,
+        "race.finished": race.finished,
+        "race.oil_spills": [[spill.position, spill.lane, spill.tick] for spill in race.oil_spills],
+        "race.rng": rng_hash(race.rng),
+    }
+    for role, car in (("player", race.player), ("opponent", race.opponent)):
+        for name, _ in CAR_STATE:
+            fields[f"{role}.{name}"] = getattr(car, name)
+        fields[f"{role}.finish_tick"] = car.finish_tick
+        fields[f"{role}.timers"] = sorted(
+            [name, timer.due] for name, _ in car.countdowns()
+            for timer in (getattr(car, name),) if timer is not None and timer.active
+        )
+        if isinstance(car, AICar):
+            for name, _ in AI_STATE:
+                fields[f"{role}.{name}"] = getattr(car, name)
+            fields[f"{role}.rng"] = rng_hash(car.rng)
+    return fields
+
+def first_mismatch(hashes, other_hashes):
+    """Index of the first hash two sequences disagree on (None if the shorter one is a prefix)"""
+    for index, (value, other) in enumerate(zip(hashes, other_hashes)):
+        if value != other:
+            return index
+    return None
+
+def diff_fields(fields, other_fields):
+    """(name, value, other value) for every field that differs"""
+    return [(name, fields.get(name), other_fields.get(name))
+            for name in sorted(fields.keys() | other_fields.keys())
+            if fields.get(name) != other_fields.get(name)]
+
+class StateHasher:
+    """
+    Hashes a race's state as it goes
+
+    Create it before the race's first tick, then either call step()
+    instead of race.step() or call record() after each race.step().
+    finish() folds in the full state the race ended in. hashes[i] is the
+    hash once i + 1 race ticks have run (so race tick i was the last).
+    """
+    def __init__(self, race, debug=False, interval=HASH_INTERVAL):
+        self.race = race
+        self.interval = 1 if debug else interval
+        self.due = self.interval  # Race ticks run at the next checkpoint
+        self.last_checkpoint = 0
+        out = bytearray()
+        for ramp in race.ramps:
+            out += RAMP.pack(ramp.position, ramp.height)
+        for light in race.traffic_lights:
+            out += LIGHT.pack(light.position, light.phase, light.cycle_time)
+        self.hash = zlib.crc32(out)
+        self.hashes = array("L")
+        self.fields = [] if debug else None  # state_fields() after each tick
+        self.spills = None
+        self.spill_count = 0
+
+        # Hear about the cars' events (passing them on to any listener already there)
+        for car in race.cars:
+            car.on_event = self.event_listener(car.on_event)
+
+    def event_listener(self, listener):
+        def on_event(car, event):
+            self.hash = zlib.crc32(EVENT.pack(car.lane, EVENT_CODES.get(event, UNKNOWN_EVENT)), self.hash)
+            if listener:
+                listener(car, event)
+        return on_event
+
+    def step(self):
+        """race.step(), then record() its hash; returns the cars that finished"""
+        finished_now = self.race.step()
+        self.record()
+        return finished_now
+
+    def record(self):
+        """Fold the tick just run into the hash (with a checkpoint if one is due) and record it"""
+        race = self.race
+        player = race.player
+        opponent = race.opponent
+        self.hash = zlib.crc32(TICK.pack(player.distance, player.speed, opponent.distance, opponent.speed),
+                               self.hash)
+        if race.tick >= self.due:
+            self.checkpoint()
+        self.hashes.append(self.hash)
+
+    def finish(self):
+        """Fold the full state the race ended in into its last hash, unless a checkpoint already did"""
+        if self.hashes and self.last_checkpoint != self.race.tick:
+            self.checkpoint()
+            self.hashes[-1] = self.hash
+
+    def checkpoint(self):
+        """Fold the race clocks, the cars' motion and any new oil spills into the hash"""
+        race = self.race
+        player = race.player
+        opponent = race.opponent
+        self.hash = zlib.crc32(CHECKPOINT.pack(
+            race.tick, race.traffic_lights.tick, race.next_oil_spawn,
+            *get_motion(player), -1 if player.finish_tick is None else player.finish_tick,
+            *get_motion(opponent), -1 if opponent.finish_tick is None else opponent.finish_tick
+        ), self.hash)
+
+        spills = race.oil_spills
+        if spills is not self.spills or len(spills) != self.spill_count:
+            # The spills only change when one appears (or a snapshot is restored)
+            out = bytearray()
+            for spill in spills:
+                out += SPILL.pack(spill.position, spill.lane, spill.tick)
+            self.hash = zlib.crc32(out, self.hash)
+            self.spills = spills
+            self.spill_count = len(spills)
+
+        self.last_checkpoint = race.tick
+        self.due = race.tick + self.interval
+        if self.fields is not None:
+            self.fields.append(state_fields(race))
+
+def hash_replay(replay, debug=False):
+    """Play a replay headless and return the StateHasher that followed it"""
+    from simulation import create_headless_race
+
+    race = create_headless_race("player" if replay.two_player else "ai", seed=replay.seed,
+                                fixed_point=replay.fixed_point)
+    hasher = StateHasher(race, debug)
+    humans = race.cars if replay.two_player else (race.player,)
+    for tick_controls in replay.controls():
+        for car, (accelerate, boost) in zip(humans, tick_controls):
+            car.apply_input(accelerate, boost)
+        race.step()
+        hasher.record()
+    hasher.finish()
+    return hasher
+
+def main():
+    from replay import Replay
+
+    parser = argparse.ArgumentParser(description="Hash a replay tick by tick to compare runs")
+    parser.add_argument("replay")
+    parser.add_argument("--save", metavar="FILE", help="Write the hashes (and fields with --debug) as JSON")
+    parser.add_argument("--compare", metavar="FILE", help="Find the first tick that differs from a saved run")
+    parser.add_argument("--debug", action="store_true", help="Keep every tick's fields to show what differs")
+    args = parser.parse_args()
+
+    hasher = hash_replay(Replay.open(args.replay), args.debug)
+    # Through JSON, so the fields compare the same way as loaded ones
+    result = json.loads(json.dumps({"interval": hasher.interval, "hashes": list(hasher.hashes),
+                                    "fields": hasher.fields}))
+    print(f"{len(hasher.hashes)} ticks, final hash {hasher.hash:#010x}")
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(result, f)
+
+    if args.compare:
+        with open(args.compare) as f:
+            other = json.load(f)
+        if other["interval"] != result["interval"]:
+            print("the runs were hashed at different intervals (run both sides with or without --debug)")
+            return
+        index = first_mismatch(result["hashes"], other["hashes"])
+        if index is None:
+            print(f"no difference in the {min(len(result['hashes']), len(other['hashes']))} ticks both have")
+            return
+        print(f"first difference after race tick {index}")
+        if result["fields"] and other["fields"]:
+            for name, value, other_value in diff_fields(result["fields"][index], other["fields"][index]):
+                print(f"  {name}: {value!r} here, {other_value!r} there")
+        else:
+            print("(run both sides with --debug to see which fields differ)")
+
+if __name__ == "__main__":
+    main()
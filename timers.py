@@ -0,0 +1,71 @@
+"""
+Countdown timers
+
+TimerQueue keeps pending callbacks in a min-heap ordered by the tick
+they are due on. Advancing the clock costs a single comparison while
+nothing is due, so an object whose timers are idle does no per-tick
+work, and next_due() tells a simulation how far it can skip ahead
+before anything happens.
+"""
+
+import heapq
+from itertools import count
+
+class Timer:
+    """Handle for a scheduled callback"""
+    __slots__ = ("due", "callback", "active")
+
+    def __init__(self, due, callback):
+        self.due = due
+        self.callback = callback
+        self.active = True
+
+class TimerQueue:
+    __slots__ = ("now", "heap", "order")
+
+    def __init__(self):
+        self.now = 0  # Ticks advanced so far
+        self.heap = []  # (due, order, timer); entries for cancelled or moved timers are skipped
+        self.order = count()
+
+    def schedule(self, delay, callback):
+        """Call callback once the clock has advanced delay more ticks"""
+        timer = Timer(self.now + delay, callback)
+        self._push(timer)
+        return timer
+
+    def _push(self, timer):
+        heapq.heappush(self.heap, (timer.due, next(self.order), timer))
+
+    def cancel(self, timer):
+        timer.active = False
+
+    def postpone(self, timer, ticks):
+        """Move a pending timer ticks later"""
+        timer.due += ticks
+        self._push(timer)
+
+    def remaining(self, timer):
+        return timer.due - self.now
+
+    def advance(self, ticks=1):
+        """Move the clock on, firing due callbacks in order (now is their due tick while they run)"""
+        target = self.now + ticks
+        heap = self.heap
+        while heap and heap[0][0] <= target:
+            due, _, timer = heapq.heappop(heap)
+            if timer.active and timer.due == due:
+                self.now = due
+                timer.active = False
+                timer.callback()
+        self.now = target
+
+    def next_due(self):
+        """Tick the next pending timer fires on, or None"""
+        heap = self.heap
+        while heap:
+            due, _, timer = heap[0]
+            if timer.active and timer.due == due:
+                return due
+            heapq.heappop(heap)
+        return None
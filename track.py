@@ -0,0 +1,116 @@
+from bisect import bisect_left, bisect_right
+
+# Distance within which a car hits a ramp or an oil spill
+HIT_RANGE = 30
+
+class Ramp:
+    __slots__ = ("position", "height")
+
+    def __init__(self, position, height):
+        self.position = position
+        self.height = height
+
+class OilSpill:
+    __slots__ = ("position", "lane", "tick")
+
+    def __init__(self, position, lane, tick=0):
+        self.position = position
+        self.lane = lane
+        self.tick = tick  # Race tick it appeared on
+
+class ObstacleIndex:
+    """
+    Obstacles of one kind (objects with a position) kept sorted by position
+
+    Range queries use bisect, so finding what a car touches costs
+    O(log n) however long the track is. With lane_key set, a sorted view
+    per lane is kept as well so lane-specific hazards (oil) can be queried
+    directly. Iterating yields the obstacles in track order.
+    """
+    def __init__(self, obstacles=(), lane_key=None):
+        self.lane_key = lane_key
+        self.positions = []
+        self.items = []
+        self.lanes = {}  # lane -> (positions, items)
+        self.extend(obstacles)
+
+    def add(self, obstacle):
+        position = obstacle.position
+        index = bisect_right(self.positions, position)
+        self.positions.insert(index, position)
+        self.items.insert(index, obstacle)
+
+        if self.lane_key is not None:
+            positions, items = self.lanes.setdefault(getattr(obstacle, self.lane_key), ([], []))
+            index = bisect_right(positions, position)
+            positions.insert(index, position)
+            items.insert(index, obstacle)
+
+    def extend(self, obstacles):
+        for obstacle in obstacles:
+            self.add(obstacle)
+
+    def remove(self, obstacle):
+        self._remove_from(self.positions, self.items, obstacle)
+        if self.lane_key is not None:
+            positions, items = self.lanes[getattr(obstacle, self.lane_key)]
+            self._remove_from(positions, items, obstacle)
+
+    @staticmethod
+    def _remove_from(positions, items, obstacle):
+        start = bisect_left(positions, obstacle.position)
+        for index in range(start, len(items)):
+            if items[index] is obstacle:
+                del positions[index]
+                del items[index]
+                return
+        raise ValueError("obstacle not in index")
+
+    def _sorted(self, lane):
+        if lane is None:
+            return self.positions, self.items
+        return self.lanes.get(lane, ((), ()))
+
+    def near(self, position, distance, lane=None):
+        """Obstacles strictly closer than distance to position"""
+        return self.within(position - distance, position + distance, lane)
+
+    def within(self, low, high, lane=None):
+        """Obstacles with low < position < high"""
+        positions, items = self._sorted(lane)
+        start = bisect_right(positions, low)
+        end = bisect_left(positions, high)
+        return items[start:end]
+
+    def any_near(self, position, distance, lane=None):
+        positions, items = self._sorted(lane)
+        index = bisect_right(positions, position - distance)
+        return index < len(positions) and positions[index] < position + distance
+
+    def crossed(self, old_position, new_position, lane=None):
+        """Obstacles passed when moving from old_position to new_position (old < pos <= new)"""
+        positions, items = self._sorted(lane)
+        start = bisect_right(positions, old_position)
+        end = bisect_right(positions, new_position)
+        return items[start:end]
+
+    def next_position(self, position, lane=None):
+        """Position of the first obstacle beyond position, or None"""
+        positions, items = self._sorted(lane)
+        index = bisect_right(positions, position)
+        return positions[index] if index < len(positions) else None
+
+    def between(self, low, high):
+        """Obstacles with low <= position <= high (e.g. the ones on screen)"""
+        start = bisect_left(self.positions, low)
+        end = bisect_right(self.positions, high)
+        return self.items[start:end]
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+    def __getitem__(self, index):
+        return self.items[index]
@@ -0,0 +1,65 @@
+"""
+Traffic light schedule
+
+A light's state is a pure function of the light clock, its phase offset
+and its cycle time, so nothing has to be updated per light per tick and
+the state at any past or future tick is an O(1) lookup. That lets the AI
+and simulators predict what a light will show when a car gets there.
+"""
+
+from track import ObstacleIndex
+
+# Lights cycle green -> yellow -> red -> green, each state lasting cycle_time ticks
+LIGHT_STATES = ("green", "yellow", "red")
+
+def light_state(phase, cycle_time, tick):
+    """State of a light with the given phase offset after tick ticks of the light clock"""
+    return LIGHT_STATES[(phase + tick) // cycle_time % len(LIGHT_STATES)]
+
+class TrafficLight:
+    __slots__ = ("position", "phase", "cycle_time")
+
+    def __init__(self, position, phase, cycle_time):
+        self.position = position
+        self.phase = phase  # Ticks into the cycle at tick 0
+        self.cycle_time = cycle_time  # Ticks per state
+
+class TrafficLightSchedule(ObstacleIndex):
+    """Traffic lights indexed by position, plus the clock that drives them"""
+    def __init__(self, lights=(), tick=0):
+        super().__init__(lights)
+        self.tick = tick
+
+    @classmethod
+    def from_states(cls, lights):
+        """Build a schedule from lights that store a "state" and a "timer" (older game loops)"""
+        return cls(TrafficLight(
+            light["position"],
+            LIGHT_STATES.index(light["state"]) * light["cycle_time"] + light["timer"],
+            light["cycle_time"]
+        ) for light in lights)
+
+    def advance(self, ticks=1):
+        self.tick += ticks
+
+    def state(self, light):
+        """Current state of a light"""
+        return light_state(light.phase, light.cycle_time, self.tick)
+
+    def state_at(self, light, tick):
+        """State of a light at any past or future tick of the light clock"""
+        return light_state(light.phase, light.cycle_time, tick)
+
+    def next_change(self, light, tick=None):
+        """First tick after tick (default: now) on which the light changes state"""
+        if tick is None:
+            tick = self.tick
+        cycle_time = light.cycle_time
+        return tick + cycle_time - (light.phase + tick) % cycle_time
+
+    def state_on_arrival(self, light, distance, speed):
+        """State a car at distance moving at a constant speed will find at the light"""
+        if speed <= 0:
+            return None
+        ticks = max(0, light.position - distance) / speed
+        return self.state_at(light, self.tick + int(ticks) + 1)